@@ -0,0 +1,66 @@
+"""Benchmark of approximate neighbor search for high-dimensional data.
+
+The data is many small blobs in a high-dimensional space, like embeddings
+of texts. For different numbers of hash tables of LSHNeighborSearcher, the
+time of inserting the data is compared with the time of exact search, and
+the agreement of labels with the labels of exact search is measured as
+the adjusted Rand index.
+
+Usage: python -m benchmarks.approximate_search [n_samples] [n_features]
+"""
+
+import sys
+import time
+
+from sklearn.datasets import make_blobs
+from sklearn.metrics import adjusted_rand_score
+
+from incdbscan import (
+    IncrementalDBSCAN,
+    LSHNeighborSearcher
+)
+
+
+MIN_PTS = 5
+N_TABLES = [2, 4, 8, 16, 32]
+
+
+def _time_insertion(algo, data):
+    start = time.perf_counter()
+    labels = algo.insert(data).get_cluster_labels(data)
+    return time.perf_counter() - start, labels
+
+
+def compare(data, eps):
+    exact_time, exact_labels = _time_insertion(
+        IncrementalDBSCAN(eps=eps, min_pts=MIN_PTS), data)
+    print(f'{"exact":<12} time: {exact_time:8.2f} s')
+
+    for n_tables in N_TABLES:
+        searcher = LSHNeighborSearcher(
+            radius=eps, n_tables=n_tables, random_state=0)
+        lsh_time, lsh_labels = _time_insertion(
+            IncrementalDBSCAN(
+                eps=eps, min_pts=MIN_PTS, neighbor_searcher=searcher),
+            data
+        )
+        agreement = adjusted_rand_score(exact_labels, lsh_labels)
+        print(f'{f"{n_tables} tables":<12} time: {lsh_time:8.2f} s  '
+              f'agreement: {agreement:.4f}')
+
+
+if __name__ == '__main__':
+    n_samples = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    n_features = int(sys.argv[2]) if len(sys.argv) > 2 else 384
+
+    # pylint: disable=unbalanced-tuple-unpacking
+    blobs, _ = make_blobs(
+        n_samples=n_samples,
+        n_features=n_features,
+        centers=n_samples // 20,
+        cluster_std=1,
+        center_box=(-3, 3),
+        random_state=0
+    )
+    # Objects of the same blob are about sqrt(2 * n_features) apart
+    compare(blobs, eps=(2 * n_features) ** 0.5)
@@ -0,0 +1,91 @@
+"""Micro-benchmark of the object store on the hot paths of Inserter,
+Deleter and BFSComponentFinder.
+
+Reports the memory used per object, and the time of looking up update
+seeds, of finding objects that lost their core property, and of the BFS
+traversal that checks clusters for splits.
+
+Usage: python -m benchmarks.hot_paths [n_samples]
+"""
+
+import sys
+import timeit
+import tracemalloc
+
+import numpy as np
+from sklearn.datasets import make_blobs
+
+from incdbscan import IncrementalDBSCAN
+from incdbscan._bfscomponentfinder import BFSComponentFinder
+
+
+EPS = 0.5
+MIN_PTS = 5
+REPEAT = 5
+
+
+def measure_memory(data):
+    tracemalloc.start()
+    algo = IncrementalDBSCAN(eps=EPS, min_pts=MIN_PTS)
+    algo.insert(data)
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    objects = algo._objects  # pylint: disable=protected-access
+    n_objects = len(objects.graph)
+    column_bytes = sum(
+        array.nbytes for array in (objects.object_ids,
+                                   objects.counts,
+                                   objects.neighbor_counts,
+                                   objects.labels))
+
+    print(f'objects: {n_objects}, edges: {objects.graph.num_edges()}')
+    print(f'column bytes per object:  {column_bytes / n_objects:.1f}')
+    print(f'traced bytes per object:  {traced / n_objects:.1f}')
+    return algo
+
+
+def _best_time(function):
+    function()
+    return min(timeit.repeat(function, number=1, repeat=REPEAT))
+
+
+def _report(name, function):
+    print(f'{name:<40} {_best_time(function) * 1e3:8.2f} ms')
+
+
+def time_hot_paths(algo):
+    # pylint: disable=protected-access
+    objects = algo._objects
+    node_ids = np.array(objects.graph.node_indices(), dtype=np.int64)
+    cores = node_ids[objects.is_core(node_ids)]
+    neighbor_counts_before = objects.neighbor_counts[node_ids] + 1
+
+    _report(
+        'Inserter._get_update_seeds',
+        lambda: algo._inserter._get_update_seeds(cores[:1000])
+    )
+    _report(
+        'Deleter._get_objects_that_lost_core...',
+        lambda: algo._deleter._get_objects_that_lost_core_property(
+            node_ids, neighbor_counts_before)
+    )
+
+    # Seeds spread over the largest cluster, as after deleting objects in
+    # many places of it
+    labels = objects.get_labels(cores)
+    seeds = cores[labels == np.bincount(labels).argmax()][::50]
+
+    _report(
+        'BFSComponentFinder.find_components',
+        lambda: BFSComponentFinder(objects).find_components(seeds)
+    )
+
+
+if __name__ == '__main__':
+    n_samples = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    blobs, _ = make_blobs(
+        n_samples=n_samples, centers=5, cluster_std=2, random_state=0)
+
+    algo_ = measure_memory(blobs)
+    time_hot_paths(algo_)
@@ -0,0 +1,346 @@
+"""Benchmark suite measuring how the costs of IncrementalDBSCAN scale.
+
+For every combination of scenario, data size, dimension and regime, a model
+is built from synthetic data, and the following are measured:
+
+- fit: clustering the data with fit;
+- batch insert: inserting the data into an empty model in batches;
+- insert and delete: the latencies of inserting and deleting single objects
+  into and from the model of the data (mean, p50 and p99);
+- batch delete: deleting a tenth of the objects with one call;
+- label lookup: getting the labels of all objects;
+- memory: the bytes traced by tracemalloc per object after fit. Memory
+  allocated by rustworkx for the graph is not traced, so the number of
+  edges is reported as well.
+
+Scenarios:
+
+- uniform: uniform noise, objects spread evenly;
+- blobs: dense Gaussian blobs, with many neighbors per object;
+- chain: a long chain of evenly spaced objects along a line, each with
+  exactly min_pts neighbors (except close to its ends), clustered as a
+  single cluster. It is the worst case for deletions: removing any object
+  splits the cluster in two, and the batch delete splits it into many big
+  pieces. Single insertions and deletions extend and shorten the chain at
+  its end.
+
+Data is scaled so that there is about one object per unit of volume in
+uniform noise, and one object per unit of length in chains, whatever the
+data size. Regimes set eps for an expected number of neighbors in this
+density, and min_pts relative to it: in the sparse regime most objects are
+core, in the dense regime the neighbor counts of many objects are close to
+min_pts.
+
+Results are written as JSON, together with the versions of the packages
+and the platform. Two result files can be compared to find regressions.
+
+Usage:
+    python -m benchmarks.scaling [--sizes N ...] [--dimensions D ...]
+        [--scenarios S ...] [--regimes R ...] [--output PATH]
+    python -m benchmarks.scaling --compare BASELINE CURRENT [--threshold T]
+"""
+
+import argparse
+import importlib.metadata
+import json
+import math
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from incdbscan import (
+    IncrementalDBSCAN,
+    __version__
+)
+
+
+REGIMES = {
+    # name: (expected number of neighbors, min_pts)
+    'sparse': (10, 5),
+    'dense': (40, 30),
+}
+SCENARIOS = ('uniform', 'blobs', 'chain')
+
+BATCH_SIZE = 1000
+N_SINGLE_OPERATIONS = 100
+BATCH_DELETE_FRACTION = 0.1
+OBJECTS_PER_BLOB = 5000
+BLOB_DENSITY = 5
+
+DEPENDENCIES = ('numpy', 'rustworkx', 'scikit-learn', 'scipy')
+
+COMPARED_METRICS = (
+    'fit_seconds',
+    'batch_insert_seconds',
+    'insert_latency_ms.p50',
+    'delete_latency_ms.p50',
+    'batch_delete_seconds',
+    'label_lookup_seconds',
+    'memory_bytes_per_object',
+)
+
+
+def generate_data(scenario, n_samples, n_features, random):
+    side = n_samples ** (1 / n_features)
+
+    if scenario == 'uniform':
+        return random.uniform(0, side, (n_samples, n_features))
+
+    if scenario == 'blobs':
+        # Objects of a blob have BLOB_DENSITY times as many neighbors on
+        # average as objects of uniform noise
+        n_blobs = max(1, n_samples // OBJECTS_PER_BLOB)
+        std = (n_samples / n_blobs / BLOB_DENSITY) ** (1 / n_features) / \
+            (4 * math.pi) ** 0.5
+        centers = random.uniform(0, side, (n_blobs, n_features))
+        blob_ids = random.integers(n_blobs, size=n_samples)
+        return centers[blob_ids] + random.normal(
+            scale=std, size=(n_samples, n_features))
+
+    if scenario == 'chain':
+        chain = random.uniform(-0.1, 0.1, (n_samples, n_features))
+        chain[:, 0] = np.arange(n_samples)
+        return chain
+
+    raise ValueError(f'Unknown scenario: {scenario}')
+
+
+def get_eps_and_min_pts(scenario, n_features, regime):
+    # Neighbors are counted with the object itself. In a chain, an object
+    # has the objects at most n_steps away along the chain as neighbors.
+
+    expected_n_neighbors, min_pts = REGIMES[regime]
+
+    if scenario == 'chain':
+        n_steps = (expected_n_neighbors - 1) // 2
+        return n_steps + 0.5, 2 * n_steps + 1
+
+    unit_ball_volume = \
+        math.pi ** (n_features / 2) / math.gamma(n_features / 2 + 1)
+    eps = (expected_n_neighbors / unit_ball_volume) ** (1 / n_features)
+    return eps, min_pts
+
+
+def _time(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def _latencies_ms(function, objects):
+    latencies = []
+    for object_ in objects:
+        start = time.perf_counter()
+        function(object_[np.newaxis])
+        latencies.append(1e3 * (time.perf_counter() - start))
+    return {
+        'mean': float(np.mean(latencies)),
+        'p50': float(np.percentile(latencies, 50)),
+        'p99': float(np.percentile(latencies, 99)),
+    }
+
+
+def _measure_memory(eps, min_pts, data):
+    tracemalloc.start()
+    algo = IncrementalDBSCAN(eps=eps, min_pts=min_pts).fit(data)
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # pylint: disable=protected-access
+    return traced / len(data), algo._objects.graph.num_edges()
+
+
+def run_case(scenario, n_samples, n_features, regime, seed=0):
+    random = np.random.default_rng(seed)
+    eps, min_pts = get_eps_and_min_pts(scenario, n_features, regime)
+
+    # Objects for single insertions are drawn from the same distribution.
+    # In a chain, they extend the chain past its end, so that the data is
+    # one unbroken chain.
+    all_data = generate_data(
+        scenario, n_samples + N_SINGLE_OPERATIONS, n_features, random)
+    if scenario != 'chain':
+        all_data = all_data[random.permutation(len(all_data))]
+    data = all_data[:n_samples][random.permutation(n_samples)]
+    extra_objects = all_data[n_samples:]
+
+    algo = IncrementalDBSCAN(eps=eps, min_pts=min_pts)
+    fit_seconds = _time(lambda: algo.fit(data))
+    labels = algo.get_cluster_labels(data)
+
+    if scenario == 'chain' and (labels[0] < 0 or np.any(labels != labels[0])):
+        raise RuntimeError(
+            'The chain is not clustered as a single cluster without noise.')
+
+    batch_algo = IncrementalDBSCAN(eps=eps, min_pts=min_pts)
+    batch_insert_seconds = _time(lambda: [
+        batch_algo.insert(data[start:start + BATCH_SIZE])
+        for start in range(0, n_samples, BATCH_SIZE)
+    ])
+    del batch_algo
+
+    insert_latency_ms = _latencies_ms(algo.insert, extra_objects)
+    # Objects are deleted in reverse order, so that a chain is shortened
+    # from its end and stays unbroken
+    delete_latency_ms = _latencies_ms(algo.delete, extra_objects[::-1])
+    label_lookup_seconds = _time(lambda: algo.get_cluster_labels(data))
+
+    n_deleted = int(BATCH_DELETE_FRACTION * n_samples)
+    batch_delete_seconds = _time(lambda: algo.delete(data[:n_deleted]))
+    del algo
+
+    memory_bytes_per_object, n_edges = \
+        _measure_memory(eps, min_pts, data)
+
+    return {
+        'scenario': scenario,
+        'n_samples': n_samples,
+        'n_features': n_features,
+        'regime': regime,
+        'eps': eps,
+        'min_pts': min_pts,
+        'n_edges': n_edges,
+        'n_clusters': int(len(np.unique(labels[labels >= 0]))),
+        'noise_fraction': float(np.mean(labels == -1)),
+        'fit_seconds': fit_seconds,
+        'batch_insert_seconds': batch_insert_seconds,
+        'batch_insert_objects_per_second': n_samples / batch_insert_seconds,
+        'insert_latency_ms': insert_latency_ms,
+        'delete_latency_ms': delete_latency_ms,
+        'batch_delete_seconds': batch_delete_seconds,
+        'label_lookup_seconds': label_lookup_seconds,
+        'memory_bytes_per_object': memory_bytes_per_object,
+    }
+
+
+def get_metadata():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=Path(__file__).parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': commit,
+        'incdbscan': __version__,
+        'python': platform.python_version(),
+        **{package: importlib.metadata.version(package)
+           for package in DEPENDENCIES},
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+    }
+
+
+def run(sizes, dimensions, scenarios, regimes):
+    results = []
+    for scenario in scenarios:
+        for n_features in dimensions:
+            for regime in regimes:
+                for n_samples in sizes:
+                    print(f'{scenario:<8} d={n_features:<3} {regime:<7} '
+                          f'n={n_samples:<8}', end='', file=sys.stderr,
+                          flush=True)
+                    result = run_case(scenario, n_samples, n_features, regime)
+                    print(f'fit: {result["fit_seconds"]:8.2f} s',
+                          file=sys.stderr)
+                    results.append(result)
+    return results
+
+
+def _get_metric(result, metric):
+    for key in metric.split('.'):
+        result = result[key]
+    return result
+
+
+def compare(baseline, current, threshold):
+    # Prints the ratio of each metric in the current results to the
+    # baseline, for the cases in both. Returns the number of ratios above
+    # the threshold.
+
+    def key(result):
+        return (result['scenario'], result['n_samples'],
+                result['n_features'], result['regime'])
+
+    baseline_results = {key(result): result for result in baseline['results']}
+    n_regressions = 0
+
+    for result in current['results']:
+        baseline_result = baseline_results.get(key(result))
+        if baseline_result is None:
+            continue
+
+        for metric in COMPARED_METRICS:
+            ratio = _get_metric(result, metric) / \
+                max(_get_metric(baseline_result, metric), 1e-12)
+            is_regression = ratio > threshold
+            n_regressions += is_regression
+            print(f'{" ".join(map(str, key(result))):<32} {metric:<26} '
+                  f'{ratio:6.2f}x{"  REGRESSION" if is_regression else ""}')
+
+    return n_regressions
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split('\n', maxsplit=1)[0])
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--dimensions', type=int, nargs='+', default=[2, 10])
+    parser.add_argument(
+        '--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument(
+        '--regimes', nargs='+', choices=list(REGIMES), default=list(REGIMES))
+    parser.add_argument(
+        '--output', type=Path, help='JSON file to write results to.')
+    parser.add_argument(
+        '--compare', type=Path, nargs=2, metavar=('BASELINE', 'CURRENT'),
+        help='Compare two result files instead of running benchmarks.')
+    parser.add_argument(
+        '--threshold', type=float, default=1.25,
+        help='Ratio to the baseline above which a metric is a regression.')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = _parse_args()
+
+    if args.compare:
+        baseline_path, current_path = args.compare
+        n_regressions_ = compare(
+            json.loads(baseline_path.read_text()),
+            json.loads(current_path.read_text()),
+            args.threshold
+        )
+        sys.exit(1 if n_regressions_ else 0)
+
+    report = {
+        'metadata': get_metadata(),
+        'config': {
+            'sizes': args.sizes,
+            'dimensions': args.dimensions,
+            'scenarios': list(args.scenarios),
+            'regimes': {name: REGIMES[name] for name in args.regimes},
+            'batch_size': BATCH_SIZE,
+            'n_single_operations': N_SINGLE_OPERATIONS,
+        },
+        'results': run(
+            args.sizes, args.dimensions, args.scenarios, args.regimes),
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output is None:
+        print(output)
+    else:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(output + '\n')
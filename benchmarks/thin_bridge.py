@@ -0,0 +1,87 @@
+"""Benchmark of deletions that split a small component away from a big
+cluster through a thin bridge.
+
+The data is a big dense grid, with a ladder-like bridge of two rows going
+out of it, ending in a small grid. Deleting a rung of the ladder close to
+the big grid splits the bridge and the small grid away from the big grid.
+A traversal in lock-step explores as many levels of the big grid as
+there are levels in the bridge and the small grid. The time of the
+deletion and the number of nodes visited by the traversal are compared
+for BFSComponentFinder expanding the smallest frontiers first and
+expanding all frontiers in lock-step.
+
+Usage: python -m benchmarks.thin_bridge [big_grid_size] [bridge_length]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from incdbscan import IncrementalDBSCAN
+from incdbscan._bfscomponentfinder import BFSComponentFinder
+
+
+EPS = 1.5
+MIN_PTS = 5
+SMALL_GRID_SIZE = 10
+
+
+def grid(size, offset):
+    xs, ys = np.meshgrid(np.arange(size), np.arange(size))
+    return np.column_stack([xs.ravel(), ys.ravel()]) + offset
+
+
+def thin_bridge_data(big_grid_size, bridge_length):
+    big_grid = grid(big_grid_size, [0, 0])
+    bridge = np.array([[big_grid_size + x, y]
+                       for x in range(bridge_length) for y in (0, 1)])
+    small_grid = grid(SMALL_GRID_SIZE, [big_grid_size + bridge_length, 0])
+    is_rung = bridge[:, 0] == big_grid_size + 2
+
+    data = np.vstack([big_grid, bridge[~is_rung], small_grid])
+    return data.astype(float), bridge[is_rung].astype(float)
+
+
+def time_deletion(data, rung, smallest_first):
+    # The finder is replaced on the deleter of the model, which creates its
+    # own finder only once
+
+    algo = IncrementalDBSCAN(eps=EPS, min_pts=MIN_PTS, collect_stats=True)
+    algo.fit(np.vstack([data, rung]))
+    algo._deleter._finder = BFSComponentFinder(
+        algo._objects, smallest_first=smallest_first)
+    algo.reset_stats()
+
+    start = time.perf_counter()
+    algo.delete(rung)
+    elapsed = time.perf_counter() - start
+
+    n_visited = \
+        algo.get_stats()['delete']['counts']['nodes_visited']['total']
+    n_clusters = len(np.unique(algo.get_cluster_labels(data)))
+    return elapsed, n_visited, n_clusters
+
+
+if __name__ == '__main__':
+    big_grid_size = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    bridge_length = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    data_, rung_ = thin_bridge_data(big_grid_size, bridge_length)
+    print(f'objects: {len(data_)}, big grid: {big_grid_size ** 2}, '
+          f'bridge: {2 * bridge_length}')
+
+    n_visited_by_mode = {}
+    for smallest_first_ in (True, False):
+        elapsed_, n_visited_, n_clusters_ = \
+            time_deletion(data_, rung_, smallest_first_)
+        n_visited_by_mode[smallest_first_] = n_visited_
+        mode = 'smallest first' if smallest_first_ else 'lock-step'
+        print(f'{mode:<16} delete: {elapsed_ * 1e3:8.2f} ms  '
+              f'nodes visited: {n_visited_:8d}  '
+              f'clusters after: {n_clusters_}')
+
+    if n_visited_by_mode[True] >= n_visited_by_mode[False]:
+        raise RuntimeError(
+            'Expanding the smallest frontiers first did not visit fewer '
+            'nodes than expanding them in lock-step.')
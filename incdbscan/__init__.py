@@ -1,3 +1,7 @@
+from ._grid_neighbor_searcher import GridNeighborSearcher
+from ._lsh_neighbor_searcher import LSHNeighborSearcher
+from ._neighbor_searcher import NeighborSearcher
+from ._neighbor_searcher_backend import NeighborSearcherBackend
 from .incrementaldbscan import (
     IncrementalDBSCAN,
     IncrementalDBSCANWarning
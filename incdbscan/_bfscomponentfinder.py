@@ -1,130 +1,171 @@
-from collections import (
-    defaultdict,
-    deque
-)
-from typing import (
-    Dict,
-    Set
-)
+import numpy as np
 
-import rustworkx as rx
-from rustworkx.visit import (
-    BFSVisitor,
-    PruneSearch,
-    StopSearch
+from ._utils import (
+    extend_rows,
+    get_connected_component_ids
 )
 
-from ._object import (
-    NodeId,
-    Object
-)
 
-
-class BFSComponentFinder(BFSVisitor):
+class BFSComponentFinder:
 
     # Traverse the objects in a BFS manner to find those components of
     # objects that need to be split away. A component here is a group of
     # objects that all can be linked to the same seed object. Starting from
-    # the seed objects, expand the graph by adding neighboring objects.
-    # The traversal termintes when all of the next nodes to be visited are
-    # linked to the same seed object -- this means that all but one component
-    # are traversed completely and they can be split away.
-
-    def __init__(self, graph):
-        self._graph: rx.PyGraph = graph  # graph of Objects  # pylint: disable=no-member
-        self._seed_to_component: Dict[NodeId, Set[Object]] = defaultdict(set)
-        self._node_to_seed: Dict[NodeId, NodeId] = {}
-        self._queue = deque()
-
-    def _preprocess(self, seeds):
-        # We create a fake node in the graph that is connected to all seeds to
-        # to implement multi-seed BFS.
-
-        origin_object = Object('ORIGIN', 0)
-        self._origin_node_id = self._graph.add_node(origin_object)
-        edges_from_origin = [(self._origin_node_id, seed_node_id, None)
-                             for seed_node_id in seeds]
-        self._graph.add_edges_from(edges_from_origin)
-
-    def _same_seeds(self):
-        iterator = iter(self._queue)
-        first_obj = next(iterator)
-        first_seed = self._node_to_seed[first_obj]
-
-        for obj in iterator:
-            seed = self._node_to_seed[obj]
-            if seed != first_seed:
-                return False
-        return True
-
-    def discover_vertex(self, vertex_node_id):
-        # If this is the first time discovering a node then the node itself
-        # will be its own seed. This is the way we keep track of singleton
-        # nodes (i.e., ones without edges).
-
-        if vertex_node_id not in self._node_to_seed:
-            self._node_to_seed[vertex_node_id] = vertex_node_id
-            self._seed_to_component[vertex_node_id].add(self._graph[vertex_node_id])
-
-        # If the node does not represent a core object then we don't want
-        # traversal to go in that direction.
-
-        if self._graph[vertex_node_id].is_core:
-            self._queue.append(vertex_node_id)
-        else:
-            raise PruneSearch
-
-    def finish_vertex(self, _):
-        _ = self._queue.popleft()
-        if self._same_seeds():
-            raise StopSearch
-
-    def tree_edge(self, edge):
-        source_node_id, target_node_id, _ = edge
-
-        # The target of the edge is a new node we see for the first time. Its
-        # seed will be the seed of the source. The source being the origin node
-        # is an exception.
-
-        source_is_origin = source_node_id == self._origin_node_id
-        target_seed = (target_node_id if source_is_origin
-                       else self._node_to_seed[source_node_id])
-
-        self._node_to_seed[target_node_id] = target_seed
-        self._seed_to_component[target_seed].add(self._graph[target_node_id])
-
-    def gray_target_edge(self, edge):
-        source_node_id, target_node_id, _ = edge
-
-        # A gray target edge is the case of merge, that is, when two components
-        # with different seeds meet. However, we only merge them if the target
-        # represents a core object in the graph (i.e., dense connection).
-
-        source_seed = self._node_to_seed[source_node_id]
-        target_seed = self._node_to_seed[target_node_id]
-        different_seeds = source_seed != target_seed
-
-        if different_seeds and self._graph[target_node_id].is_core:
-            # Let the seed of the source be the unified seed for both
-            # components. The seed of the target is discarded.
-            objects_to_merge = self._seed_to_component[target_seed]
-            for obj in objects_to_merge:
-                self._node_to_seed[obj.node_id] = source_seed
-            self._seed_to_component[source_seed].update(objects_to_merge)
-            del self._seed_to_component[target_seed]
-
-    def _postprocess(self):
-        # Delete data of fake node
-        self._graph.remove_node(self._origin_node_id)
-        del self._seed_to_component[self._origin_node_id]
-
-        # Discard the component not traversed
-        remaining_node = self._queue.popleft()
-        remaining_seed = self._node_to_seed[remaining_node]
-        del self._seed_to_component[remaining_seed]
+    # the seed objects, expand the graph level by level, only through core
+    # objects. When the traversals of two seeds meet at a core object, their
+    # components are merged. The traversal terminates when all of the next
+    # objects to be visited are linked to the same seed object -- this means
+    # that all but one component are traversed completely and they can be
+    # split away.
+    #
+    # Components are not expanded in lock-step. In each step, only the
+    # components with the smallest frontiers (at most twice the smallest) are
+    # expanded by a level. When a small component is split away from a big
+    # cluster, the traversal of the big side stays about as small as the
+    # small component, instead of growing level by level with it. With
+    # smallest_first=False, all components are expanded in each step.
+    #
+    # The graph is only read, and the bookkeeping of a step is done with
+    # array operations: which seed each visited object is linked to, and
+    # which seed represents the merged components of each seed. Seeds are
+    # identified by their positions, so the components found depend only on
+    # the order of the seeds given, not on node ids. The array of seeds of
+    # objects is kept between traversals, and only the objects visited are
+    # reset, so that a traversal costs time proportional to its size, not to
+    # the number of objects.
+
+    def __init__(self, objects, smallest_first=True):
+        self._objects = objects
+        self._graph = objects.graph
+        self._smallest_first = smallest_first
+
+        self._seed_of_object = np.empty(0, dtype=np.int64)
+        self._representative_seeds = None
 
     def find_components(self, seeds):
-        self._preprocess(seeds)
-        rx.bfs_search(self._graph, [self._origin_node_id], self)
-        self._postprocess()
-        return self._seed_to_component.values()
+        seeds = np.asarray(seeds, dtype=np.int64)
+
+        n_nodes = len(self._objects.counts)
+        if len(self._seed_of_object) < n_nodes:
+            self._seed_of_object = extend_rows(
+                self._seed_of_object,
+                max(n_nodes, 2 * len(self._seed_of_object)),
+                -1
+            )
+        self._seed_of_object[seeds] = np.arange(len(seeds))
+        self._representative_seeds = np.arange(len(seeds))
+
+        visited = [seeds]
+        frontier = seeds
+
+        while True:
+            frontier_sizes = np.bincount(
+                self._find_seeds(self._seed_of_object[frontier]),
+                minlength=len(seeds)
+            )
+            if np.count_nonzero(frontier_sizes) <= 1:
+                break
+
+            is_expanded = self._select_frontier_to_expand(
+                frontier, frontier_sizes)
+            new_objects = self._visit_next_level(frontier[is_expanded])
+            visited.append(new_objects)
+
+            # Traversal does not go in the direction of non-core objects
+            frontier = np.concatenate([
+                frontier[~is_expanded],
+                new_objects[self._objects.is_core(new_objects)]
+            ])
+
+        visited = np.concatenate(visited)
+        self._objects.stats.count('nodes_visited', len(visited))
+
+        components = self._get_completed_components(visited, frontier)
+        self._seed_of_object[visited] = -1
+        return components
+
+    def _select_frontier_to_expand(self, frontier, frontier_sizes):
+        if not self._smallest_first:
+            return np.ones(len(frontier), dtype=bool)
+
+        max_size_to_expand = 2 * frontier_sizes[frontier_sizes > 0].min()
+        roots = self._find_seeds(self._seed_of_object[frontier])
+        return frontier_sizes[roots] <= max_size_to_expand
+
+    def _find_seeds(self, seeds):
+        return self._representative_seeds[seeds]
+
+    def _visit_next_level(self, frontier):
+        neighborhoods = [self._graph.neighbors(obj)
+                         for obj in frontier.tolist()]
+        sources = np.repeat(frontier, [len(n) for n in neighborhoods])
+        targets = np.fromiter(
+            (obj for neighbors in neighborhoods for obj in neighbors),
+            dtype=np.int64,
+            count=len(sources)
+        )
+
+        # Objects seen for the first time are linked to the seed of the
+        # object they were reached from, or if they were reached from more
+        # than one, to the smallest of their seeds. This does not depend on
+        # the order of the frontier and of the neighbors in the graph.
+
+        is_new = self._seed_of_object[targets] == -1
+        new_objects = np.unique(targets[is_new])
+        self._seed_of_object[new_objects] = len(self._representative_seeds)
+        np.minimum.at(
+            self._seed_of_object,
+            targets[is_new],
+            self._seed_of_object[sources[is_new]]
+        )
+
+        # A core object reached from a different seed than its own merges
+        # the components of the two seeds (i.e., dense connection)
+
+        is_core = self._objects.is_core(targets)
+        self._merge_seeds(
+            self._seed_of_object[sources[is_core]],
+            self._seed_of_object[targets[is_core]]
+        )
+
+        return new_objects
+
+    def _merge_seeds(self, seeds_1, seeds_2):
+        # Seeds already merged and the seeds to be merged now are the edges
+        # of a graph over seeds. Its connected components are the merged
+        # components, each represented by its smallest seed.
+
+        roots_1 = self._find_seeds(seeds_1)
+        roots_2 = self._find_seeds(seeds_2)
+        is_different = roots_1 != roots_2
+        if not is_different.any():
+            return
+
+        n_seeds = len(self._representative_seeds)
+        sources = np.concatenate(
+            [np.arange(n_seeds), roots_1[is_different]])
+        targets = np.concatenate(
+            [self._representative_seeds, roots_2[is_different]])
+        component_ids = \
+            get_connected_component_ids(n_seeds, sources, targets)
+        n_components = component_ids.max() + 1
+
+        smallest_seeds = np.full(n_components, n_seeds)
+        np.minimum.at(smallest_seeds, component_ids, np.arange(n_seeds))
+        self._representative_seeds = smallest_seeds[component_ids]
+
+    def _get_completed_components(self, visited, frontier):
+        # Of the components, the one still to be traversed (or if all have
+        # been traversed, the largest one) is not split away
+
+        roots = self._find_seeds(self._seed_of_object[visited])
+        unique_roots, counts = np.unique(roots, return_counts=True)
+
+        if len(frontier):
+            remaining_root = self._find_seeds(
+                self._seed_of_object[frontier[:1]])[0]
+        else:
+            remaining_root = unique_roots[np.argmax(counts)]
+
+        return [visited[roots == root]
+                for root in unique_roots if root != remaining_root]
@@ -1,5 +1,7 @@
 from collections import defaultdict
 
+import numpy as np
+
 from ._bfscomponentfinder import BFSComponentFinder
 from ._labels import CLUSTER_LABEL_NOISE
 
@@ -9,73 +11,111 @@ class Deleter:
         self.eps = eps
         self.min_pts = min_pts
         self.objects = objects
+        self._finder = BFSComponentFinder(objects)
+
+    def delete(self, objects_deleted, counts):
+        # Objects are deleted all at once, so that the possible split of a
+        # cluster is checked only once even if many of its objects are deleted.
+
+        self.objects.compact_cluster_labels_if_needed(
+            self.objects.graph.num_nodes())
+
+        stats = self.objects.stats
+
+        with stats.phase('graph_update'):
+            objects_affected, neighbor_counts_before = \
+                self.objects.decrease_counts(objects_deleted, counts)
+
+        with stats.phase('update_seeds'):
+            ex_cores = self._get_objects_that_lost_core_property(
+                objects_affected, neighbor_counts_before)
 
-    def delete(self, object_to_delete):
-        self.objects.delete_object(object_to_delete)
-        object_deleted = object_to_delete
+            update_seeds, non_core_neighbors_of_ex_cores = \
+                self._get_update_seeds_and_non_core_neighbors_of_ex_cores(
+                    ex_cores)
 
-        ex_cores = self._get_objects_that_lost_core_property(object_deleted)
+        stats.count('ex_cores', len(ex_cores))
+        stats.count('update_seeds', len(update_seeds))
 
-        update_seeds, non_core_neighbors_of_ex_cores = \
-            self._get_update_seeds_and_non_core_neighbors_of_ex_cores(
-                ex_cores, object_deleted)
+        if self.objects.label_changes is not None:
+            self._record_dissolved_clusters(ex_cores, update_seeds)
+            self.objects.record_old_labels(non_core_neighbors_of_ex_cores)
 
-        if update_seeds:
+        self.objects.remove_objects(
+            objects_deleted[self.objects.counts[objects_deleted] == 0])
+
+        if len(update_seeds):
             # Only for update seeds belonging to the same cluster do we
-            # have to consider if split is needed.
+            # have to consider if split is needed. Clusters are handled in
+            # the order of their labels.
 
             update_seeds_by_cluster = \
                 self._group_objects_by_cluster(update_seeds)
 
-            for seeds in update_seeds_by_cluster.values():
-                components = self._find_components_to_split_away(seeds)
-                for component in components:
-                    self.objects.set_labels(
-                        component, self.objects.get_next_cluster_label())
+            for label, seeds in sorted(update_seeds_by_cluster.items()):
+                with stats.phase('bfs_traversal'):
+                    components = self._find_components_to_split_away(seeds)
+
+                with stats.phase('label_rewrites'):
+                    new_labels = []
+                    for component in components:
+                        new_labels.append(
+                            self.objects.get_next_cluster_label())
+                        self.objects.record_old_labels(component)
+                        self.objects.set_labels(component, new_labels[-1])
+                        stats.count('objects_relabeled', len(component))
+
+                if new_labels:
+                    self.objects.record_label_event(
+                        'split', label=label, into=new_labels)
 
         # Updating labels of border objects that were in the neighborhood
         # of objects that lost their core property is always needed. They
         # become either borders of other clusters or noise.
 
-        self._set_each_border_object_labels_to_largest_around(
-            non_core_neighbors_of_ex_cores)
-
-    def _get_objects_that_lost_core_property(self, object_deleted):
-        for obj in object_deleted.neighbors:
-            if obj.neighbor_count == self.min_pts - 1:
-                yield obj
-
-        # The result has to contain the deleted object if it was core
-        if object_deleted.is_core:
-            yield object_deleted
+        with stats.phase('label_rewrites'):
+            self._set_each_border_object_labels_to_largest_around(
+                non_core_neighbors_of_ex_cores)
+        stats.count('objects_relabeled', len(non_core_neighbors_of_ex_cores))
 
-    def _get_update_seeds_and_non_core_neighbors_of_ex_cores(
+    def _get_objects_that_lost_core_property(
             self,
-            ex_cores,
-            object_deleted):
+            objects,
+            neighbor_counts_before):
 
-        update_seeds = set()
-        non_core_neighbors_of_ex_cores = set()
+        # The result has to contain the objects removed that were core
 
-        for ex_core in ex_cores:
-            for neighbor in ex_core.neighbors:
-                if neighbor.is_core:
-                    update_seeds.add(neighbor)
-                else:
-                    non_core_neighbors_of_ex_cores.add(neighbor)
+        was_core = neighbor_counts_before >= self.min_pts
+        is_core = self.objects.is_core(objects) & \
+            (self.objects.counts[objects] > 0)
+        return objects[was_core & ~is_core]
 
-        if object_deleted.count == 0:
-            update_seeds = update_seeds.difference({object_deleted})
-            non_core_neighbors_of_ex_cores = \
-                non_core_neighbors_of_ex_cores.difference({object_deleted})
+    def _get_update_seeds_and_non_core_neighbors_of_ex_cores(self, ex_cores):
+        neighbors = self.objects.get_neighbors_of_objects(ex_cores)
+        neighbors = neighbors[self.objects.counts[neighbors] > 0]
+        is_core = self.objects.is_core(neighbors)
+
+        update_seeds = neighbors[is_core]
+        non_core_neighbors_of_ex_cores = neighbors[~is_core]
 
         return update_seeds, non_core_neighbors_of_ex_cores
 
+    def _record_dissolved_clusters(self, ex_cores, update_seeds):
+        # A cluster is dissolved if all of its core objects lost their core
+        # property. Otherwise, as clusters are connected through core
+        # objects, one of its remaining core objects is an update seed.
+
+        labels_of_ex_cores = set(self.objects.get_labels(ex_cores).tolist())
+        labels_of_seeds = set(self.objects.get_labels(update_seeds).tolist())
+
+        for label in sorted(labels_of_ex_cores - labels_of_seeds):
+            self.objects.record_label_event('dissolved', label=label)
+
     def _group_objects_by_cluster(self, objects):
         grouped_objects = defaultdict(list)
 
-        for obj in objects:
-            label = self.objects.get_label(obj)
+        for obj, label in zip(objects.tolist(),
+                              self.objects.get_labels(objects).tolist()):
             grouped_objects[label].append(obj)
 
         return grouped_objects
@@ -87,33 +127,34 @@ class Deleter:
         if self._objects_are_neighbors_of_each_other(seed_objects):
             return []
 
-        finder = BFSComponentFinder(self.objects.graph)
-        seed_node_ids = [obj.node_id for obj in seed_objects]
-        components = finder.find_components(seed_node_ids)
-        return components
-
-    @staticmethod
-    def _objects_are_neighbors_of_each_other(objects):
-        for obj1 in objects:
-            for obj2 in objects:
-                if obj2 not in obj1.neighbors:
-                    return False
+        # Seeds are ordered by object id, so that the components found, and
+        # their order, do not depend on the node ids of objects
+
+        seed_objects = np.array(seed_objects, dtype=np.int64)
+        seed_objects = seed_objects[
+            np.argsort(self.objects.object_ids[seed_objects])]
+
+        return self._finder.find_components(seed_objects)
+
+    def _objects_are_neighbors_of_each_other(self, objects):
+        for obj in objects:
+            neighbors = self.objects.get_neighbors(obj)
+            if not np.isin(objects, neighbors).all():
+                return False
         return True
 
     def _set_each_border_object_labels_to_largest_around(self, objects_to_set):
         cluster_updates = {}
 
-        for obj in objects_to_set:
+        for obj in objects_to_set.tolist():
             labels = self._get_cluster_labels_in_neighborhood(obj)
-            if not labels:
-                labels.add(CLUSTER_LABEL_NOISE)
-
-            cluster_updates[obj] = max(labels)
+            cluster_updates[obj] = (labels.max() if len(labels)
+                                    else CLUSTER_LABEL_NOISE)
 
         for obj, new_cluster_label in cluster_updates.items():
             self.objects.set_label(obj, new_cluster_label)
 
     def _get_cluster_labels_in_neighborhood(self, obj):
-        return {self.objects.get_label(neighbor)
-                for neighbor in obj.neighbors
-                if neighbor.is_core}
+        neighbors = self.objects.get_neighbors(obj)
+        return self.objects.get_labels(
+            neighbors[self.objects.is_core(neighbors)])
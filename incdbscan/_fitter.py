@@ -0,0 +1,81 @@
+import numpy as np
+
+from ._labels import CLUSTER_LABEL_NOISE
+from ._utils import get_connected_component_ids
+
+
+class Fitter:
+
+    # Clusters an empty object set from scratch. The neighborhoods of all
+    # objects are searched for with one query, like in a batch insertion.
+    # Then, instead of treating each object as a possible new core, clusters
+    # are found by one connected components pass over the graph of core
+    # objects, and border objects are labeled with the largest cluster label
+    # among their core neighbors, the same way as in Inserter.
+
+    def __init__(self, eps, min_pts, objects):
+        self.eps = eps
+        self.min_pts = min_pts
+        self.objects = objects
+
+    def fit(self, object_values, object_ids):
+        objects_inserted, _, _ = \
+            self.objects.insert_objects(object_values, object_ids)
+        self.objects.record_old_labels(objects_inserted)
+
+        edges = self.objects.get_edges()
+        is_core_source = self.objects.is_core(edges[:, 0])
+        is_core_target = self.objects.is_core(edges[:, 1])
+        edges_from_cores_to_non_cores = np.concatenate([
+            edges[is_core_source & ~is_core_target],
+            edges[~is_core_source & is_core_target][:, ::-1]
+        ])
+
+        stats = self.objects.stats
+        is_core = self.objects.is_core(objects_inserted)
+
+        with stats.phase('connected_components'):
+            self._set_labels_of_cores(
+                objects_inserted[is_core],
+                edges[is_core_source & is_core_target]
+            )
+
+        with stats.phase('label_rewrites'):
+            self._set_labels_of_non_cores(
+                objects_inserted[~is_core],
+                edges_from_cores_to_non_cores
+            )
+
+        stats.count('new_cores', is_core.sum())
+        stats.count('objects_relabeled', len(objects_inserted))
+
+    def _set_labels_of_cores(self, cores, edges_between_cores):
+        if not len(cores):
+            return
+
+        size = len(self.objects.labels)
+        component_ids = get_connected_component_ids(
+            size, edges_between_cores[:, 0], edges_between_cores[:, 1])
+
+        # Components of core objects are numbered consecutively, so that
+        # each of them gets a new cluster label
+
+        is_cluster = np.zeros(size, dtype=bool)
+        is_cluster[component_ids[cores]] = True
+        cluster_ids = np.cumsum(is_cluster) - 1
+        cluster_labels = \
+            self.objects.get_next_cluster_labels(cluster_ids[-1] + 1)
+
+        self.objects.labels[cores] = \
+            cluster_labels[cluster_ids[component_ids[cores]]]
+
+    def _set_labels_of_non_cores(
+            self, non_cores, edges_from_cores_to_non_cores):
+        # Non-core objects without core neighbors become noise
+
+        self.objects.labels[non_cores] = CLUSTER_LABEL_NOISE
+        np.maximum.at(
+            self.objects.labels,
+            edges_from_cores_to_non_cores[:, 1],
+            self.objects.labels[edges_from_cores_to_non_cores[:, 0]]
+        )
@@ -0,0 +1,251 @@
+from itertools import product
+
+import numpy as np
+
+from ._neighbor_searcher import (
+    get_minkowski_p,
+    reduce_minkowski
+)
+from ._neighbor_searcher_backend import NeighborSearcherBackend
+from ._utils import (
+    add_to_buckets,
+    extend_rows,
+    get_bucket_contents,
+    hash_rows,
+    remove_from_buckets
+)
+from ._value_buffer import ValueBuffer
+
+
+class GridNeighborSearcher(NeighborSearcherBackend):
+    """Exact neighbor searcher for low-dimensional data and Minkowski
+    metrics, the backend used by IncrementalDBSCAN with
+    neighbor_searcher='grid'.
+
+    Parameters
+    ----------
+    radius : float
+        The radius of neighborhood calculation. It has to be the same as eps
+        of IncrementalDBSCAN.
+
+    metric : string, optional (default='minkowski')
+        The distance metric, one of the Minkowski metrics accepted by
+        IncrementalDBSCAN with p >= 1.
+
+    p : float or int, optional (default=2)
+        Parameter for Minkowski distance if metric='minkowski'.
+
+    dtype : {numpy.float64, numpy.float32}, optional (default=numpy.float64)
+        The type coordinates are stored as. With float32, coordinates are
+        rounded to float32, and the values stored take half the memory.
+
+    directory : str or path-like, optional (default=None)
+        A directory to store coordinates in, memory-mapped to a values.npy
+        file, so that they can take more space than the memory.
+
+    """
+
+    # Values are bucketed into a grid of cubic cells with sides as long as
+    # the radius. No coordinate difference of two values exceeds their
+    # Minkowski distance, so the neighbors of a value are in its own cell or
+    # in the cells adjacent to it, 3^d cells in d dimensions. Cells are kept
+    # in a dict from the hash of their coordinates to the list of ids in
+    # them, so inserting or deleting a value costs a dict lookup and a list
+    # operation. The position of each id in its list is kept, so that
+    # deleting does not search the list. Values are stored in an array
+    # indexed by their ids, which are node ids, i.e., small non-negative
+    # integers that are reused.
+    #
+    # Query values in the same cell are answered together: the ids in the
+    # cells adjacent to their cell are collected once, and the distances to
+    # these candidates are checked in vectorized chunks. The number of cells
+    # to scan grows exponentially with the dimension, so the grid pays off
+    # only for low-dimensional data.
+
+    MAX_DISTANCES_PER_CHUNK = 2 ** 20
+    MAX_CELLS_PER_CHUNK = 2 ** 14
+
+    def __init__(self, radius, metric='minkowski', p=2, dtype=np.float64,
+                 directory=None):
+        self.radius = radius
+        self._minkowski_p = get_minkowski_p(metric, p)
+        if self._minkowski_p is None or self._minkowski_p < 1:
+            raise ValueError(
+                'The grid neighbor searcher supports only Minkowski metrics '
+                'with p >= 1.')
+
+        self._reduced_radius = reduce_minkowski(
+            np.array([radius], dtype=float), self._minkowski_p)[()]
+
+        self.values = ValueBuffer(dtype, directory)
+        self._cell_keys = np.empty(0, dtype=np.int64)
+        self._cell_positions = np.empty(0, dtype=np.int64)
+        self._cells = {}
+        self._adjacent_cell_offsets = None
+
+    def insert(self, new_values, new_ids):
+        new_ids = np.asarray(new_ids, dtype=np.int64)
+        if not len(new_ids):
+            return
+
+        new_values = self.values.round(new_values)
+        self._ensure_capacity(new_ids.max() + 1, new_values.shape[1])
+        self.values[new_ids] = new_values
+        self._add_to_cells(new_values, new_ids)
+
+    def restore(self, ids):
+        """Insert the values with the given ids stored in directory.
+
+        The values.npy file left in directory by a searcher with the same
+        parameters, e.g., one of a saved IncrementalDBSCAN, is memory-mapped
+        in place instead of being read and written again, and only the grid
+        is built from the values of the given ids. The searcher has to be
+        empty.
+
+        Parameters
+        ----------
+        ids : ndarray of shape (n_samples,)
+            The ids of the values in the file to be inserted.
+
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        self.values.open()
+        self._ensure_capacity(len(self.values), self.values.n_features)
+
+        for start in range(0, len(ids), self.values.ROWS_PER_CHUNK):
+            chunk = ids[start:start + self.values.ROWS_PER_CHUNK]
+            self._add_to_cells(self.values[chunk], chunk)
+
+    def _add_to_cells(self, values, ids):
+        keys = hash_rows(self._get_cells(values))
+        self._cell_keys[ids] = keys
+        add_to_buckets(self._cells, keys, ids, self._cell_positions)
+
+    def _ensure_capacity(self, size, n_features):
+        if self._adjacent_cell_offsets is None:
+            self._adjacent_cell_offsets = np.array(
+                list(product((-1., 0., 1.), repeat=n_features)))
+
+        self.values.ensure_capacity(size, n_features)
+
+        capacity = len(self.values)
+        if capacity > len(self._cell_keys):
+            self._cell_keys = extend_rows(self._cell_keys, capacity)
+            self._cell_positions = extend_rows(self._cell_positions, capacity)
+
+    def _get_cells(self, values):
+        # Adding zero turns negative zeros into zeros, so that both hash to
+        # the same cell
+        return np.floor(values / self.radius) + 0.
+
+    def query_neighbors(self, query_values):
+        # Returns neighbor pairs as two arrays: the positions of query values
+        # and the ids of their neighbors.
+
+        empty = np.empty(0, dtype=np.int64)
+        query_values = self.values.round(query_values)
+        if not len(query_values) or not self._cells:
+            return empty, empty
+
+        cells = self._get_cells(query_values)
+        keys = hash_rows(cells)
+        order = np.argsort(keys, kind='stable')
+        is_first = np.ones(len(keys), dtype=bool)
+        is_first[1:] = keys[order[1:]] != keys[order[:-1]]
+
+        # Queries are processed in the order of their cells, and the values
+        # of candidates are gathered once per cell, so that the distances are
+        # computed on values close to each other in memory. Candidates are
+        # gathered for a chunk of cells at a time, so that memory stays
+        # bounded when many values are queried at once, e.g., in fit.
+        sorted_query_values = query_values[order].T
+        cell_positions = np.cumsum(is_first) - 1
+        cell_starts = np.append(np.flatnonzero(is_first), len(keys))
+        n_cells = len(cell_starts) - 1
+
+        positions = [empty]
+        neighbor_ids = [empty]
+
+        for first_cell in range(0, n_cells, self.MAX_CELLS_PER_CHUNK):
+            last_cell = min(first_cell + self.MAX_CELLS_PER_CHUNK, n_cells)
+            candidates, candidate_starts, n_candidates = self._get_candidates(
+                cells[order[cell_starts[first_cell:last_cell]]])
+            candidate_values = self.values[candidates].T
+
+            query_start = cell_starts[first_cell]
+            query_cells = \
+                cell_positions[query_start:cell_starts[last_cell]] - first_cell
+            n_candidates_of_queries = n_candidates[query_cells]
+
+            for start, end in self._get_chunks(n_candidates_of_queries):
+                chunk_positions, chunk_candidates = self._check_candidates(
+                    sorted_query_values,
+                    np.arange(query_start + start, query_start + end),
+                    candidate_values,
+                    candidate_starts[query_cells[start:end]],
+                    n_candidates_of_queries[start:end]
+                )
+                positions.append(order[chunk_positions])
+                neighbor_ids.append(candidates[chunk_candidates])
+
+        return np.concatenate(positions), np.concatenate(neighbor_ids)
+
+    def _get_candidates(self, cells):
+        # Returns the ids in the cells adjacent to each of the given cells
+        # as one array, with the start and the number of the ids of each cell
+
+        n_cells, n_features = cells.shape
+        adjacent_cells = (
+            cells[:, np.newaxis, :] + self._adjacent_cell_offsets
+        ).reshape(-1, n_features)
+
+        candidates, n_ids = get_bucket_contents(
+            self._cells, hash_rows(adjacent_cells))
+        n_candidates = n_ids.reshape(n_cells, -1).sum(axis=1)
+        candidate_starts = np.cumsum(n_candidates) - n_candidates
+
+        return candidates, candidate_starts, n_candidates
+
+    def _get_chunks(self, n_candidates):
+        # Splits the queries into consecutive ranges with a bounded number of
+        # candidates to check
+
+        n_features = self.values.n_features
+        max_pairs = max(1, self.MAX_DISTANCES_PER_CHUNK // n_features)
+        cumulative = np.cumsum(n_candidates)
+
+        start = 0
+        while start < len(n_candidates):
+            checked = cumulative[start - 1] if start else 0
+            end = np.searchsorted(cumulative, checked + max_pairs, 'right')
+            end = max(end, start + 1)
+            yield start, end
+            start = end
+
+    def _check_candidates(self, query_values, query_positions,
+                          candidate_values, candidate_starts, n_candidates):
+        # Minkowski distances are compared to the radius in the reduced form
+        # the trees use, so that objects exactly at radius distance are
+        # neighbors the same way with both searchers. Values are passed with
+        # one row per feature.
+
+        positions = np.repeat(query_positions, n_candidates)
+        offsets = np.arange(len(positions)) - np.repeat(
+            np.cumsum(n_candidates) - n_candidates, n_candidates)
+        candidate_positions = \
+            np.repeat(candidate_starts, n_candidates) + offsets
+
+        differences = np.abs(query_values[:, positions] -
+                             candidate_values[:, candidate_positions])
+        are_neighbors = reduce_minkowski(
+            differences, self._minkowski_p, axis=0) <= self._reduced_radius
+
+        return positions[are_neighbors], candidate_positions[are_neighbors]
+
+    def get_values(self, ids):
+        return self.values[np.asarray(ids, dtype=np.int64)]
+
+    def delete(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        remove_from_buckets(
+            self._cells, self._cell_keys[ids], ids, self._cell_positions)
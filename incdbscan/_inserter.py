@@ -1,3 +1,5 @@
+import numpy as np
+
 from ._labels import (
     CLUSTER_LABEL_NOISE,
     CLUSTER_LABEL_UNCLASSIFIED
@@ -10,111 +12,149 @@ class Inserter:
         self.min_pts = min_pts
         self.objects = objects
 
-    def insert(self, object_value):
-        object_inserted = self.objects.insert_object(object_value)
+    def insert(self, object_values, object_ids):
+        self.objects.compact_cluster_labels_if_needed(
+            self.objects.graph.num_nodes())
 
-        new_core_neighbors, old_core_neighbors = \
-            self._separate_core_neighbors_by_novelty(object_inserted)
+        objects_inserted, objects_affected, neighbor_counts_before = \
+            self.objects.insert_objects(object_values, object_ids)
 
-        if not new_core_neighbors:
-            # If there is no new core object, only the new object has to be
-            # put in a cluster.
+        stats = self.objects.stats
+        new_cores = self._get_new_cores(
+            objects_affected, neighbor_counts_before)
+        stats.count('new_cores', len(new_cores))
 
-            if old_core_neighbors:
-                # If there are already core objects near to the new object,
-                # the new object is put in the most recent cluster. This is
-                # similar to case "Absorption" in the paper but not defined
-                # there.
+        # Labels are set only for the neighbors of new core objects, and for
+        # the objects being inserted
 
-                label_of_new_object = max([
-                    self.objects.get_label(obj) for obj in old_core_neighbors
-                ])
+        with stats.phase('label_rewrites'):
+            objects_labeled = self.objects.get_neighbors_of_objects(new_cores)
+        self.objects.record_old_labels(objects_labeled, objects_inserted)
 
-            else:
-                # If the new object does not have any core neighbors,
-                # it becomes a noise. Called case "Noise" in the paper.
+        if len(new_cores):
+            with stats.phase('update_seeds'):
+                update_seeds = self._get_update_seeds(new_cores)
+            stats.count('update_seeds', len(update_seeds))
+
+            with stats.phase('connected_components'):
+                connected_components_in_update_seeds = \
+                    self.objects.get_connected_components_within_objects(
+                        update_seeds)
+
+            with stats.phase('label_rewrites'):
+                self._set_labels_of_components(
+                    connected_components_in_update_seeds)
+
+                # All neighbors of each new core object inherit a label from
+                # their new core neighbor, thereby affecting border and noise
+                # objects, and the objects being inserted.
+
+                self._set_cluster_label_around_new_core_neighbors(new_cores)
+
+        # Inserted objects that are not near to any new core object still
+        # have to be put in a cluster.
 
-                label_of_new_object = CLUSTER_LABEL_NOISE
+        with stats.phase('label_rewrites'):
+            objects_not_labeled = \
+                np.setdiff1d(objects_inserted, objects_labeled)
 
-            self.objects.set_label(object_inserted, label_of_new_object)
-            return
+            for obj in objects_not_labeled.tolist():
+                self._set_label_of_object_without_new_core_neighbors(obj)
 
-        update_seeds = self._get_update_seeds(new_core_neighbors)
+        stats.count('objects_relabeled', len(objects_not_labeled))
 
-        connected_components_in_update_seeds = \
-            self.objects.get_connected_components_within_objects(update_seeds)
+    def _set_labels_of_components(self, components):
+        # Components are labeled in the order of their smallest object ids,
+        # so that new clusters get the same labels regardless of the node
+        # ids of their objects, e.g., in a model loaded from a snapshot
 
-        for component in connected_components_in_update_seeds:
+        components = sorted(
+            components,
+            key=lambda component: self.objects.object_ids[component].min()
+        )
+
+        for component in components:
+            self.objects.stats.count('objects_relabeled', len(component))
             effective_cluster_labels = \
                 self._get_effective_cluster_labels_of_objects(component)
 
             if not effective_cluster_labels:
-                # If in a connected component of update seeds there are only
-                # previously unclassified and noise objects, a new cluster is
-                # created. Corresponds to case "Creation" in the paper.
+                # If in a connected component of update seeds there are
+                # only previously unclassified and noise objects, a new
+                # cluster is created. Corresponds to case "Creation" in
+                # the paper.
 
                 next_cluster_label = self.objects.get_next_cluster_label()
                 self.objects.set_labels(component, next_cluster_label)
+                self.objects.record_label_event(
+                    'created', label=next_cluster_label)
 
             else:
                 # If in a connected component of update seeds there are
                 # already clustered objects, all objects in the component
                 # will be merged into the most recent cluster.
-                # Corresponds to cases "Absorption" and "Merge" in the paper.
+                # Corresponds to cases "Absorption" and "Merge" in the
+                # paper.
 
                 max_label = max(effective_cluster_labels)
                 self.objects.set_labels(component, max_label)
 
-                for label in effective_cluster_labels:
+                merged_labels = sorted(effective_cluster_labels - {max_label})
+                for label in merged_labels:
                     self.objects.change_labels(label, max_label)
 
-        # Finally all neighbors of each new core object inherits a label from
-        # its new core neighbor, thereby affecting border and noise objects,
-        # and the object being inserted.
+                if merged_labels:
+                    self.objects.record_label_event(
+                        'merged', labels=merged_labels, into=max_label)
 
-        self._set_cluster_label_around_new_core_neighbors(new_core_neighbors)
+    def _get_new_cores(self, objects, neighbor_counts_before):
+        was_core = neighbor_counts_before >= self.min_pts
+        return objects[~was_core & self.objects.is_core(objects)]
 
-    def _separate_core_neighbors_by_novelty(self, object_inserted):
-        new_cores = set()
-        old_cores = set()
+    def _set_label_of_object_without_new_core_neighbors(self, obj):
+        neighbors = self.objects.get_neighbors(obj)
+        core_neighbors = neighbors[self.objects.is_core(neighbors)]
 
-        for obj in object_inserted.neighbors:
-            if obj.neighbor_count == self.min_pts:
-                new_cores.add(obj)
-            elif obj.neighbor_count > self.min_pts:
-                old_cores.add(obj)
+        if len(core_neighbors):
+            # If there are already core objects near to the new object,
+            # the new object is put in the most recent cluster. This is
+            # similar to case "Absorption" in the paper but not defined
+            # there.
 
-        # If the inserted object is core, it is a new core
+            label = self.objects.get_labels(core_neighbors).max()
 
-        if object_inserted in old_cores:
-            old_cores.remove(object_inserted)
-            new_cores.add(object_inserted)
+        else:
+            # If the new object does not have any core neighbors,
+            # it becomes a noise. Called case "Noise" in the paper.
 
-        return new_cores, old_cores
-
-    def _get_update_seeds(self, new_core_neighbors):
-        seeds = set()
+            label = CLUSTER_LABEL_NOISE
 
-        for new_core_neighbor in new_core_neighbors:
-            core_neighbors = [obj for obj in new_core_neighbor.neighbors
-                              if obj.neighbor_count >= self.min_pts]
-            seeds.update(core_neighbors)
+        self.objects.set_label(obj, label)
 
-        return seeds
+    def _get_update_seeds(self, new_core_neighbors):
+        neighbors = self.objects.get_neighbors_of_objects(new_core_neighbors)
+        return neighbors[self.objects.is_core(neighbors)]
 
     def _get_effective_cluster_labels_of_objects(self, objects):
-        non_effective_cluster_labels = {CLUSTER_LABEL_UNCLASSIFIED,
-                                        CLUSTER_LABEL_NOISE}
-        effective_cluster_labels = set()
-
-        for obj in objects:
-            label = self.objects.get_label(obj)
-            if label not in non_effective_cluster_labels:
-                effective_cluster_labels.add(label)
-
-        return effective_cluster_labels
+        labels = self.objects.get_labels(objects)
+        is_effective = (labels != CLUSTER_LABEL_UNCLASSIFIED) & \
+            (labels != CLUSTER_LABEL_NOISE)
+        return set(labels[is_effective].tolist())
 
     def _set_cluster_label_around_new_core_neighbors(self, new_core_neighbors):
-        for obj in new_core_neighbors:
-            label = self.objects.get_label(obj)
-            self.objects.set_labels(obj.neighbors, label)
+        # An object near to new core objects of different clusters gets the
+        # largest of their labels
+
+        neighborhoods = [self.objects.get_neighbors(obj)
+                         for obj in new_core_neighbors.tolist()]
+        neighbors = np.concatenate(neighborhoods)
+        labels = np.repeat(
+            self.objects.get_labels(new_core_neighbors),
+            [len(neighborhood) for neighborhood in neighborhoods]
+        )
+
+        objects, positions = np.unique(neighbors, return_inverse=True)
+        largest_labels = np.full(len(objects), CLUSTER_LABEL_NOISE)
+        np.maximum.at(largest_labels, positions, labels)
+        self.objects.set_labels(objects, largest_labels)
+        self.objects.stats.count('objects_relabeled', len(neighbors))
@@ -0,0 +1,128 @@
+from math import isqrt
+
+import numpy as np
+
+from ._utils import extend_rows
+
+
+class KeyIndex:
+
+    # Maps integer keys to ids, several ids per key, e.g., object ids to node
+    # ids. Ids are small non-negative integers, each in the index at most
+    # once. There is no Python object per key or per id: an entry takes a
+    # key and an id in an array of entries, and the location of the entry of
+    # each id in an array indexed by ids.
+    #
+    # Entries are kept in two arrays sorted by key: a large run and a small
+    # buffer, and keys are looked up by binary search in both. New entries
+    # are sorted into the buffer, which is merged into the run when it grows
+    # larger than the square root of the run, so inserting an entry costs
+    # amortized O(sqrt(n)) copying and looking up a key O(log(n)).
+    #
+    # The location of an entry is its index in the run, or the complement
+    # (~index) of its index in the buffer. An entry is valid only if the
+    # location of its id points to it. Deleting an id just forgets its
+    # location, and the entries left behind are dropped when the buffer is
+    # merged, or when more than half of the run is left behind.
+
+    MIN_BUFFER_SIZE = 256
+    NO_LOCATION = np.iinfo(np.int64).min
+
+    def __init__(self):
+        self._run_keys = np.empty(0, dtype=np.int64)
+        self._run_ids = np.empty(0, dtype=np.int64)
+        self._buffer_keys = np.empty(0, dtype=np.int64)
+        self._buffer_ids = np.empty(0, dtype=np.int64)
+        self._locations = np.empty(0, dtype=np.int64)
+        self._n_left_in_run = 0
+        self._n_ids = 0
+
+    def __len__(self):
+        return self._n_ids
+
+    def insert(self, keys, ids):
+        if not len(ids):
+            return
+
+        self._ensure_capacity(ids.max() + 1)
+        self._n_ids += len(ids)
+        is_valid = self._locations[self._buffer_ids] == \
+            ~np.arange(len(self._buffer_ids))
+        keys = np.concatenate([self._buffer_keys[is_valid], keys])
+        ids = np.concatenate([self._buffer_ids[is_valid], ids])
+
+        if len(ids) > max(self.MIN_BUFFER_SIZE, isqrt(len(self._run_ids))):
+            self._merge(keys, ids)
+        else:
+            order = np.argsort(keys, kind='stable')
+            self._buffer_keys = keys[order]
+            self._buffer_ids = ids[order]
+            self._locations[self._buffer_ids] = \
+                ~np.arange(len(self._buffer_ids))
+
+    def _ensure_capacity(self, size):
+        capacity = len(self._locations)
+        if size > capacity:
+            capacity = max(size, 2 * capacity)
+            self._locations = \
+                extend_rows(self._locations, capacity, self.NO_LOCATION)
+
+    def _merge(self, keys, ids):
+        # Merges the given entries and the valid entries of the run into a
+        # new run. Both are sorted by the stable sort, which merges runs
+        # already sorted in linear time.
+
+        is_valid = self._locations[self._run_ids] == \
+            np.arange(len(self._run_ids))
+        keys = np.concatenate([self._run_keys[is_valid], keys])
+        ids = np.concatenate([self._run_ids[is_valid], ids])
+        order = np.argsort(keys, kind='stable')
+
+        self._set_run(keys[order], ids[order])
+        self._buffer_keys = np.empty(0, dtype=np.int64)
+        self._buffer_ids = np.empty(0, dtype=np.int64)
+
+    def _set_run(self, keys, ids):
+        self._run_keys = keys
+        self._run_ids = ids
+        self._locations[ids] = np.arange(len(ids))
+        self._n_left_in_run = 0
+
+    def delete(self, ids):
+        locations = self._locations[ids]
+        self._locations[ids] = self.NO_LOCATION
+        self._n_ids -= np.count_nonzero(locations != self.NO_LOCATION)
+        self._n_left_in_run += np.count_nonzero(locations >= 0)
+
+        if self._n_left_in_run > len(self._run_ids) // 2:
+            is_valid = self._locations[self._run_ids] == \
+                np.arange(len(self._run_ids))
+            self._set_run(
+                self._run_keys[is_valid], self._run_ids[is_valid])
+
+    def get(self, keys):
+        # Returns the ids of the given keys as one array, grouped by key in
+        # the order of keys, and the number of ids of each key
+
+        key_positions = []
+        ids = []
+
+        for entry_keys, entry_ids, in_buffer in (
+                (self._run_keys, self._run_ids, False),
+                (self._buffer_keys, self._buffer_ids, True)):
+            starts = np.searchsorted(entry_keys, keys, side='left')
+            n_entries = np.searchsorted(entry_keys, keys, side='right') - \
+                starts
+            entries = np.arange(n_entries.sum()) + np.repeat(
+                starts - np.cumsum(n_entries) + n_entries, n_entries)
+
+            locations = ~entries if in_buffer else entries
+            is_valid = self._locations[entry_ids[entries]] == locations
+            key_positions.append(
+                np.repeat(np.arange(len(keys)), n_entries)[is_valid])
+            ids.append(entry_ids[entries[is_valid]])
+
+        key_positions = np.concatenate(key_positions)
+        order = np.argsort(key_positions, kind='stable')
+        return (np.concatenate(ids)[order],
+                np.bincount(key_positions, minlength=len(keys)))
@@ -0,0 +1,121 @@
+import numpy as np
+
+
+class LabelChanges:
+
+    # Records how the labels of objects change in each operation, so that
+    # they can be drained in O(changes) instead of reading all labels.
+    #
+    # Labels of objects are written in place only for the objects that an
+    # operation touches. Clusters are merged by linking cluster labels, and
+    # compaction renumbers all cluster labels, without touching objects.
+    # These are recorded as events of the operation instead of changes of
+    # objects. A delta of an operation is applied by applying its events in
+    # order, then setting the new labels of the objects changed.
+    #
+    # The label of an object before an operation is recorded before the
+    # operation writes it for the first time. Objects can be recorded more
+    # than once, only their first record counts. Objects removed are
+    # recorded with their ids and values before they leave the object set.
+
+    def __init__(self):
+        self._deltas = []
+        self._operation = None
+        self._events = []
+        self._node_ids = []
+        self._old_labels = []
+        self._removed_node_ids = []
+        self._removed_object_ids = []
+        self._removed_values = []
+
+    def start(self, operation):
+        self._operation = operation
+        self._events = []
+        self._node_ids = []
+        self._old_labels = []
+        self._removed_node_ids = []
+        self._removed_object_ids = []
+        self._removed_values = []
+
+    @property
+    def is_recording(self):
+        return self._operation is not None
+
+    def add_event(self, event_type, **fields):
+        if self.is_recording:
+            self._events.append({'type': event_type, **fields})
+
+    def record_old_labels(self, node_ids, labels):
+        if self.is_recording:
+            self._node_ids.append(np.asarray(node_ids, dtype=np.int64))
+            self._old_labels.append(labels)
+
+    def record_removed_objects(self, node_ids, object_ids, values):
+        if self.is_recording:
+            self._removed_node_ids.append(node_ids)
+            self._removed_object_ids.append(object_ids)
+            self._removed_values.append(values)
+
+    def finish(self, objects):
+        if not self.is_recording:
+            return
+
+        delta = self._get_delta(objects)
+        if self._events or len(delta['old_labels']):
+            self._deltas.append({
+                'operation': self._operation,
+                'events': self._events,
+                **delta
+            })
+
+    def stop(self):
+        self._operation = None
+
+    def _get_delta(self, objects):
+        node_ids = np.concatenate(
+            [np.empty(0, dtype=np.int64), *self._node_ids])
+        old_labels = np.concatenate([np.empty(0), *self._old_labels])
+        node_ids, first_positions = np.unique(node_ids, return_index=True)
+        old_labels = old_labels[first_positions]
+
+        removed_node_ids = np.concatenate(
+            [np.empty(0, dtype=np.int64), *self._removed_node_ids])
+        is_removed = np.isin(node_ids, removed_node_ids)
+        alive_node_ids = node_ids[~is_removed]
+
+        new_labels = np.full(len(node_ids), np.nan)
+        new_labels[~is_removed] = objects.get_labels(alive_node_ids)
+        is_changed = (old_labels != new_labels) & \
+            ~(np.isnan(old_labels) & np.isnan(new_labels))
+
+        # Objects are identified by the ids given by the user, or, if they
+        # were inserted without ids, by their values
+        object_ids = np.empty(len(node_ids), dtype=np.int64)
+        object_ids[~is_removed] = objects.object_ids[alive_node_ids]
+        values = objects.get_values(alive_node_ids)
+
+        if len(removed_node_ids):
+            order = np.argsort(removed_node_ids)
+            removed_positions = order[np.searchsorted(
+                removed_node_ids, node_ids[is_removed], sorter=order)]
+            object_ids[is_removed] = \
+                np.concatenate(self._removed_object_ids)[removed_positions]
+            if values is not None:
+                all_values = np.empty((len(node_ids), values.shape[1]))
+                all_values[~is_removed] = values
+                all_values[is_removed] = \
+                    np.concatenate(self._removed_values)[removed_positions]
+                values = all_values
+
+        object_ids = object_ids[is_changed]
+        return {
+            'ids': np.where(object_ids < 0, ~object_ids, -1),
+            'values': None if values is None else values[is_changed],
+            'old_labels': old_labels[is_changed],
+            'new_labels': new_labels[is_changed],
+        }
+
+    def drain(self):
+        deltas = self._deltas
+        self._deltas = []
+        return deltas
@@ -1,4 +1,4 @@
-from collections import defaultdict
+import numpy as np
 
 
 ClusterLabel = int
@@ -9,38 +9,159 @@ CLUSTER_LABEL_FIRST_CLUSTER: ClusterLabel = 0
 
 
 class LabelHandler:
+
+    # Labels are kept in an array indexed by the node ids of objects. The
+    # array is resized together with the other columns of Objects. Slots of
+    # deleted objects are reset to unclassified so that they never take part
+    # in relabeling a cluster.
+    #
+    # The label stored for an object is not necessarily the label of its
+    # cluster. When clusters are merged, the objects of the merged clusters
+    # are not relabeled one by one. Instead, the labels of the merged
+    # clusters are linked to the label of the resulting cluster in a
+    # union-find structure over cluster labels. Labels are resolved when they
+    # are read, and both the links and the labels stored for the objects read
+    # are compressed to point to the resolved label.
+    #
+    # Cluster labels are allocated from a counter. As clusters are created,
+    # merged and split, most labels allocated die out, and the union-find
+    # grows with every label allocated. If compact_labels is set, when the
+    # number of labels allocated grows large compared to the number of
+    # objects, the labels of living clusters are compacted to a dense range,
+    # keeping their order. This renumbers the labels that users see, so it
+    # is off by default.
+    #
+    # If label_changes is set, the labels of objects before they are
+    # rewritten, and the changes of clusters, are recorded into it (see
+    # LabelChanges).
+
+    MIN_LABELS_TO_COMPACT = 4096
+
     def __init__(self):
-        self._label_to_objects = defaultdict(set)
-        self._object_to_label = {}
+        self.labels = np.empty(0, dtype=np.int64)
+        self._parent_labels = np.empty(0, dtype=np.int64)
+        self._next_cluster_label = CLUSTER_LABEL_FIRST_CLUSTER
+        self.label_changes = None
+        self.compact_labels = False
+
+    def record_old_labels(self, *node_id_arrays):
+        # Has to be called for objects before their labels are set. Labels
+        # of objects not classified yet are recorded as NaN.
+
+        if self.label_changes is None:
+            return
+
+        for node_ids in node_id_arrays:
+            labels = self.get_labels(node_ids).astype(float)
+            labels[labels == CLUSTER_LABEL_UNCLASSIFIED] = np.nan
+            self.label_changes.record_old_labels(node_ids, labels)
+
+    def record_label_event(self, event_type, **fields):
+        if self.label_changes is not None:
+            self.label_changes.add_event(event_type, **fields)
+
+    def set_label(self, node_id, label):
+        self.labels[node_id] = label
+
+    def set_label_of_inserted_objects(self, node_ids):
+        self.labels[node_ids] = CLUSTER_LABEL_UNCLASSIFIED
+
+    def set_labels(self, node_ids, label):
+        self.labels[node_ids] = label
+
+    def delete_label_of_deleted_objects(self, node_ids):
+        self.labels[node_ids] = CLUSTER_LABEL_UNCLASSIFIED
+
+    def get_label(self, node_id):
+        label = int(self.labels[node_id])
+        if label < CLUSTER_LABEL_FIRST_CLUSTER:
+            return label
 
-    def set_label(self, obj, label):
-        previous_label = self._object_to_label[obj]
-        self._label_to_objects[previous_label].remove(obj)
-        self._label_to_objects[label].add(obj)
-        self._object_to_label[obj] = label
+        root = label
+        while self._parent_labels[root] != root:
+            root = int(self._parent_labels[root])
 
-    def set_label_of_inserted_object(self, obj):
-        self._object_to_label[obj] = CLUSTER_LABEL_UNCLASSIFIED
-        self._label_to_objects[CLUSTER_LABEL_UNCLASSIFIED].add(obj)
+        self._parent_labels[label] = root
+        self.labels[node_id] = root
+        return root
 
-    def set_labels(self, objects, label):
-        for obj in objects:
-            self.set_label(obj, label)
+    def get_labels(self, node_ids):
+        labels = self.labels[node_ids]
+        is_cluster = labels >= CLUSTER_LABEL_FIRST_CLUSTER
+        cluster_labels = labels[is_cluster]
 
-    def delete_label_of_deleted_object(self, obj):
-        label = self.get_label(obj)
-        self._label_to_objects[label].remove(obj)
-        del self._object_to_label[obj]
+        roots = self._find_roots(cluster_labels)
 
-    def get_label(self, obj):
-        return self._object_to_label[obj]
+        self._parent_labels[cluster_labels] = roots
+        labels[is_cluster] = roots
+        self.labels[node_ids] = labels
+        return labels
+
+    def _find_roots(self, cluster_labels):
+        roots = cluster_labels
+        parents = self._parent_labels[roots]
+        while (parents != roots).any():
+            roots = parents
+            parents = self._parent_labels[roots]
+        return roots
 
     def get_next_cluster_label(self):
-        return max(self._label_to_objects.keys()) + 1
+        return int(self.get_next_cluster_labels(1)[0])
+
+    def get_next_cluster_labels(self, n_labels):
+        labels = np.arange(self._next_cluster_label,
+                           self._next_cluster_label + n_labels)
+        self._next_cluster_label += n_labels
+
+        capacity = len(self._parent_labels)
+        if self._next_cluster_label > capacity:
+            capacity = max(self._next_cluster_label, 2 * capacity)
+            self._parent_labels = np.append(
+                self._parent_labels,
+                np.arange(len(self._parent_labels), capacity)
+            )
+
+        return labels
 
     def change_labels(self, change_from, change_to):
-        affected_objects = self._label_to_objects.pop(change_from)
-        self._label_to_objects[change_to].update(affected_objects)
+        # Both labels have to be resolved labels
+        self._parent_labels[change_from] = change_to
+
+    def restore_labels(self, next_cluster_label):
+        # Has to be called after resolved labels are set in labels, e.g.,
+        # loaded from a snapshot. No cluster label is linked to another one.
+
+        self._next_cluster_label = int(next_cluster_label)
+        self._parent_labels = np.arange(self._next_cluster_label)
+
+    def compact_cluster_labels_if_needed(self, n_objects):
+        # The threshold depends on the number of objects, not on the size of
+        # the label array, so that a model loaded from a snapshot compacts
+        # labels at the same time as the model saved
+
+        if not self.compact_labels:
+            return
+
+        threshold = max(self.MIN_LABELS_TO_COMPACT, 2 * n_objects)
+        if self._next_cluster_label > threshold:
+            self._compact_cluster_labels()
+
+    def _compact_cluster_labels(self):
+        is_cluster = self.labels >= CLUSTER_LABEL_FIRST_CLUSTER
+        roots = self._find_roots(self.labels[is_cluster])
+
+        is_alive = np.zeros(self._next_cluster_label, dtype=bool)
+        is_alive[roots] = True
+        compacted_labels = np.cumsum(is_alive) - 1 + \
+            CLUSTER_LABEL_FIRST_CLUSTER
 
-        for obj in affected_objects:
-            self._object_to_label[obj] = change_to
+        self.labels[is_cluster] = compacted_labels[roots]
+        living_labels = np.flatnonzero(is_alive)
+        self.record_label_event(
+            'renumbered',
+            labels=living_labels,
+            new_labels=compacted_labels[living_labels]
+        )
+        self._next_cluster_label = \
+            int(is_alive.sum()) + CLUSTER_LABEL_FIRST_CLUSTER
+        self._parent_labels = np.arange(self._next_cluster_label)
@@ -0,0 +1,227 @@
+import numpy as np
+
+from ._neighbor_searcher_backend import NeighborSearcherBackend
+from ._utils import (
+    add_to_buckets,
+    extend_rows,
+    hash_rows,
+    remove_from_buckets,
+    unique
+)
+from ._value_buffer import ValueBuffer
+
+
+class LSHNeighborSearcher(NeighborSearcherBackend):
+    """Approximate neighbor searcher for the Euclidean distance, based on
+    locality-sensitive hashing with random projections.
+
+    Values are hashed into the buckets of several hash tables. In each table,
+    the hash of a value is made of its projections onto random directions,
+    each cut into intervals of bucket_width length. Values close to each
+    other are likely to share a bucket in at least one of the tables, and
+    only the values sharing a bucket with a query value are checked as its
+    neighbors. The distances of these candidates are checked exactly, so
+    neighbors found are always within the radius, but some neighbors may be
+    missed.
+
+    Useful for high-dimensional data, e.g., embeddings, where exact search
+    is slow. Pass an instance as neighbor_searcher to IncrementalDBSCAN.
+
+    Parameters
+    ----------
+    radius : float
+        The radius of neighborhood calculation. It has to be the same as eps
+        of IncrementalDBSCAN.
+
+    n_tables : int, optional (default=16)
+        The number of hash tables. More tables find more neighbors (i.e.,
+        higher recall) at the cost of more time and memory.
+
+    n_projections : int, optional (default=8)
+        The number of random projections per hash table. More projections
+        make buckets smaller, so fewer candidates are checked (i.e., faster
+        queries) at the cost of lower recall per table.
+
+    bucket_width : float, optional (default=None)
+        The length of the intervals projections are cut into. Defaults to 4
+        times the radius.
+
+    random_state : int, optional (default=None)
+        Seed of the random projections.
+
+    dtype : {numpy.float64, numpy.float32}, optional (default=numpy.float64)
+        The type coordinates are stored as. With float32, coordinates are
+        rounded to float32, and the values stored take half the memory.
+
+    directory : str or path-like, optional (default=None)
+        A directory to store coordinates in, memory-mapped to a values.npy
+        file, so that they can take more space than the memory.
+
+    """
+
+    MAX_DISTANCES_PER_CHUNK = 2 ** 20
+
+    def __init__(self, radius, n_tables=16, n_projections=8,
+                 bucket_width=None, random_state=None, dtype=np.float64,
+                 directory=None):
+        self.radius = radius
+        self.n_tables = n_tables
+        self.n_projections = n_projections
+        self.bucket_width = \
+            4 * radius if bucket_width is None else bucket_width
+        self.random_state = random_state
+
+        self.values = ValueBuffer(dtype, directory)
+        self._projections = None
+        self._offsets = None
+        self._keys = None
+        self._bucket_positions = None
+        self._tables = [{} for _ in range(n_tables)]
+
+    def insert(self, new_values, new_ids):
+        new_ids = np.asarray(new_ids, dtype=np.int64)
+        if not len(new_ids):
+            return
+
+        new_values = self.values.round(new_values)
+        self._ensure_capacity(new_ids.max() + 1, new_values.shape[1])
+        self.values[new_ids] = new_values
+        self._add_to_tables(new_values, new_ids)
+
+    def restore(self, ids):
+        """Insert the values with the given ids stored in directory.
+
+        The values.npy file left in directory by a searcher with the same
+        parameters, e.g., one of a saved IncrementalDBSCAN, is memory-mapped
+        in place instead of being read and written again, and only the hash
+        tables are built from the values of the given ids. The searcher has
+        to be empty.
+
+        Parameters
+        ----------
+        ids : ndarray of shape (n_samples,)
+            The ids of the values in the file to be inserted.
+
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        self.values.open()
+        self._ensure_capacity(len(self.values), self.values.n_features)
+
+        for start in range(0, len(ids), self.values.ROWS_PER_CHUNK):
+            chunk = ids[start:start + self.values.ROWS_PER_CHUNK]
+            self._add_to_tables(self.values[chunk], chunk)
+
+    def _add_to_tables(self, values, ids):
+        keys = self._get_keys(values)
+        self._keys[ids] = keys
+
+        # The position of each id in its bucket is kept for each table, so
+        # that deleting an id does not search its buckets
+
+        for table_ix, (table, table_keys) in enumerate(
+                zip(self._tables, keys.T)):
+            add_to_buckets(table, table_keys, ids,
+                           self._bucket_positions[:, table_ix])
+
+    def _ensure_capacity(self, size, n_features):
+        if self._projections is None:
+            random = np.random.default_rng(self.random_state)
+            n_hashes = self.n_tables * self.n_projections
+            self._projections = random.normal(size=(n_features, n_hashes))
+            self._offsets = random.uniform(
+                0, self.bucket_width, size=n_hashes)
+            self._keys = np.empty((0, self.n_tables), dtype=np.int64)
+            self._bucket_positions = np.empty_like(self._keys)
+
+        self.values.ensure_capacity(size, n_features)
+
+        capacity = len(self.values)
+        if capacity > len(self._keys):
+            self._keys = extend_rows(self._keys, capacity)
+            self._bucket_positions = \
+                extend_rows(self._bucket_positions, capacity)
+
+    def _get_keys(self, values):
+        # Returns the key of the bucket of each value in each table
+
+        intervals = np.floor(
+            (values @ self._projections + self._offsets) / self.bucket_width
+        ) + 0.
+        return np.column_stack([
+            hash_rows(table_intervals)
+            for table_intervals in np.hsplit(intervals, self.n_tables)
+        ])
+
+    def query_neighbors(self, query_values):
+        # Returns neighbor pairs as two arrays: the positions of query values
+        # and the ids of their neighbors.
+
+        empty = np.empty(0, dtype=np.int64)
+        query_values = self.values.round(query_values)
+        if not len(query_values) or self._projections is None:
+            return empty, empty
+
+        keys = self._get_keys(query_values)
+        positions = [empty]
+        neighbor_ids = [empty]
+
+        for table, table_keys in zip(self._tables, keys.T):
+            for bucket_positions, bucket_ids in _get_buckets_of_queries(
+                    table, table_keys):
+                bucket_values = self.values[bucket_ids]
+                chunk_size = max(
+                    1, self.MAX_DISTANCES_PER_CHUNK // len(bucket_ids))
+
+                for start in range(0, len(bucket_positions), chunk_size):
+                    chunk_positions = \
+                        bucket_positions[start:start + chunk_size]
+                    pair_positions, pair_ids = np.nonzero(self._are_neighbors(
+                        query_values[chunk_positions], bucket_values))
+                    positions.append(chunk_positions[pair_positions])
+                    neighbor_ids.append(bucket_ids[pair_ids])
+
+        # Neighbors found in more than one table are returned only once
+        capacity = len(self.values)
+        pairs = unique(
+            np.concatenate(positions) * capacity +
+            np.concatenate(neighbor_ids)
+        )
+        return np.divmod(pairs, capacity)
+
+    def _are_neighbors(self, X, Y):
+        # Squared distances are computed with a matrix product, the same way
+        # as in pairwise_distances of scikit-learn
+
+        squared_distances = (
+            np.einsum('ij,ij->i', X, X)[:, np.newaxis] +
+            np.einsum('ij,ij->i', Y, Y)[np.newaxis, :] -
+            2 * X @ Y.T
+        )
+        return squared_distances <= self.radius ** 2
+
+    def get_values(self, ids):
+        return self.values[np.asarray(ids, dtype=np.int64)]
+
+    def delete(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+
+        for table_ix, (table, table_keys) in enumerate(
+                zip(self._tables, self._keys[ids].T)):
+            remove_from_buckets(table, table_keys, ids,
+                                self._bucket_positions[:, table_ix])
+
+
+def _get_buckets_of_queries(table, keys):
+    # Yields the positions of the queries with the same key, together with
+    # the ids in the bucket of their key
+
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    boundaries = np.flatnonzero(np.diff(sorted_keys)) + 1
+    starts = [0, *boundaries.tolist()]
+    ends = [*boundaries.tolist(), len(keys)]
+
+    for key, start, end in zip(sorted_keys[starts].tolist(), starts, ends):
+        bucket = table.get(key)
+        if bucket is not None:
+            yield order[start:end], np.array(bucket, dtype=np.int64)
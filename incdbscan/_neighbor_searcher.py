@@ -1,36 +1,272 @@
 import numpy as np
-from sklearn.neighbors import NearestNeighbors
-from sortedcontainers import SortedList
+from sklearn.metrics import (
+    DistanceMetric,
+    pairwise_distances
+)
+from sklearn.neighbors import (
+    BallTree,
+    KDTree,
+    NearestNeighbors
+)
 
+from ._neighbor_searcher_backend import NeighborSearcherBackend
+from ._utils import extend_rows
+from ._value_buffer import ValueBuffer
 
-class NeighborSearcher:
-    def __init__(self, radius, metric, p):
-        self.neighbor_searcher = \
-            NearestNeighbors(radius=radius, metric=metric, p=p)
-        self.values = np.array([])
-        self.ids = SortedList()
 
-    def insert(self, new_value, new_id):
-        self.ids.add(new_id)
-        position = self.ids.index(new_id)
+MINKOWSKI_P_OF_METRIC = {
+    'euclidean': 2,
+    'l2': 2,
+    'manhattan': 1,
+    'cityblock': 1,
+    'l1': 1,
+    'chebyshev': np.inf,
+    'infinity': np.inf,
+}
 
-        self._insert_into_array(new_value, position)
-        self.neighbor_searcher = self.neighbor_searcher.fit(self.values)
 
-    def _insert_into_array(self, new_value, position):
-        extended = np.insert(self.values, position, new_value, axis=0)
-        if not self.values.size:
-            extended = extended.reshape(1, -1)
-        self.values = extended
+class NeighborSearcher(NeighborSearcherBackend):
+    """Exact neighbor searcher based on the trees of scikit-learn, the
+    backend used by IncrementalDBSCAN with neighbor_searcher='tree'.
 
-    def query_neighbors(self, query_value):
-        neighbor_indices = self.neighbor_searcher.radius_neighbors(
-            [query_value], return_distance=False)[0]
+    Parameters
+    ----------
+    radius : float
+        The radius of neighborhood calculation. It has to be the same as eps
+        of IncrementalDBSCAN.
 
-        for ix in neighbor_indices:
-            yield self.ids[ix]
+    metric : string or callable, optional (default='minkowski')
+        The distance metric, as in IncrementalDBSCAN.
 
-    def delete(self, id_):
-        position = self.ids.index(id_)
-        del self.ids[position]
-        self.values = np.delete(self.values, position, axis=0)
+    p : float or int, optional (default=2)
+        Parameter for Minkowski distance if metric='minkowski'.
+
+    garbage_ratio : float, optional (default=0.1)
+        The tree is rebuilt when the number of values inserted or deleted
+        since it was built exceeds this fraction of the values in the tree.
+        Higher ratios make rebuilds rarer but searches slower.
+
+    dtype : {numpy.float64, numpy.float32}, optional (default=numpy.float64)
+        The type coordinates are stored as. With float32, coordinates are
+        rounded to float32, and the values stored take half the memory.
+
+    directory : str or path-like, optional (default=None)
+        A directory to store coordinates in, memory-mapped to a
+        tree_values.npy file, so that they can take more space than the
+        memory. The tree built over the coordinates is still held in memory.
+
+    """
+
+    # Refitting a spatial index after every insertion is what made insertion
+    # quadratic. Instead, the index covers only a snapshot of the values.
+    # Values inserted since the index was built are kept in a pending range
+    # of slots that is scanned by brute force. Deleted values are only marked
+    # with tombstones, both in the snapshot and in the pending range, so a
+    # deletion costs neither a copy of the values nor a refit, and the index
+    # never returns deleted values. The index is rebuilt lazily, compacting
+    # the living values, when the number of pending and deleted values grows
+    # large compared to the size of the snapshot, so the cost of rebuilding
+    # is amortized over many insertions and deletions. A batch of queries
+    # large enough that scanning the pending values would cost more than
+    # rebuilding also triggers a rebuild.
+    #
+    # Values and ids are kept in arrays whose capacity is doubled when they
+    # are full: the snapshot is the first slots, followed by the pending
+    # values. The ids array maps slots to ids.
+
+    MIN_REBUILD_THRESHOLD = 64
+    MAX_PENDING_DISTANCES_PER_VALUE = 64
+    MAX_DISTANCES_PER_CHUNK = 2 ** 20
+
+    def __init__(self, radius, metric='minkowski', p=2, garbage_ratio=0.1,
+                 dtype=np.float64, directory=None):
+        self.radius = radius
+        self.metric = metric
+        self.p = p
+        self.garbage_ratio = garbage_ratio
+        self._metric_params = \
+            {'p': p} if metric in ('minkowski', 'p') else {}
+        self._tree_class = self._get_tree_class(metric)
+        self._distance_metric = (
+            DistanceMetric.get_metric(metric, **self._metric_params)
+            if self._tree_class is not None else None
+        )
+        self._minkowski_p = get_minkowski_p(metric, p)
+
+        self.index = None
+        self.values = ValueBuffer(dtype, directory, 'tree_values')
+        self.ids = np.empty(0, dtype=np.int64)
+        self._deleted = np.empty(0, dtype=bool)
+        self._n_values = 0
+        self._n_indexed = 0
+        self._n_deleted = 0
+        self._id_to_position = {}
+
+    def insert(self, new_values, new_ids):
+        new_values = self.values.round(new_values)
+        new_ids = np.asarray(new_ids, dtype=np.int64)
+        start, end = self._n_values, self._n_values + len(new_ids)
+
+        self._ensure_capacity(end, new_values.shape[1])
+        self.values[start:end] = new_values
+        self.ids[start:end] = new_ids
+        self._deleted[start:end] = False
+        self._id_to_position.update(zip(new_ids.tolist(), range(start, end)))
+        self._n_values = end
+
+        if self._needs_rebuild():
+            self._rebuild()
+
+    def _ensure_capacity(self, size, n_features):
+        self.values.ensure_capacity(size, n_features)
+
+        capacity = len(self.values)
+        if capacity > len(self.ids):
+            self.ids = extend_rows(self.ids, capacity)
+            self._deleted = extend_rows(self._deleted, capacity)
+
+    def _needs_rebuild(self):
+        garbage = self._n_values - self._n_indexed + self._n_deleted
+        threshold = max(self.MIN_REBUILD_THRESHOLD,
+                        self.garbage_ratio * self._n_indexed)
+        return garbage > threshold
+
+    def _rebuild(self):
+        alive = np.flatnonzero(~self._deleted[:self._n_values])
+        n_alive = len(alive)
+
+        self.values.compact(alive)
+        self.ids[:n_alive] = self.ids[alive]
+        self._deleted[:] = False
+        self._n_values = self._n_indexed = n_alive
+        self._n_deleted = 0
+        self._id_to_position = dict(
+            zip(self.ids[:n_alive].tolist(), range(n_alive)))
+
+        self.index = \
+            self._build_index(self.values[:n_alive]) if n_alive else None
+
+    @staticmethod
+    def _get_tree_class(metric):
+        # Trees are queried directly because going through NearestNeighbors
+        # costs input validation and a parallel dispatch on every query.
+        # Metrics that no tree supports fall back to NearestNeighbors.
+
+        if metric in KDTree.valid_metrics:
+            return KDTree
+        if callable(metric) or metric in BallTree.valid_metrics:
+            return BallTree
+        return None
+
+    def _build_index(self, values):
+        if self._tree_class is None:
+            return NearestNeighbors(
+                radius=self.radius, metric=self.metric, algorithm='brute'
+            ).fit(values)
+
+        return self._tree_class(
+            values, metric=self.metric, **self._metric_params)
+
+    def _query_index(self, query_values):
+        if self._tree_class is None:
+            return self.index.radius_neighbors(
+                query_values, return_distance=False)
+        return self.index.query_radius(query_values, self.radius)
+
+    def query_neighbors(self, query_values):
+        # Returns neighbor pairs as two arrays: the positions of query values
+        # and the ids of their neighbors.
+
+        query_values = self.values.round(query_values)
+        positions = [np.empty(0, dtype=np.int64)]
+        neighbor_ids = [np.empty(0, dtype=np.int64)]
+
+        n_pending = self._n_values - self._n_indexed
+        if n_pending * len(query_values) > \
+                self.MAX_PENDING_DISTANCES_PER_VALUE * self._n_values:
+            self._rebuild()
+
+        if self.index is not None:
+            all_neighbor_indices = self._query_index(query_values)
+            n_neighbors = [len(indices) for indices in all_neighbor_indices]
+
+            indices = np.concatenate(all_neighbor_indices).astype(np.int64)
+            is_alive = ~self._deleted[indices]
+            positions.append(np.repeat(
+                np.arange(len(query_values)), n_neighbors)[is_alive])
+            neighbor_ids.append(self.ids[indices[is_alive]])
+
+        pending_positions = self._n_indexed + np.flatnonzero(
+            ~self._deleted[self._n_indexed:self._n_values])
+
+        if len(pending_positions):
+            pending_values = self.values[pending_positions]
+            pending_ids = self.ids[pending_positions]
+            chunk_size = max(1, self.MAX_DISTANCES_PER_CHUNK //
+                             pending_values.size)
+
+            for start in range(0, len(query_values), chunk_size):
+                are_neighbors = self._are_neighbors(
+                    query_values[start:start + chunk_size], pending_values)
+                chunk_positions, neighbor_positions = \
+                    np.nonzero(are_neighbors)
+                positions.append(chunk_positions + start)
+                neighbor_ids.append(pending_ids[neighbor_positions])
+
+        return np.concatenate(positions), np.concatenate(neighbor_ids)
+
+    def _are_neighbors(self, X, Y):
+        # Minkowski distances are compared to the radius in the reduced form
+        # the trees use (e.g., squared for euclidean). Otherwise the index and
+        # the pending values could disagree on whether objects exactly at
+        # radius distance are neighbors.
+
+        if self._minkowski_p is not None:
+            differences = np.abs(X[:, np.newaxis, :] - Y[np.newaxis, :, :])
+            reduced_distances = reduce_minkowski(
+                differences, self._minkowski_p)
+            reduced_radius = reduce_minkowski(
+                np.array([self.radius]), self._minkowski_p)
+            return reduced_distances <= reduced_radius
+
+        if self._tree_class is None:
+            distances = pairwise_distances(X, Y, metric=self.metric)
+        else:
+            distances = self._distance_metric.pairwise(X, Y)
+        return distances <= self.radius
+
+    def get_values(self, ids):
+        id_to_position = self._id_to_position
+        positions = [id_to_position[id_] for id_ in np.asarray(ids).tolist()]
+        return self.values[positions]
+
+    def delete(self, ids):
+        pop_position = self._id_to_position.pop
+        positions = [pop_position(id_) for id_ in ids]
+
+        self._deleted[positions] = True
+        self._n_deleted += len(positions)
+
+        if self._needs_rebuild():
+            self._rebuild()
+
+
+def get_minkowski_p(metric, p):
+    # Returns the p of Minkowski metrics, and None for other metrics
+
+    if metric in ('minkowski', 'p'):
+        return p
+    return MINKOWSKI_P_OF_METRIC.get(metric)
+
+
+def reduce_minkowski(differences, p, axis=-1):
+    # Reduces absolute coordinate differences along the given axis to the
+    # reduced Minkowski distance, i.e., the distance to the power of p.
+
+    if p == np.inf:
+        return differences.max(axis=axis)
+    if p == 1:
+        return differences.sum(axis=axis)
+    if p == 2:
+        return (differences * differences).sum(axis=axis)
+    return (differences ** p).sum(axis=axis)
@@ -0,0 +1,112 @@
+from typing import (
+    Protocol,
+    Sequence,
+    Tuple
+)
+
+import numpy as np
+
+
+class NeighborSearcherBackend(Protocol):
+    """The protocol of the data structures that IncrementalDBSCAN uses to
+    search for the neighbors of objects.
+
+    An object that implements insert, delete and query_neighbors can be
+    passed to IncrementalDBSCAN as neighbor_searcher. The neighbors of a
+    value are the values inserted and not yet deleted that are within the
+    radius of the backend (eps of IncrementalDBSCAN) from it, including the
+    value itself if it was inserted. Neighborhood has to be symmetric: if a
+    is found as a neighbor of b, b has to be found as a neighbor of a.
+    Approximate backends may miss neighbors, but they should not return
+    values farther than the radius.
+
+    Values are identified by integer ids that IncrementalDBSCAN assigns.
+    Ids are small non-negative integers, and the id of a deleted value may be
+    reused for a value inserted later.
+
+    Subclassing is not required, but subclasses get query_radius
+    implemented through query_neighbors. Implementing get_values is
+    optional, but IncrementalDBSCAN can be saved only with backends that
+    implement it.
+
+    """
+
+    def insert(self, new_values: np.ndarray, new_ids: np.ndarray) -> None:
+        """Insert values with the given ids.
+
+        Parameters
+        ----------
+        new_values : ndarray of shape (n_samples, n_features)
+            The values to be inserted.
+
+        new_ids : ndarray of shape (n_samples,)
+            The ids of the values, none of which is in use.
+
+        """
+        raise NotImplementedError
+
+    def delete(self, ids: Sequence[int]) -> None:
+        """Delete the values with the given ids.
+
+        Parameters
+        ----------
+        ids : sequence of int
+            The ids of values inserted before and not yet deleted.
+
+        """
+        raise NotImplementedError
+
+    def query_neighbors(
+            self,
+            query_values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Search for the neighbors of a batch of values.
+
+        Parameters
+        ----------
+        query_values : ndarray of shape (n_queries, n_features)
+            The values to search for the neighbors of.
+
+        Returns
+        -------
+        positions : ndarray of shape (n_pairs,)
+            The position of the query value of each neighbor pair.
+
+        neighbor_ids : ndarray of shape (n_pairs,)
+            The id of the neighbor of each neighbor pair.
+
+        """
+        raise NotImplementedError
+
+    def get_values(self, ids: np.ndarray) -> np.ndarray:
+        """Get the values with the given ids.
+
+        Parameters
+        ----------
+        ids : ndarray of shape (n_samples,)
+            The ids of values inserted before and not yet deleted.
+
+        Returns
+        -------
+        values : ndarray of shape (n_samples, n_features)
+            The values with the given ids, as they are stored.
+
+        """
+        raise NotImplementedError
+
+    def query_radius(self, query_value: np.ndarray) -> np.ndarray:
+        """Search for the neighbors of one value.
+
+        Parameters
+        ----------
+        query_value : ndarray of shape (n_features,)
+            The value to search for the neighbors of.
+
+        Returns
+        -------
+        neighbor_ids : ndarray
+            The ids of the neighbors of the value.
+
+        """
+        _, neighbor_ids = self.query_neighbors(
+            np.asarray(query_value, dtype=float).reshape(1, -1))
+        return neighbor_ids
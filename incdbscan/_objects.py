@@ -1,125 +1,486 @@
-from typing import (
-    Dict,
-    List,
-    Set
-)
+from copy import deepcopy
+from itertools import chain
+from pathlib import Path
+from typing import List
 
+import numpy as np
 import rustworkx as rx
 
-from ._labels import LabelHandler
-from ._neighbor_searcher import NeighborSearcher
-from ._object import (
-    NodeId,
-    Object,
-    ObjectId
+from ._grid_neighbor_searcher import GridNeighborSearcher
+from ._key_index import KeyIndex
+from ._labels import (
+    CLUSTER_LABEL_NOISE,
+    CLUSTER_LABEL_UNCLASSIFIED,
+    LabelHandler
+)
+from ._lsh_neighbor_searcher import LSHNeighborSearcher
+from ._neighbor_searcher import (
+    NeighborSearcher,
+    get_minkowski_p
+)
+from ._stats import NullStats
+from ._utils import (
+    extend_rows,
+    get_connected_component_ids,
+    is_memory_mapped_from,
+    unique
 )
-from ._utils import hash_
 
 
 class Objects(LabelHandler):
-    def __init__(self, eps, min_pts, metric, p):
+
+    # Objects are not represented by Python instances. Every object gets a
+    # node in the graph, and its node id is used as a slot in the arrays that
+    # hold the state of objects: the id of the object, its count (how many
+    # times it was inserted), and its neighbor count (the sum of the counts
+    # of objects in its neighborhood, including itself). Node ids of removed
+    # objects are reused by the graph, so the arrays stay dense. Adjacency is
+    # stored only in the graph, and node ids are found by object id in a
+    # KeyIndex. Whether an object is core is computed from its neighbor count
+    # when it is looked up; caching it in an array was measured to be no
+    # faster.
+    #
+    # The number of features of objects is fixed by the first objects
+    # inserted, and kept in n_features.
+    #
+    # With neighbor_searcher='auto', the neighbor searcher is chosen when the
+    # first objects are inserted and their dimension is known: the grid for
+    # low-dimensional data and Minkowski metrics, trees otherwise. A backend
+    # object given as neighbor_searcher is copied, so that it stays empty and
+    # can be used again when the object set is refitted.
+    #
+    # With a storage directory, the arrays of objects and the coordinates
+    # held by the neighbor searcher are memory-mapped to .npy files in it.
+    #
+    # The state of objects can be taken as arrays indexed by node ids (see
+    # get_state) and restored into an empty object set without searching
+    # for neighbors again, as the edges of the graph are part of the state.
+    # The state saved into the storage directory is its files themselves,
+    # which can be used in place when it is restored.
+    #
+    # Statistics of operations are recorded into stats, and changes of
+    # labels into label_changes, which are shared with the classes that
+    # update the object set.
+
+    COLUMN_NAMES = ('object_ids', 'counts', 'neighbor_counts', 'labels')
+    MIN_CAPACITY = 64
+    EDGES_PER_CHUNK = 2 ** 16
+    VALUES_PER_CHUNK = 2 ** 18
+    GRID_MAX_N_FEATURES = 3
+
+    def __init__(self, eps, min_pts, metric, p, neighbor_searcher='auto',
+                 storage_directory=None, stats=None, label_changes=None,
+                 compact_labels=False):
         super().__init__()
+        self.label_changes = label_changes
+        self.compact_labels = compact_labels
 
-        self.graph = rx.PyGraph(multigraph=False)  # pylint: disable=no-member
-        self._object_id_to_node_id: Dict[ObjectId, NodeId] = {}
+        # Objects are linked only once, so the graph does not need to check
+        # for parallel edges, which would cost time linear in the degree of
+        # objects for every link
+        self.graph = rx.PyGraph(multigraph=True)  # pylint: disable=no-member
+        self._node_ids_by_object_id = KeyIndex()
 
-        self.neighbor_searcher = \
-            NeighborSearcher(radius=eps, metric=metric, p=p)
+        self.object_ids = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.neighbor_counts = np.empty(0, dtype=np.int64)
+
+        self.n_features = None
+        self.eps = eps
+        self.metric = metric
+        self.p = p
         self.min_pts = min_pts
+        self.storage_directory = storage_directory
+        self.stats = NullStats() if stats is None else stats
+
+        if not isinstance(neighbor_searcher, str):
+            if not _is_neighbor_searcher_backend(neighbor_searcher):
+                raise ValueError(
+                    'neighbor_searcher must implement insert, delete and '
+                    'query_neighbors.')
+            self.neighbor_searcher = deepcopy(neighbor_searcher)
+        elif neighbor_searcher in ('grid', 'tree'):
+            self.neighbor_searcher = \
+                self._create_neighbor_searcher(neighbor_searcher)
+        elif neighbor_searcher == 'auto':
+            self.neighbor_searcher = None
+        else:
+            raise ValueError(
+                "neighbor_searcher must be 'auto', 'grid', 'tree' or a "
+                "backend object.")
+
+    def _create_neighbor_searcher(self, kind):
+        searcher_class = \
+            GridNeighborSearcher if kind == 'grid' else NeighborSearcher
+        return searcher_class(radius=self.eps, metric=self.metric, p=self.p,
+                              directory=self.storage_directory)
+
+    def _choose_neighbor_searcher(self, n_features):
+        minkowski_p = get_minkowski_p(self.metric, self.p)
+        if minkowski_p is not None and minkowski_p >= 1 and \
+                n_features <= self.GRID_MAX_N_FEATURES:
+            return 'grid'
+        return 'tree'
+
+    def get_objects(self, object_ids):
+        # Returns the node ids of the objects with the given object ids, and
+        # -1 for object ids that are not in the object set
+
+        node_ids = np.full(len(object_ids), -1, dtype=np.int64)
+        found_node_ids, n_found = self._node_ids_by_object_id.get(object_ids)
+        node_ids[n_found > 0] = found_node_ids
+        return node_ids
+
+    def is_core(self, node_ids):
+        return self.neighbor_counts[node_ids] >= self.min_pts
+
+    def get_neighbors(self, node_id):
+        # The neighborhood of an object contains the object itself
+        neighbors = np.array(self.graph.neighbors(node_id), dtype=np.int64)
+        return np.append(neighbors, node_id)
+
+    def get_neighbors_of_objects(self, node_ids):
+        if not len(node_ids):
+            return np.empty(0, dtype=np.int64)
+        return unique(np.concatenate(
+            [self.get_neighbors(node_id) for node_id in node_ids]))
+
+    def get_labels_around_values(self, values):
+        # Returns for each of the values the largest label among the core
+        # objects in its neighborhood, or noise if there are none, without
+        # inserting the values. All values are queried at once.
+
+        labels = np.full(len(values), CLUSTER_LABEL_NOISE, dtype=np.int64)
+        if self.neighbor_searcher is None:
+            return labels
+
+        with self.stats.phase('neighbor_search'):
+            positions, neighbors = \
+                self.neighbor_searcher.query_neighbors(values)
+        self.stats.count('neighbors_found', len(neighbors))
+
+        is_core = self.is_core(neighbors)
+        np.maximum.at(
+            labels, positions[is_core], self.get_labels(neighbors[is_core]))
+        return labels
+
+    def insert_objects(self, values, object_ids):
+        # Inserts a batch of values identified by the given object ids.
+        # Object ids already in the object set, or occurring multiple times
+        # in the batch, increase the count of a single object. The neighbors
+        # of all new objects are searched for with one query. Returns the
+        # distinct objects inserted, the objects whose neighbor count was
+        # increased, and their neighbor counts as they were before the
+        # insertion.
+
+        if self.n_features is None:
+            self.n_features = values.shape[1]
+
+        object_ids, first_positions, counts = np.unique(
+            object_ids, return_index=True, return_counts=True)
+        order = np.argsort(first_positions)
+        object_ids = object_ids[order]
+        first_positions = first_positions[order]
+        counts = counts[order]
+
+        node_ids = self.get_objects(object_ids)
+        is_new = node_ids == -1
+        old_node_ids = node_ids[~is_new]
+        old_counts = counts[~is_new]
+        new_node_ids = self._insert_graph_metadata(object_ids[is_new])
+        self.counts[old_node_ids] += old_counts
+        self.counts[new_node_ids] = counts[is_new]
+
+        neighborhoods_of_old_objects = [
+            self.get_neighbors(node_id) for node_id in old_node_ids]
+
+        with self.stats.phase('neighbor_search'):
+            sources, targets = self._search_neighbors_of_new_objects(
+                new_node_ids, values[first_positions[is_new]])
+        self.stats.count('neighbors_found', len(targets))
+
+        node_ids_affected = unique(np.concatenate(
+            [new_node_ids, targets, *neighborhoods_of_old_objects]))
+        neighbor_counts_before = self.neighbor_counts[node_ids_affected]
+
+        with self.stats.phase('graph_update'):
+            for neighbors, count in zip(
+                    neighborhoods_of_old_objects, old_counts):
+                self.neighbor_counts[neighbors] += count
+
+            self._link_new_objects(new_node_ids, sources, targets)
+
+        node_ids_inserted = np.concatenate([old_node_ids, new_node_ids])
+        return node_ids_inserted, node_ids_affected, neighbor_counts_before
+
+    def _insert_graph_metadata(self, object_ids):
+        node_ids = np.array(
+            self.graph.add_nodes_from([None] * len(object_ids)),
+            dtype=np.int64
+        )
+        if not len(node_ids):
+            return node_ids
+
+        self._ensure_capacity(node_ids.max() + 1)
+        self.object_ids[node_ids] = object_ids
+        self.neighbor_counts[node_ids] = 0
+        self.set_label_of_inserted_objects(node_ids)
+        self._node_ids_by_object_id.insert(object_ids, node_ids)
+
+        return node_ids
+
+    def _ensure_capacity(self, size):
+        capacity = len(self.counts)
+        if size <= capacity:
+            return
+
+        capacity = max(size, 2 * capacity, self.MIN_CAPACITY)
+        self.object_ids = self._extend('object_ids', capacity, 0)
+        self.counts = self._extend('counts', capacity, 0)
+        self.neighbor_counts = self._extend('neighbor_counts', capacity, 0)
+        self.labels = self._extend(
+            'labels', capacity, CLUSTER_LABEL_UNCLASSIFIED)
+
+    def _extend(self, name, size, fill_value):
+        return extend_rows(getattr(self, name), size, fill_value,
+                           self._get_storage_path(name))
+
+    def _get_storage_path(self, name):
+        if self.storage_directory is None:
+            return None
+        return Path(self.storage_directory) / f'{name}.npy'
+
+    def _is_in_storage(self, array, name):
+        path = self._get_storage_path(name)
+        return path is not None and is_memory_mapped_from(array, path)
+
+    def _search_neighbors_of_new_objects(self, new_node_ids, new_values):
+        # Returns pairs of new objects and their neighbors as two arrays
+
+        if not len(new_node_ids):
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+
+        if self.neighbor_searcher is None:
+            self.neighbor_searcher = self._create_neighbor_searcher(
+                self._choose_neighbor_searcher(new_values.shape[1]))
+
+        self.neighbor_searcher.insert(new_values, new_node_ids)
+        positions, targets = self.neighbor_searcher.query_neighbors(new_values)
 
-    def get_object(self, value):
-        object_id = hash_(value)
-        if object_id in self._object_id_to_node_id:
-            obj = self._get_object_from_object_id(object_id)
-            return obj
-        return None
-
-    def insert_object(self, value):
-        object_id = hash_(value)
-
-        if object_id in self._object_id_to_node_id:
-            obj = self._get_object_from_object_id(object_id)
-            obj.count += 1
-            for neighbor in obj.neighbors:
-                neighbor.neighbor_count += 1
-            return obj
-
-        new_object = Object(object_id, self.min_pts)
-
-        self._insert_graph_metadata(new_object)
-        self.set_label_of_inserted_object(new_object)
-        self.neighbor_searcher.insert(value, object_id)
-        self._update_neighbors_during_insertion(new_object, value)
-        return new_object
-
-    def _insert_graph_metadata(self, new_object):
-        node_id = self.graph.add_node(new_object)
-        new_object.node_id = node_id
-        object_id = new_object.id
-        self._object_id_to_node_id[object_id] = node_id
-
-    def _update_neighbors_during_insertion(self, object_inserted, new_value):
-        neighbors = self._get_neighbors(new_value)
-        for obj in neighbors:
-            obj.neighbor_count += 1
-            if obj.id != object_inserted.id:
-                object_inserted.neighbor_count += obj.count
-                obj.neighbors.add(object_inserted)
-                object_inserted.neighbors.add(obj)
-                self.graph.add_edge(object_inserted.node_id, obj.node_id, None)
-
-    def _get_neighbors(self, query_value):
-        neighbor_ids = self.neighbor_searcher.query_neighbors(query_value)
-
-        for id_ in neighbor_ids:
-            obj = self._get_object_from_object_id(id_)
-            yield obj
-
-    def _get_object_from_object_id(self, object_id):
-        node_id = self._object_id_to_node_id[object_id]
-        obj = self.graph[node_id]
-        return obj
-
-    def delete_object(self, obj):
-        obj.count -= 1
-        remove_from_data = obj.count == 0
-
-        for neighbor in obj.neighbors:
-            neighbor.neighbor_count -= 1
-            if remove_from_data:
-                if neighbor.id != obj.id:
-                    neighbor.neighbors.remove(obj)
-
-        if remove_from_data:
-            self._delete_graph_metadata(obj)
-            self.neighbor_searcher.delete(obj.id)
-            self.delete_label_of_deleted_object(obj)
-
-    def _delete_graph_metadata(self, deleted_object):
-        node_id = deleted_object.node_id
-        self.graph.remove_node(node_id)
-        del self._object_id_to_node_id[deleted_object.id]
+        return new_node_ids[positions], targets
+
+    def _link_new_objects(self, new_node_ids, sources, targets):
+        # A pair of new objects is found by the queries of both of them, but
+        # it is linked only once, from the smaller node id.
+
+        self.neighbor_counts[new_node_ids] += self.counts[new_node_ids]
+
+        is_new = np.zeros(len(self.counts), dtype=bool)
+        is_new[new_node_ids] = True
+        to_link = (sources < targets) | \
+            ((sources > targets) & ~is_new[targets])
+        node_ids_1, node_ids_2 = sources[to_link], targets[to_link]
+
+        np.add.at(self.neighbor_counts, node_ids_1, self.counts[node_ids_2])
+        np.add.at(self.neighbor_counts, node_ids_2, self.counts[node_ids_1])
+        self._add_edges(node_ids_1, node_ids_2)
+
+    def _add_edges(self, node_ids_1, node_ids_2):
+        # The graph takes edges as a list of tuples, which take far more
+        # memory than the arrays of node ids, so they are added in chunks
+
+        for start in range(0, len(node_ids_1), self.EDGES_PER_CHUNK):
+            end = start + self.EDGES_PER_CHUNK
+            self.graph.add_edges_from_no_data(list(zip(
+                node_ids_1[start:end].tolist(),
+                node_ids_2[start:end].tolist()
+            )))
+
+    def get_edges(self):
+        # Returns the edges of the graph as an array of pairs of node ids.
+        # The pairs of the graph are read one by one instead of being turned
+        # into a list of tuples at once.
+
+        edges = self.graph.edge_list()
+        return np.fromiter(
+            chain.from_iterable(edges), dtype=np.int64, count=2 * len(edges)
+        ).reshape(-1, 2)
+
+    def decrease_counts(self, node_ids, counts):
+        # Decreases the count of each object by the given amount. Objects
+        # whose count drops to zero are not removed yet, so that their
+        # neighborhoods remain available until remove_objects is called.
+        # Returns the objects whose neighbor count was decreased and their
+        # neighbor counts as they were before the deletion.
+
+        neighborhoods = [self.get_neighbors(node_id) for node_id in node_ids]
+        node_ids_affected = unique(np.concatenate(neighborhoods))
+        neighbor_counts_before = self.neighbor_counts[node_ids_affected]
+
+        self.counts[node_ids] -= counts
+        for neighbors, count in zip(neighborhoods, counts):
+            self.neighbor_counts[neighbors] -= count
+
+        return node_ids_affected, neighbor_counts_before
+
+    def remove_objects(self, node_ids):
+        if not len(node_ids):
+            return
+
+        if self.label_changes is not None:
+            self.record_old_labels(node_ids)
+            self.label_changes.record_removed_objects(
+                node_ids, self.object_ids[node_ids],
+                self.get_values(node_ids))
+
+        with self.stats.phase('graph_update'):
+            self.graph.remove_nodes_from(node_ids.tolist())
+            self._node_ids_by_object_id.delete(node_ids)
+
+            self.neighbor_counts[node_ids] = 0
+            self.delete_label_of_deleted_objects(node_ids)
+
+        with self.stats.phase('neighbor_search'):
+            self.neighbor_searcher.delete(node_ids.tolist())
+
+    def get_values(self, node_ids):
+        # Returns None if the neighbor searcher does not implement get_values
+
+        if not callable(getattr(self.neighbor_searcher, 'get_values', None)):
+            return None
+        return self.neighbor_searcher.get_values(node_ids)
+
+    def get_state(self):
+        # Returns the state of the objects as a dict of arrays indexed by
+        # node ids, with counts of zero at node ids not in use, and the edges
+        # as pairs of node ids. The arrays of objects are the columns of the
+        # object set, so with a storage directory they are the memory-mapped
+        # files there. Labels are resolved in the columns first.
+
+        node_ids = np.array(self.graph.node_indices(), dtype=np.int64)
+        self.get_labels(node_ids)
+
+        return {
+            **{name: getattr(self, name) for name in self.COLUMN_NAMES},
+            'values': self._get_values_by_node_id(node_ids),
+            'next_cluster_label': np.array(self._next_cluster_label),
+            'edges': self.get_edges(),
+        }
+
+    def _get_values_by_node_id(self, node_ids):
+        # Searchers that keep values by id return the array of their values
+        # itself, memory-mapped if they keep it in a directory
+
+        if isinstance(self.neighbor_searcher,
+                      (GridNeighborSearcher, LSHNeighborSearcher)):
+            values = self.neighbor_searcher.values.array
+            return np.empty((0, 0)) if values is None else values
+
+        if not len(node_ids):
+            return np.empty((0, 0))
+
+        values = self.get_values(node_ids)
+        if values is None:
+            raise ValueError(
+                'The neighbor searcher does not implement get_values, so its '
+                'values cannot be saved.')
+
+        values_by_node_id = np.zeros((len(self.counts), values.shape[1]))
+        values_by_node_id[node_ids] = values
+        return values_by_node_id
+
+    def set_state(self, state):
+        # Restores the state returned by get_state into an empty object set,
+        # keeping the node ids of objects. Columns memory-mapped from the
+        # files of the storage directory, i.e., saved there, are used in
+        # place, and so are the values if the neighbor searcher keeps them
+        # there by id. Other arrays of the state are only read, so they can
+        # be memory-mapped.
+
+        if self._is_in_storage(state['counts'], 'counts'):
+            for name in self.COLUMN_NAMES:
+                setattr(self, name, state[name])
+        else:
+            self._ensure_capacity(len(state['counts']))
+            for name in self.COLUMN_NAMES:
+                getattr(self, name)[:len(state[name])] = state[name]
+
+        node_ids = np.flatnonzero(self.counts > 0)
+        self._restore_graph_metadata(node_ids)
+        self.restore_labels(state['next_cluster_label'])
+
+        edges = state['edges']
+        self._add_edges(edges[:, 0], edges[:, 1])
+
+        if not len(node_ids):
+            return
+
+        values = state['values']
+        self.n_features = values.shape[1]
+        if self.neighbor_searcher is None:
+            self.neighbor_searcher = self._create_neighbor_searcher(
+                self._choose_neighbor_searcher(values.shape[1]))
+
+        searcher = self.neighbor_searcher
+        if isinstance(searcher, (GridNeighborSearcher, LSHNeighborSearcher)) \
+                and searcher.values.path is not None \
+                and is_memory_mapped_from(values, searcher.values.path):
+            searcher.restore(node_ids)
+            return
+
+        for start in range(0, len(node_ids), self.VALUES_PER_CHUNK):
+            chunk = node_ids[start:start + self.VALUES_PER_CHUNK]
+            searcher.insert(np.asarray(values[chunk], dtype=float), chunk)
+
+    def _restore_graph_metadata(self, node_ids):
+        # An empty graph gives node ids in order, so nodes are added up to
+        # the largest node id, and those not in use are removed again
+
+        if not len(node_ids):
+            return
+
+        n_nodes = node_ids.max() + 1
+        self.graph.add_nodes_from([None] * n_nodes)
+        is_in_use = np.zeros(n_nodes, dtype=bool)
+        is_in_use[node_ids] = True
+        self.graph.remove_nodes_from(np.flatnonzero(~is_in_use).tolist())
+        self._node_ids_by_object_id.insert(
+            self.object_ids[node_ids], node_ids)
 
     def get_connected_components_within_objects(
-            self, objects: Set[Object]) -> List[Set[Object]]:
+            self, node_ids: np.ndarray) -> List[np.ndarray]:
+
+        # Only links between the given objects are considered. Neighbors are
+        # looked up in the sorted array of the objects instead of building a
+        # subgraph of the graph.
+
+        if len(node_ids) == 1:
+            return [node_ids]
+
+        node_ids = np.sort(node_ids)
+        neighborhoods = [self.graph.neighbors(node_id)
+                         for node_id in node_ids.tolist()]
+        sources = np.repeat(
+            np.arange(len(node_ids)), [len(n) for n in neighborhoods])
+        targets = np.fromiter(
+            (node_id for neighbors in neighborhoods for node_id in neighbors),
+            dtype=np.int64,
+            count=len(sources)
+        )
 
-        if len(objects) == 1:
-            return [objects]
+        positions = np.searchsorted(node_ids, targets)
+        positions[positions == len(node_ids)] = 0
+        is_within = node_ids[positions] == targets
 
-        node_ids = [obj.node_id for obj in objects]
-        subgraph = self.graph.subgraph(node_ids)
-        components_as_ids: List[Set[NodeId]] = rx.connected_components(subgraph)  # pylint: disable=no-member
+        component_ids = get_connected_component_ids(
+            len(node_ids), sources[is_within], positions[is_within])
 
-        def _get_original_object(subgraph, subgraph_node_id):
-            original_node_id = subgraph[subgraph_node_id].node_id
-            return self.graph[original_node_id]
+        order = np.argsort(component_ids, kind='stable')
+        boundaries = np.flatnonzero(np.diff(component_ids[order])) + 1
+        return np.split(node_ids[order], boundaries)
 
-        components_as_objects = []
-        for component in components_as_ids:
-            component_objects = {
-                _get_original_object(subgraph, subgraph_node_id)
-                for subgraph_node_id in component
-            }
-            components_as_objects.append(component_objects)
 
-        return components_as_objects
+def _is_neighbor_searcher_backend(obj):
+    return all(callable(getattr(obj, method, None))
+               for method in ('insert', 'delete', 'query_neighbors'))
@@ -0,0 +1,172 @@
+import re
+import shutil
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+
+OPERATION_FIT = 0
+OPERATION_INSERT = 1
+OPERATION_DELETE = 2
+OPERATION_DELETE_BY_ID = 3
+OPERATION_EXPIRE = 4
+
+# Timestamps of objects in windowed mode are logged as the last column of
+# their values
+OPERATION_FIT_WITH_TIMESTAMPS = 5
+OPERATION_INSERT_WITH_TIMESTAMPS = 6
+
+HEADER_SIZE = 5
+HEADER_N_BYTES = 8 * HEADER_SIZE
+
+CHECKPOINT_PATTERN = re.compile(r'checkpoint-(\d+)')
+
+
+class OperationLog:
+
+    # A log directory holds the latest checkpoint of a model, a snapshot in a
+    # checkpoint-<n> directory, and the log of the operations applied since
+    # then in log-<n>.bin. Every operation is appended to the log before it
+    # is applied, so that the model can be recovered by loading the
+    # checkpoint and applying the logged operations again.
+    #
+    # A record of the log is a header of int64 numbers (the operation, the
+    # number of rows, the number of features, whether ids are given, and the
+    # CRC-32 of the payload), followed by the payload: the values as float64
+    # and the ids as int64. A record cut short or damaged by a crash ends the
+    # log. Records are flushed to the operating system, but not synced to
+    # the disk.
+    #
+    # A checkpoint is saved into a temporary directory first, which is then
+    # renamed, so a checkpoint directory is always complete. The checkpoint
+    # and the log before it are removed only after the new log is created.
+
+    def __init__(self, directory, checkpoint_interval):
+        self.directory = Path(directory)
+        self.checkpoint_interval = checkpoint_interval
+        self._checkpoint_number = None
+        self._file = None
+        self._n_rows_since_checkpoint = 0
+
+    def start(self, save):
+        # Starts logging into an empty directory, saving the current state
+        # of the model as the first checkpoint
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if find_latest_checkpoint(self.directory) is not None:
+            raise ValueError(
+                f'{self.directory} already holds a log. Use '
+                'IncrementalDBSCAN.recover to continue it.')
+
+        self.checkpoint(save)
+
+    def resume(self, checkpoint_number, log_size, n_rows_since_checkpoint):
+        # Continues the log of the given checkpoint after its last complete
+        # record, dropping whatever follows it
+
+        self._checkpoint_number = checkpoint_number
+        self._n_rows_since_checkpoint = n_rows_since_checkpoint
+
+        with open(self._get_log_path(checkpoint_number), 'ab') as file:
+            file.truncate(log_size)
+        self._file = open(  # pylint: disable=consider-using-with
+            self._get_log_path(checkpoint_number), 'ab')
+
+    def append(self, operation, values=None, ids=None):
+        values = np.empty((0, 0)) if values is None else values
+        n_rows = len(values) if ids is None else len(ids)
+        payload = np.ascontiguousarray(values, dtype=np.float64).tobytes()
+        if ids is not None:
+            payload += np.ascontiguousarray(ids, dtype=np.int64).tobytes()
+
+        header = np.array([
+            operation,
+            n_rows,
+            values.shape[1],
+            ids is not None,
+            zlib.crc32(payload),
+        ], dtype=np.int64)
+
+        self._file.write(header.tobytes() + payload)
+        self._file.flush()
+        self._n_rows_since_checkpoint += n_rows
+
+    @property
+    def needs_checkpoint(self):
+        return self._n_rows_since_checkpoint >= self.checkpoint_interval
+
+    def checkpoint(self, save):
+        old_number = self._checkpoint_number
+        number = 0 if old_number is None else old_number + 1
+
+        temporary_path = self.directory / f'checkpoint-{number}.tmp'
+        shutil.rmtree(temporary_path, ignore_errors=True)
+        save(temporary_path)
+        temporary_path.rename(self._get_checkpoint_path(number))
+
+        if self._file is not None:
+            self._file.close()
+        self._file = open(  # pylint: disable=consider-using-with
+            self._get_log_path(number), 'wb')
+        self._checkpoint_number = number
+        self._n_rows_since_checkpoint = 0
+
+        if old_number is not None:
+            shutil.rmtree(self._get_checkpoint_path(old_number))
+            self._get_log_path(old_number).unlink(missing_ok=True)
+
+    def _get_checkpoint_path(self, number):
+        return self.directory / f'checkpoint-{number}'
+
+    def _get_log_path(self, number):
+        return self.directory / f'log-{number}.bin'
+
+
+def find_latest_checkpoint(directory):
+    # Returns the number of the latest complete checkpoint in the directory,
+    # or None if there is none
+
+    if not Path(directory).is_dir():
+        return None
+
+    numbers = [
+        int(match.group(1))
+        for match in map(CHECKPOINT_PATTERN.fullmatch,
+                         (path.name for path in Path(directory).iterdir()))
+        if match is not None
+    ]
+    return max(numbers, default=None)
+
+
+def read_operations(path):
+    # Yields the operations of the complete records of the log, each with
+    # the position in the file where its record ends
+
+    path = Path(path)
+    if not path.exists():
+        return
+
+    with open(path, 'rb') as file:
+        end = 0
+        while True:
+            header = file.read(HEADER_N_BYTES)
+            if len(header) < HEADER_N_BYTES:
+                return
+
+            operation, n_rows, n_features, has_ids, checksum = \
+                np.frombuffer(header, dtype=np.int64).tolist()
+            n_bytes = 8 * n_rows * (n_features + has_ids)
+            payload = file.read(n_bytes)
+            if len(payload) < n_bytes or zlib.crc32(payload) != checksum:
+                return
+
+            values = np.frombuffer(
+                payload, dtype=np.float64, count=n_rows * n_features
+            ).reshape(n_rows, n_features)
+            ids = np.frombuffer(
+                payload, dtype=np.int64, offset=8 * n_rows * n_features
+            ) if has_ids else None
+
+            end += HEADER_N_BYTES + n_bytes
+            yield operation, values, ids, end
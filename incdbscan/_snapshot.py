@@ -0,0 +1,74 @@
+import os
+import pickle
+from pathlib import Path
+
+import numpy as np
+
+from ._utils import is_memory_mapped_from
+
+
+PARAMS_FILE_NAME = 'params.pickle'
+ARRAY_NAMES = (
+    'values',
+    'object_ids',
+    'counts',
+    'neighbor_counts',
+    'labels',
+    'next_cluster_label',
+    'edges',
+    'window_object_ids',
+    'window_timestamps',
+    'window_latest_timestamp',
+    'window_cancelled_object_ids',
+)
+
+
+# A snapshot is a directory with a .npy file for each array of the state of
+# objects, and the parameters of the model pickled. Arrays are loaded
+# memory-mapped, so that they are read from the disk only once, when they
+# are copied into the object set. The parameters are written last, so a
+# directory with parameters holds a complete snapshot, unless it was
+# overwritten by another snapshot partially.
+#
+# The arrays of objects are indexed by node ids, as in a storage directory,
+# so a model can be saved into its storage directory, and loaded from there
+# in place. Arrays already memory-mapped from the files they would be saved
+# to are only flushed, and when loading from the storage directory, arrays
+# are memory-mapped writable, so that the object set can keep them. Other
+# arrays are written to temporary files first, so that no file that is
+# memory-mapped is truncated.
+
+
+def save_snapshot(path, params, state):
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+    for name in ARRAY_NAMES:
+        array = state[name]
+        array_path = path / f'{name}.npy'
+        if is_memory_mapped_from(array, array_path):
+            array.flush()
+        else:
+            temporary_path = path / f'{name}.npy.tmp'
+            with open(temporary_path, 'wb') as file:
+                np.save(file, array)
+            os.replace(temporary_path, array_path)
+
+    with open(path / PARAMS_FILE_NAME, 'wb') as file:
+        pickle.dump(params, file)
+
+
+def load_snapshot(path, storage_directory=None):
+    path = Path(path)
+    in_place = storage_directory is not None and \
+        path.resolve() == Path(storage_directory).resolve()
+
+    with open(path / PARAMS_FILE_NAME, 'rb') as file:
+        params = pickle.load(file)
+
+    state = {
+        name: np.load(path / f'{name}.npy',
+                      mmap_mode='r+' if in_place else 'r')
+        for name in ARRAY_NAMES
+    }
+    return params, state
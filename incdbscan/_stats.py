@@ -0,0 +1,183 @@
+import math
+import time
+from collections import defaultdict
+from contextlib import (
+    contextmanager,
+    nullcontext
+)
+
+
+NULL_CONTEXT = nullcontext()
+
+
+class LatencyHistogram:
+
+    # Durations are counted in bins of logarithmic width, BINS_PER_DECADE
+    # bins per power of ten from MIN_SECONDS on, so the memory taken does not
+    # grow with the number of durations, and percentiles are exact up to the
+    # width of a bin (about 12%).
+
+    MIN_SECONDS = 1e-6
+    BINS_PER_DECADE = 20
+    N_BINS = 200
+
+    def __init__(self):
+        self.counts = [0] * self.N_BINS
+        self.n_durations = 0
+        self.total = 0.
+        self.max = 0.
+
+    def add(self, seconds):
+        if seconds > self.MIN_SECONDS:
+            bin_ = min(self.N_BINS - 1, int(
+                self.BINS_PER_DECADE * math.log10(seconds / self.MIN_SECONDS)))
+        else:
+            bin_ = 0
+
+        self.counts[bin_] += 1
+        self.n_durations += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def get_percentile(self, percent):
+        # Returns the upper edge of the bin of the percentile, or the maximum
+        # duration if that is smaller
+
+        rank = percent / 100 * self.n_durations
+        cumulative_count = 0
+
+        for bin_, count in enumerate(self.counts):
+            cumulative_count += count
+            if count and cumulative_count >= rank:
+                upper_edge = self.MIN_SECONDS * \
+                    10 ** ((bin_ + 1) / self.BINS_PER_DECADE)
+                return min(upper_edge, self.max)
+
+        return self.max
+
+    def get_summary(self):
+        # Returns durations in milliseconds
+
+        if not self.n_durations:
+            return {'mean': 0., 'p50': 0., 'p99': 0., 'max': 0.}
+
+        return {
+            'mean': 1e3 * self.total / self.n_durations,
+            'p50': 1e3 * self.get_percentile(50),
+            'p99': 1e3 * self.get_percentile(99),
+            'max': 1e3 * self.max,
+        }
+
+
+class Stats:
+
+    # Records the time spent in the phases of operations (e.g., neighbor
+    # search in an insertion), and counts of what the operations did (e.g.,
+    # the number of new core objects). Phases and counts are attributed to
+    # the operation running. When an operation ends, its latency and the
+    # time of each of its phases go into histograms per type of operation,
+    # and its counts are summed up. The breakdown of the slowest operation of
+    # each type is kept as well.
+
+    def __init__(self):
+        self._latencies = defaultdict(LatencyHistogram)
+        self._phase_latencies = \
+            defaultdict(lambda: defaultdict(LatencyHistogram))
+        self._counts = defaultdict(lambda: defaultdict(int))
+        self._slowest = {}
+
+        self._phases_of_operation = None
+        self._counts_of_operation = None
+
+    @contextmanager
+    def operation(self, name):
+        if self._phases_of_operation is not None:
+            # Operations called by other operations, e.g., in a recovery,
+            # are part of the outer operation
+            yield
+            return
+
+        self._phases_of_operation = defaultdict(float)
+        self._counts_of_operation = defaultdict(int)
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self._add_operation(name, time.perf_counter() - start)
+            self._phases_of_operation = None
+            self._counts_of_operation = None
+
+    def _add_operation(self, name, seconds):
+        self._latencies[name].add(seconds)
+
+        for phase, phase_seconds in self._phases_of_operation.items():
+            self._phase_latencies[name][phase].add(phase_seconds)
+
+        counts = self._counts[name]
+        for count_name, count in self._counts_of_operation.items():
+            counts[count_name] += count
+
+        slowest = self._slowest.get(name)
+        if slowest is None or seconds * 1e3 > slowest['latency_ms']:
+            self._slowest[name] = {
+                'latency_ms': seconds * 1e3,
+                'phases_ms': {
+                    phase: phase_seconds * 1e3
+                    for phase, phase_seconds
+                    in self._phases_of_operation.items()
+                },
+                'counts': dict(self._counts_of_operation),
+            }
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self._phases_of_operation is not None:
+                self._phases_of_operation[name] += \
+                    time.perf_counter() - start
+
+    def count(self, name, count):
+        if self._counts_of_operation is not None:
+            self._counts_of_operation[name] += int(count)
+
+    def get_summary(self):
+        summary = {}
+
+        for name, latencies in self._latencies.items():
+            n_operations = latencies.n_durations
+            summary[name] = {
+                'n_operations': n_operations,
+                'latency_ms': latencies.get_summary(),
+                'phases_ms': {
+                    phase: phase_latencies.get_summary()
+                    for phase, phase_latencies
+                    in self._phase_latencies[name].items()
+                },
+                'counts': {
+                    count_name: {'total': total,
+                                 'mean': total / n_operations}
+                    for count_name, total in self._counts[name].items()
+                },
+                'slowest': self._slowest[name],
+            }
+
+        return summary
+
+
+class NullStats:
+
+    # Stands in for Stats when statistics are not collected, so recording
+    # costs only a call that does nothing
+
+    def operation(self, name):  # pylint: disable=unused-argument
+        return NULL_CONTEXT
+
+    def phase(self, name):  # pylint: disable=unused-argument
+        return NULL_CONTEXT
+
+    def count(self, name, count):
+        pass
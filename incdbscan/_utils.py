@@ -1,10 +1,181 @@
-import xxhash
+import os
+from itertools import chain
+from pathlib import Path
+
+import numpy as np
+from numpy.lib.format import open_memmap
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 from sklearn.utils.validation import check_array
 
 
-def hash_(array):
-    return xxhash.xxh64_intdigest(array.tobytes()) >> 1
+HASH_SEED = np.uint64(0x9E3779B97F4A7C15)
+
+
+def hash_rows(X):
+    # Hashes the bytes of each row of a float array to a non-negative 63-bit
+    # integer. Rows are hashed all at once, mixing in one column at a time
+    # with the finalizer of splitmix64.
+
+    words = np.ascontiguousarray(X, dtype=np.float64).view(np.uint64)
+    hashes = np.full(len(words), HASH_SEED, dtype=np.uint64)
+
+    for column in words.T:
+        hashes = _mix(hashes ^ column)
+
+    return (hashes >> np.uint64(1)).astype(np.int64)
+
+
+def _mix(x):
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
 
 
 def input_check(X):
     return check_array(X, dtype=float, accept_large_sparse=False)
+
+
+def ids_check(ids, n_samples=None):
+    ids = np.asarray(ids)
+
+    if ids.ndim != 1 or not np.issubdtype(ids.dtype, np.integer):
+        raise ValueError('Ids must be a 1-D array of integers.')
+    if (ids < 0).any():
+        raise ValueError('Ids must be non-negative.')
+    if n_samples is not None and len(ids) != n_samples:
+        raise ValueError(
+            f'Got {len(ids)} ids for {n_samples} objects. Each object needs '
+            'exactly one id.')
+
+    return ids.astype(np.int64)
+
+
+def timestamps_check(timestamps, n_samples):
+    timestamps = np.asarray(timestamps)
+
+    if timestamps.ndim != 1 or not np.issubdtype(timestamps.dtype, np.number) \
+            or not np.isfinite(timestamps).all():
+        raise ValueError('Timestamps must be a 1-D array of finite numbers.')
+    if len(timestamps) != n_samples:
+        raise ValueError(
+            f'Got {len(timestamps)} timestamps for {n_samples} objects. Each '
+            'object needs exactly one timestamp.')
+    if (np.diff(timestamps) < 0).any():
+        raise ValueError('Timestamps must not decrease.')
+
+    return timestamps.astype(np.float64)
+
+
+def extend_rows(array, size, fill_value=0, path=None):
+    # Returns a copy of the array with the given number of rows, the new rows
+    # filled with fill_value. With a path, the copy is memory-mapped to a
+    # .npy file there, replacing the file of the array if it has one.
+
+    shape = (int(size), *array.shape[1:])
+
+    if path is None:
+        extended = np.full(shape, fill_value, dtype=array.dtype)
+    else:
+        temporary_path = f'{path}.tmp'
+        extended = open_memmap(
+            temporary_path, mode='w+', dtype=array.dtype, shape=shape)
+        extended[len(array):] = fill_value
+        os.replace(temporary_path, path)
+
+    extended[:len(array)] = array
+    return extended
+
+
+def is_memory_mapped_from(array, path):
+    # Whether the array is a view of the .npy file at the path, memory-mapped
+
+    return isinstance(array, np.memmap) and array.filename is not None and \
+        Path(array.filename).resolve() == Path(path).resolve()
+
+
+def ids_to_object_ids(ids):
+    # Objects identified by the ids given by the user get negative object
+    # ids, so that they never collide with objects identified by the hashes
+    # of their values, which are non-negative.
+
+    return ~ids
+
+
+def unique(array):
+    # Same as np.unique for 1-D integer arrays, but sorting based, which is
+    # much faster than the hash based implementation of recent numpy versions
+    # for large arrays.
+
+    array = np.sort(array)
+    is_first = np.ones(len(array), dtype=bool)
+    is_first[1:] = array[1:] != array[:-1]
+    return array[is_first]
+
+
+def get_connected_component_ids(n_nodes, sources, targets):
+    # Returns the id of the connected component of each node of the
+    # undirected graph with the given edges
+
+    graph = coo_matrix(
+        (np.ones(len(sources), dtype=np.int8), (sources, targets)),
+        shape=(n_nodes, n_nodes)
+    )
+    _, component_ids = connected_components(graph, directed=False)
+    return component_ids
+
+
+def add_to_buckets(buckets, keys, ids, positions):
+    # Appends each id to the bucket of its key in a dict from keys to lists
+    # of ids. Ids are grouped by key first, so that each bucket is looked up
+    # only once. The position of each id in its bucket is stored in
+    # positions, an array indexed by ids, so that the id can be removed in
+    # constant time.
+
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    sorted_ids = ids[order].tolist()
+    boundaries = np.flatnonzero(np.diff(sorted_keys)) + 1
+    starts = [0, *boundaries.tolist()]
+    ends = [*boundaries.tolist(), len(sorted_ids)]
+    sizes_before = []
+
+    for key, start, end in zip(sorted_keys[starts].tolist(), starts, ends):
+        bucket = buckets.setdefault(key, [])
+        sizes_before.append(len(bucket))
+        bucket.extend(sorted_ids[start:end])
+
+    positions[ids[order]] = np.arange(len(sorted_ids)) + np.repeat(
+        np.subtract(sizes_before, starts), np.subtract(ends, starts))
+
+
+def remove_from_buckets(buckets, keys, ids, positions):
+    # An id is removed by moving the last id of its bucket to its position,
+    # so removal costs constant time instead of time linear in the size of
+    # the bucket
+
+    for key, id_ in zip(keys.tolist(), ids.tolist()):
+        bucket = buckets[key]
+        last_id = bucket.pop()
+        if last_id != id_:
+            position = positions[id_]
+            bucket[position] = last_id
+            positions[last_id] = position
+        if not bucket:
+            del buckets[key]
+
+
+def get_bucket_contents(buckets, keys):
+    # Returns the ids in the buckets of the given keys as one array, and the
+    # number of ids in each bucket
+
+    get_bucket = buckets.get
+    contents = [get_bucket(key, ()) for key in keys.tolist()]
+    sizes = np.fromiter(
+        (len(ids) for ids in contents), dtype=np.int64, count=len(contents))
+    ids = np.fromiter(
+        chain.from_iterable(contents), dtype=np.int64, count=sizes.sum())
+
+    return ids, sizes
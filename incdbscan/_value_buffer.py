@@ -0,0 +1,83 @@
+from pathlib import Path
+
+import numpy as np
+
+from ._utils import extend_rows
+
+
+class ValueBuffer:
+
+    # The coordinates of values in a 2-D array whose capacity is doubled when
+    # it is full, so storing a value costs amortized O(d) and never moves the
+    # other values. Which value a row holds is up to the owner, e.g., rows
+    # can be indexed by ids, or mapped to ids by an array of ids by row.
+    #
+    # Coordinates can be stored as float32 to halve memory. Values are then
+    # rounded to float32 when they are stored, and query values have to be
+    # rounded the same way (see round), so that two values are neighbors no
+    # matter which of them is queried. Distances are still computed in
+    # float64.
+    #
+    # With a directory, the buffer is a .npy file memory-mapped there, so
+    # that it can be larger than the memory, and the OS page cache decides
+    # which parts of it are held in memory. The file is replaced by a larger
+    # one when the capacity is doubled. A file left by an earlier buffer can
+    # be opened in place, without reading it.
+
+    MIN_CAPACITY = 64
+    ROWS_PER_CHUNK = 2 ** 16
+
+    def __init__(self, dtype=np.float64, directory=None, name='values'):
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.float64):
+            raise ValueError('Values can be stored as float32 or float64.')
+
+        self.path = \
+            None if directory is None else Path(directory) / f'{name}.npy'
+        self.array = None
+
+    def __len__(self):
+        return 0 if self.array is None else len(self.array)
+
+    def __getitem__(self, rows):
+        return self.array[rows].astype(float, copy=False)
+
+    def __setitem__(self, rows, values):
+        self.array[rows] = values
+
+    @property
+    def n_features(self):
+        return self.array.shape[1]
+
+    def round(self, values):
+        # Returns the values as they are stored, in float64
+        values = np.asarray(values, dtype=float)
+        if self.dtype == np.float64:
+            return values
+        return values.astype(self.dtype).astype(float)
+
+    def open(self):
+        self.array = np.load(self.path, mmap_mode='r+')
+        if self.array.dtype != self.dtype:
+            raise ValueError(
+                f'{self.path} holds {self.array.dtype} values instead of '
+                f'{self.dtype}.')
+
+    def ensure_capacity(self, size, n_features):
+        if self.array is None:
+            self.array = np.empty((0, n_features), dtype=self.dtype)
+
+        capacity = len(self.array)
+        if size > capacity:
+            capacity = max(size, 2 * capacity, self.MIN_CAPACITY)
+            self.array = extend_rows(
+                self.array, capacity, path=self.path)
+
+    def compact(self, rows):
+        # Moves the given rows, in increasing order, to the front of the
+        # buffer. Rows are moved in place chunk by chunk, which is safe as no
+        # row is moved backwards, so the buffer is never copied as a whole.
+
+        for start in range(0, len(rows), self.ROWS_PER_CHUNK):
+            chunk = rows[start:start + self.ROWS_PER_CHUNK]
+            self.array[start:start + len(chunk)] = self.array[chunk]
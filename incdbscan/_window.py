@@ -0,0 +1,190 @@
+from collections import deque
+
+import numpy as np
+
+
+class SlidingWindow:
+
+    # Keeps the object ids of the objects inserted in windowed mode in a
+    # queue, oldest first, one entry per object inserted, so an object
+    # inserted twice expires twice. Entries are stored in chunks, one for
+    # each insertion, so pushing and popping cost time proportional to the
+    # entries pushed and popped, not to the size of the window.
+    #
+    # An object expires when more than size objects were inserted after it,
+    # or when its timestamp is duration or more older than the latest
+    # timestamp. Timestamps never decrease along the queue, so expired
+    # objects are always at its front. Without a duration, timestamps are
+    # not needed and are kept as NaN.
+    #
+    # The entries expired by time are tracked by a cursor (a chunk and an
+    # offset in it) at the first entry not expired yet, and by their number.
+    # The cursor moves only when the latest timestamp grows, over the
+    # entries that expired since, so checking how many objects expired
+    # costs constant time even if many of them wait to be deleted in one
+    # batch.
+    #
+    # When an object is deleted explicitly, its oldest entries, one for each
+    # occurrence deleted, are cancelled, so that they do not expire an
+    # object inserted again with the same id. Cancelled entries are counted
+    # by object id, and are dropped when they are popped. They still take
+    # their places in the window, like the insertions they stand for.
+
+    def __init__(self, size=None, duration=None):
+        self.size = size
+        self.duration = duration
+        self._chunks = deque()
+        self._head = 0
+        self._length = 0
+        self._latest_timestamp = -np.inf
+        self._n_cancelled = {}
+        self._cursor_chunk = 0
+        self._cursor_offset = 0
+        self._n_expired_by_time = 0
+
+    def __len__(self):
+        return self._length
+
+    def check_timestamps(self, timestamps, after_latest=True):
+        if self.duration is None:
+            if timestamps is not None:
+                raise ValueError(
+                    'Timestamps are used only with window_duration.')
+            return
+
+        if timestamps is None:
+            raise ValueError('Objects need timestamps with window_duration.')
+        if after_latest and len(timestamps) and \
+                timestamps[0] < self._latest_timestamp:
+            raise ValueError(
+                'Timestamps must not be older than the latest timestamp '
+                'inserted.')
+
+    def push(self, object_ids, timestamps=None):
+        if not len(object_ids):
+            return
+
+        if timestamps is None:
+            timestamps = np.full(len(object_ids), np.nan)
+        else:
+            self._latest_timestamp = timestamps[-1]
+
+        self._chunks.append((object_ids, timestamps))
+        self._length += len(object_ids)
+        self._move_cursor()
+
+    def cancel(self, object_ids):
+        for object_id in object_ids.tolist():
+            self._n_cancelled[object_id] = \
+                self._n_cancelled.get(object_id, 0) + 1
+
+    def advance(self, now):
+        self._latest_timestamp = max(self._latest_timestamp, now)
+        self._move_cursor()
+
+    def _move_cursor(self):
+        if self.duration is None:
+            return
+
+        cutoff = self._latest_timestamp - self.duration
+        while self._cursor_chunk < len(self._chunks):
+            _, timestamps = self._chunks[self._cursor_chunk]
+            n_expired = int(np.searchsorted(
+                timestamps[self._cursor_offset:], cutoff, side='right'))
+            self._n_expired_by_time += n_expired
+            self._cursor_offset += n_expired
+            if self._cursor_offset < len(timestamps):
+                break
+            self._cursor_chunk += 1
+            self._cursor_offset = 0
+
+    def clear(self):
+        self._chunks.clear()
+        self._head = 0
+        self._length = 0
+        self._latest_timestamp = -np.inf
+        self._n_cancelled.clear()
+        self._cursor_chunk = 0
+        self._cursor_offset = 0
+        self._n_expired_by_time = 0
+
+    @property
+    def n_expired(self):
+        n_expired = self._n_expired_by_time
+        if self.size is not None:
+            n_expired = max(n_expired, self._length - self.size)
+        return n_expired
+
+    def pop(self, n_objects):
+        # Removes the given number of the oldest entries and returns the
+        # object ids of those not cancelled
+
+        self._n_expired_by_time = max(0, self._n_expired_by_time - n_objects)
+
+        popped = [np.empty(0, dtype=np.int64)]
+        while n_objects:
+            object_ids, _ = self._chunks[0]
+            n_popped = min(n_objects, len(object_ids) - self._head)
+            popped.append(object_ids[self._head:self._head + n_popped])
+            self._head += n_popped
+            self._length -= n_popped
+            n_objects -= n_popped
+
+            if self._head == len(object_ids):
+                self._chunks.popleft()
+                self._head = 0
+                self._cursor_chunk -= 1
+
+        # The cursor cannot stay behind the front of the queue
+        if self._cursor_chunk < 0 or (self._cursor_chunk == 0 and
+                                      self._cursor_offset < self._head):
+            self._cursor_chunk = 0
+            self._cursor_offset = self._head
+
+        popped = np.concatenate(popped)
+        if not self._n_cancelled:
+            return popped
+
+        is_cancelled = np.zeros(len(popped), dtype=bool)
+        for ix in np.flatnonzero(
+                np.isin(popped, list(self._n_cancelled))).tolist():
+            object_id = int(popped[ix])
+            n_cancelled = self._n_cancelled.get(object_id, 0)
+            if n_cancelled:
+                is_cancelled[ix] = True
+                if n_cancelled == 1:
+                    del self._n_cancelled[object_id]
+                else:
+                    self._n_cancelled[object_id] = n_cancelled - 1
+
+        return popped[~is_cancelled]
+
+    def get_state(self):
+        object_ids = [np.empty(0, dtype=np.int64)]
+        timestamps = [np.empty(0)]
+        head = self._head
+        for chunk_object_ids, chunk_timestamps in self._chunks:
+            object_ids.append(chunk_object_ids[head:])
+            timestamps.append(chunk_timestamps[head:])
+            head = 0
+
+        return {
+            'window_object_ids': np.concatenate(object_ids),
+            'window_timestamps': np.concatenate(timestamps),
+            'window_latest_timestamp': np.array(self._latest_timestamp),
+            'window_cancelled_object_ids': np.repeat(
+                np.array(list(self._n_cancelled), dtype=np.int64),
+                list(self._n_cancelled.values())
+            ),
+        }
+
+    def set_state(self, state):
+        self.clear()
+        timestamps = np.array(state['window_timestamps'])
+        self.push(
+            np.array(state['window_object_ids']),
+            None if self.duration is None else timestamps
+        )
+        self._latest_timestamp = float(state['window_latest_timestamp'])
+        self._move_cursor()
+        self.cancel(np.array(state['window_cancelled_object_ids']))
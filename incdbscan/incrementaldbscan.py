@@ -1,11 +1,42 @@
 import warnings
+from contextlib import contextmanager
+from pathlib import Path
 
 import numpy as np
 
 from ._deleter import Deleter
+from ._fitter import Fitter
 from ._inserter import Inserter
+from ._label_changes import LabelChanges
 from ._objects import Objects
-from ._utils import input_check
+from ._operation_log import (
+    OPERATION_DELETE,
+    OPERATION_DELETE_BY_ID,
+    OPERATION_EXPIRE,
+    OPERATION_FIT,
+    OPERATION_FIT_WITH_TIMESTAMPS,
+    OPERATION_INSERT,
+    OPERATION_INSERT_WITH_TIMESTAMPS,
+    OperationLog,
+    find_latest_checkpoint,
+    read_operations
+)
+from ._snapshot import (
+    load_snapshot,
+    save_snapshot
+)
+from ._stats import (
+    NullStats,
+    Stats
+)
+from ._utils import (
+    hash_rows,
+    ids_check,
+    ids_to_object_ids,
+    input_check,
+    timestamps_check
+)
+from ._window import SlidingWindow
 
 
 class IncrementalDBSCAN:
@@ -41,6 +72,83 @@ class IncrementalDBSCAN:
     p : float or int, optional (default=2)
         Parameter for Minkowski distance if metric='minkowski'.
 
+    neighbor_searcher : {'auto', 'grid', 'tree'} or object, optional \
+(default='auto')
+        The data structure used to search for the neighbors of objects.
+        'grid' buckets objects into a hash of cells of size eps, so objects
+        are inserted and deleted in constant time. It supports only
+        Minkowski metrics with p >= 1, and it pays off only for data of a few
+        dimensions. 'tree' uses the trees of scikit-learn. 'auto' chooses
+        'grid' for Minkowski metrics and data of at most 3 dimensions, and
+        'tree' otherwise. An object implementing NeighborSearcherBackend,
+        e.g., an LSHNeighborSearcher for approximate search in high
+        dimensions, is used as the backend instead. Such an object is copied
+        and not modified.
+
+    storage_directory : str or path-like, optional (default=None)
+        An existing directory to store the coordinates and the numeric state
+        of objects (counts, neighbor counts, labels) in, as .npy files
+        memory-mapped by numpy. This lets the object set take more space
+        than the memory, leaving it to the page cache of the operating
+        system which parts are held in memory. The graph of neighbors is
+        still held in memory. Only 'grid' and 'tree' neighbor searchers store
+        coordinates there; a backend object has its own settings. The files
+        are overwritten when the object set is refitted, so a directory
+        should not be shared by models. A model saved into its storage
+        directory with save can be loaded from there in place.
+
+    log_directory : str or path-like, optional (default=None)
+        A directory to log operations to, so that the model can be recovered
+        after a crash with IncrementalDBSCAN.recover. Every fit, insert and
+        delete is appended to a binary log before it is applied. The state
+        of the model is saved periodically as a checkpoint, and the log
+        starts over after each checkpoint. The directory must not hold a log
+        already.
+
+    checkpoint_interval : int, optional (default=1000000)
+        The number of objects fitted, inserted or deleted after which a
+        checkpoint is taken, if log_directory is given. Recovery replays at
+        most this many objects.
+
+    collect_stats : bool, optional (default=False)
+        Whether to record statistics of operations, returned by get_stats.
+        When disabled, recording costs next to nothing.
+
+    track_label_changes : bool, optional (default=False)
+        Whether to record how each fit, insert and delete changes the labels
+        of objects and the clusters, so that the changes can be taken with
+        drain_label_changes instead of getting the labels of all objects
+        again.
+
+    compact_cluster_labels : bool, optional (default=False)
+        Whether to renumber cluster labels to a dense range when most of the
+        labels allocated so far belong to clusters that died out. Keeps the
+        bookkeeping of labels proportional to the number of objects in
+        long-running models with many clusters created and destroyed, but
+        the labels of clusters change then between calls (keeping their
+        order). Renumbering is reported by drain_label_changes.
+
+    window_size : int, optional (default=None)
+        If given, the object set is a sliding window of the latest
+        window_size objects inserted: objects expire when more objects are
+        inserted after them, and expired objects are deleted automatically.
+        Each object inserted takes a place in the window, even if it was in
+        the object set already.
+
+    window_duration : float, optional (default=None)
+        If given, the object set is a sliding window in time: objects are
+        inserted with timestamps, and objects expire when their timestamp is
+        window_duration or more older than the latest timestamp inserted
+        (or given to expire). Can be combined with window_size.
+
+    expiry_batch_size : int, optional (default=1)
+        In windowed mode, expired objects are deleted by the insertion that
+        makes at least expiry_batch_size objects expired, all at once, so
+        the cost of deletions is shared by the batch. Until then, up to
+        expiry_batch_size - 1 expired objects stay in the object set.
+        Objects deleted explicitly leave the window, but keep their places
+        in it until they would have expired.
+
     References
     ----------
     Ester et al. 1998. Incremental Clustering for Mining in a Data Warehousing
@@ -49,17 +157,97 @@ class IncrementalDBSCAN:
 
     """
 
-    def __init__(self, eps=1, min_pts=5, metric='minkowski', p=2):
+    def __init__(self, eps=1, min_pts=5, metric='minkowski', p=2,
+                 neighbor_searcher='auto', storage_directory=None,
+                 log_directory=None, checkpoint_interval=1000000,
+                 collect_stats=False, track_label_changes=False,
+                 compact_cluster_labels=False, window_size=None,
+                 window_duration=None, expiry_batch_size=1):
         self.eps = eps
         self.min_pts = min_pts
         self.metric = metric
         self.p = p
-
-        self._objects = Objects(self.eps, self.min_pts, self.metric, self.p)
+        self.neighbor_searcher = neighbor_searcher
+        self.storage_directory = storage_directory
+        self.log_directory = log_directory
+        self.checkpoint_interval = checkpoint_interval
+        self.collect_stats = collect_stats
+        self.track_label_changes = track_label_changes
+        self.compact_cluster_labels = compact_cluster_labels
+        self.window_size = window_size
+        self.window_duration = window_duration
+        self.expiry_batch_size = expiry_batch_size
+
+        self._window = None
+        if window_size is not None or window_duration is not None:
+            self._window = SlidingWindow(window_size, window_duration)
+
+        self._log = None
+        self._stats = Stats() if collect_stats else NullStats()
+        self._label_changes = LabelChanges() if track_label_changes else None
+        self._init_objects()
+
+    def _init_objects(self):
+        self._objects = Objects(self.eps, self.min_pts, self.metric, self.p,
+                                self.neighbor_searcher,
+                                self.storage_directory, self._stats,
+                                self._label_changes,
+                                self.compact_cluster_labels)
         self._inserter = Inserter(self.eps, self.min_pts, self._objects)
         self._deleter = Deleter(self.eps, self.min_pts, self._objects)
 
-    def insert(self, X):
+    def fit(self, X, ids=None, timestamps=None):
+        """Cluster an initial object set from scratch.
+
+        The result is the same as inserting X into an empty object set, but
+        it is reached in bulk: the neighborhoods of all objects are searched
+        for at once, and clusters are found by one connected components pass
+        over the core objects. Objects inserted before are discarded.
+        Subsequent insertions and deletions update the clustering as usual.
+
+        Parameters
+        ----------
+        X : array-like of shape (n_samples, n_features)
+            The data objects of the initial object set.
+
+        ids : array-like of shape (n_samples,), optional (default=None)
+            Non-negative integer ids of the data objects. If given, objects
+            are identified by their ids instead of their values, so they can
+            be deleted and looked up with delete_by_id and get_labels_by_id
+            without hashing their values. Objects inserted with ids are not
+            found by delete and get_cluster_labels. Inserting an id that is
+            already in the object set increases the count of that object.
+
+        timestamps : array-like of shape (n_samples,), optional \
+(default=None)
+            Timestamps of the data objects, required with window_duration
+            and used only with it. They must not decrease within X.
+
+        Returns
+        -------
+        self
+
+        """
+        with self._operation('fit'):
+            X = input_check(X)
+            timestamps = self._check_timestamps(
+                timestamps, len(X), after_latest=False)
+            with self._stats.phase('object_lookup'):
+                object_ids = self._get_object_ids(X, ids)
+            self._stats.count('objects', len(X))
+            self._log_operation(OPERATION_FIT, X, ids, timestamps)
+
+            self._init_objects()
+            self._objects.record_label_event('reset')
+            Fitter(self.eps, self.min_pts, self._objects).fit(X, object_ids)
+            if self._window is not None:
+                self._window.clear()
+                self._update_window(object_ids, timestamps)
+            self._checkpoint_if_needed()
+
+        return self
+
+    def insert(self, X, ids=None, timestamps=None):
         """Insert objects into the object set, then update clustering.
 
         Parameters
@@ -67,18 +255,102 @@ class IncrementalDBSCAN:
         X : array-like of shape (n_samples, n_features)
             The data objects to be inserted into the object set.
 
+        ids : array-like of shape (n_samples,), optional (default=None)
+            Non-negative integer ids of the data objects. If given, objects
+            are identified by their ids instead of their values, so they can
+            be deleted and looked up with delete_by_id and get_labels_by_id
+            without hashing their values. Objects inserted with ids are not
+            found by delete and get_cluster_labels. Inserting an id that is
+            already in the object set increases the count of that object.
+
+        timestamps : array-like of shape (n_samples,), optional \
+(default=None)
+            Timestamps of the data objects, required with window_duration
+            and used only with it. They must not decrease, neither within X
+            nor compared to the objects inserted before.
+
         Returns
         -------
         self
 
         """
-        X = input_check(X)
-
-        for value in X:
-            self._inserter.insert(value)
+        with self._operation('insert'):
+            X = input_check(X)
+            self._check_n_features(X)
+            timestamps = self._check_timestamps(timestamps, len(X))
+            with self._stats.phase('object_lookup'):
+                object_ids = self._get_object_ids(X, ids)
+            self._stats.count('objects', len(X))
+            self._log_operation(OPERATION_INSERT, X, ids, timestamps)
+
+            self._inserter.insert(X, object_ids)
+            if self._window is not None:
+                self._update_window(object_ids, timestamps)
+            self._checkpoint_if_needed()
 
         return self
 
+    @contextmanager
+    def _operation(self, name):
+        with self._stats.operation(name):
+            if self._label_changes is None or \
+                    self._label_changes.is_recording:
+                yield
+                return
+
+            # Changes are kept only for operations that complete
+            self._label_changes.start(name)
+            try:
+                yield
+                self._label_changes.finish(self._objects)
+            finally:
+                self._label_changes.stop()
+
+    def _check_n_features(self, X):
+        # Has to be called before an operation is logged, so that an
+        # operation that cannot be replayed is never logged
+
+        n_features = self._objects.n_features
+        if n_features is not None and X.shape[1] != n_features:
+            raise ValueError(
+                f'X has {X.shape[1]} features, but the objects in the object '
+                f'set have {n_features} features.')
+
+    def _check_timestamps(self, timestamps, n_samples, after_latest=True):
+        if self._window is None:
+            if timestamps is not None:
+                raise ValueError(
+                    'Timestamps are used only with window_duration.')
+            return None
+
+        if timestamps is not None:
+            timestamps = timestamps_check(timestamps, n_samples)
+        self._window.check_timestamps(timestamps, after_latest)
+        return timestamps
+
+    def _update_window(self, object_ids, timestamps):
+        self._window.push(object_ids, timestamps)
+
+        n_expired = self._window.n_expired
+        if n_expired and n_expired >= self.expiry_batch_size:
+            self._delete_expired_objects(n_expired)
+
+    def _delete_expired_objects(self, n_expired):
+        # Entries of objects deleted explicitly are cancelled in the window,
+        # so all objects popped are in the object set
+
+        with self._stats.phase('object_lookup'):
+            objects = self._objects.get_objects(self._window.pop(n_expired))
+        self._stats.count('objects_expired', len(objects))
+        self._delete_objects_at_positions(
+            objects, np.ones(len(objects), dtype=bool))
+
+    @staticmethod
+    def _get_object_ids(X, ids):
+        if ids is None:
+            return hash_rows(X)
+        return ids_to_object_ids(ids_check(ids, n_samples=len(X)))
+
     def delete(self, X):
         """Delete objects from object set, then update clustering.
 
@@ -92,24 +364,126 @@ class IncrementalDBSCAN:
         self
 
         """
-        X = input_check(X)
+        with self._operation('delete'):
+            X = input_check(X)
+            self._log_operation(OPERATION_DELETE, X)
+
+            with self._stats.phase('object_lookup'):
+                objects = self._objects.get_objects(hash_rows(X))
+            self._delete_objects(objects)
+            self._checkpoint_if_needed()
 
-        for ix, value in enumerate(X):
-            obj = self._objects.get_object(value)
+        return self
+
+    def delete_by_id(self, ids):
+        """Delete objects inserted with ids from object set, then update
+        clustering.
+
+        Parameters
+        ----------
+        ids : array-like of shape (n_samples,)
+            The ids of the data objects to be deleted from the object set.
 
-            if obj:
-                self._deleter.delete(obj)
+        Returns
+        -------
+        self
 
-            else:
-                warnings.warn(
-                    IncrementalDBSCANWarning(
-                        f'Object at position {ix} was not deleted because '
-                        'there is no such object in the object set.'
-                    )
+        """
+        with self._operation('delete'):
+            ids = ids_check(ids)
+            self._log_operation(OPERATION_DELETE_BY_ID, ids=ids)
+
+            with self._stats.phase('object_lookup'):
+                objects = self._objects.get_objects(ids_to_object_ids(ids))
+            self._delete_objects(objects)
+            self._checkpoint_if_needed()
+
+        return self
+
+    def _delete_objects(self, objects):
+        is_deleted = self._get_deletable_positions(objects)
+        self._stats.count('objects', is_deleted.sum())
+
+        for ix in np.flatnonzero(~is_deleted).tolist():
+            warnings.warn(
+                IncrementalDBSCANWarning(
+                    f'Object at position {ix} was not deleted because '
+                    'there is no such object in the object set.'
                 )
+            )
+
+        if self._window is not None:
+            self._window.cancel(self._objects.object_ids[objects[is_deleted]])
+        self._delete_objects_at_positions(objects, is_deleted)
+
+    def _delete_objects_at_positions(self, objects, is_deleted):
+        if is_deleted.any():
+            objects_deleted, counts = np.unique(
+                objects[is_deleted], return_counts=True)
+            self._deleter.delete(objects_deleted, counts)
+
+    def expire(self, now=None):
+        """Delete the expired objects of the window now.
+
+        Expired objects are deleted automatically when at least
+        expiry_batch_size of them have expired. Calling expire deletes the
+        ones expired so far, e.g., before getting labels, so that the object
+        set is exactly the window.
+
+        Parameters
+        ----------
+        now : float, optional (default=None)
+            With window_duration, the current time, so that objects expire
+            even if no objects were inserted for a while. Objects inserted
+            later must not have older timestamps. By default, the latest
+            timestamp inserted.
+
+        Returns
+        -------
+        self
+
+        """
+        if self._window is None:
+            raise ValueError(
+                'Objects expire only with window_size or window_duration.')
+
+        with self._operation('delete'):
+            if now is not None:
+                self._window.check_timestamps(np.array([now], dtype=float))
+            self._log_operation(
+                OPERATION_EXPIRE,
+                None if now is None else np.array([[now]], dtype=float)
+            )
+
+            if now is not None:
+                self._window.advance(now)
+            self._delete_expired_objects(self._window.n_expired)
+            self._checkpoint_if_needed()
 
         return self
 
+    def _get_deletable_positions(self, objects):
+        # An object can be deleted as many times as it was inserted. Of the
+        # occurrences of an object in the input, the first ones are deleted.
+
+        order = np.argsort(objects, kind='stable')
+        sorted_objects = objects[order]
+
+        is_first = np.ones(len(objects), dtype=bool)
+        is_first[1:] = sorted_objects[1:] != sorted_objects[:-1]
+        first_positions = np.flatnonzero(is_first)
+        occurrences = np.arange(len(objects)) - np.repeat(
+            first_positions, np.diff(np.append(first_positions, len(objects))))
+
+        is_known = sorted_objects >= 0
+        is_deletable_in_order = np.zeros(len(objects), dtype=bool)
+        is_deletable_in_order[is_known] = occurrences[is_known] < \
+            self._objects.counts[sorted_objects[is_known]]
+
+        is_deletable = np.empty(len(objects), dtype=bool)
+        is_deletable[order] = is_deletable_in_order
+        return is_deletable
+
     def get_cluster_labels(self, X):
         """Get cluster labels of objects.
 
@@ -123,29 +497,382 @@ class IncrementalDBSCAN:
         labels : ndarray of shape (n_samples,)
                  Cluster labels. Effective labels start from 0. -1 means the
                  object is noise. numpy.nan means the object was not in the
-                 object set.
+                 object set, in which case a single warning is issued for
+                 all such objects.
 
         """
         X = input_check(X)
+        return self._get_labels_of_objects(
+            self._objects.get_objects(hash_rows(X)))
 
-        labels = np.zeros(len(X))
+    def get_labels_by_id(self, ids):
+        """Get cluster labels of objects inserted with ids.
 
-        for ix, value in enumerate(X):
-            obj = self._objects.get_object(value)
+        Parameters
+        ----------
+        ids : array-like of shape (n_samples,)
+            The ids of the data objects to get labels for.
+
+        Returns
+        -------
+        labels : ndarray of shape (n_samples,)
+                 Cluster labels, the same way as in get_cluster_labels.
 
-            if obj:
-                label = self._objects.get_label(obj)
+        """
+        ids = ids_check(ids)
+        return self._get_labels_of_objects(
+            self._objects.get_objects(ids_to_object_ids(ids)))
+
+    def predict(self, X):
+        """Get the cluster labels that objects would get, without inserting
+        them.
+
+        The neighbors of all objects are searched for with one query, and
+        each object gets the label of the most recent cluster among its core
+        neighbors, the same way as an inserted object that does not make any
+        object core. The objects are not counted as neighbors of each other
+        or of the objects in the object set, so they are labeled as border
+        objects or noise, even where inserting them would create or merge
+        clusters. The object set is not modified, so predictions are cheap
+        to serve between insertions and deletions.
 
-            else:
-                label = np.nan
-                warnings.warn(
-                    IncrementalDBSCANWarning(
-                        f'No label was retrieved for object at position {ix} '
-                        'because there is no such object in the object set.'
-                    )
-                )
+        Parameters
+        ----------
+        X : array-like of shape (n_samples, n_features)
+            The data objects to get labels for.
+
+        Returns
+        -------
+        labels : ndarray of shape (n_samples,)
+                 Cluster labels. Effective labels start from 0. -1 means the
+                 object would be noise.
 
-            labels[ix] = label
+        """
+        with self._stats.operation('predict'):
+            X = input_check(X)
+            self._check_n_features(X)
+            self._stats.count('objects', len(X))
+            return self._objects.get_labels_around_values(X)
+
+    def save(self, path):
+        """Save the object set and its clustering to a directory.
+
+        The coordinates, counts, neighbor counts and labels of objects, and
+        the links between neighbors, are saved as .npy files, so the model
+        can be loaded without searching for neighbors again. The parameters
+        of the model are pickled. Files of an earlier snapshot in the
+        directory are overwritten.
+
+        A model can be saved into its storage_directory. The files the model
+        keeps there are then only flushed instead of being written again,
+        and the model can be loaded from there in place. As the model keeps
+        updating these files, such a snapshot is valid only until the model
+        is updated again, so it is meant for closing the model and opening
+        it later.
+
+        Parameters
+        ----------
+        path : str or path-like
+            The directory to save the model to. It is created if it does not
+            exist.
+
+        """
+        save_snapshot(
+            path,
+            self._get_params(),
+            {**self._objects.get_state(), **self._get_window_state()}
+        )
+
+    @classmethod
+    def load(cls, path, storage_directory=None):
+        """Load a model saved with save.
+
+        The arrays saved are read memory-mapped and copied into the model,
+        and the neighbor searcher is rebuilt from the coordinates. The
+        parameters of the model are unpickled, so only models from trusted
+        sources should be loaded.
+
+        If storage_directory is the directory the model is loaded from, the
+        files of objects there are memory-mapped writable and used by the
+        loaded model in place instead of being copied, and so are the
+        coordinates if the neighbor searcher keeps them there by id, as the
+        grid does. Only the graph of neighbors and the index of the neighbor
+        searcher are built in memory. The files are then updated with the
+        model.
+
+        Parameters
+        ----------
+        path : str or path-like
+            The directory the model was saved to.
+
+        storage_directory : str or path-like, optional (default=None)
+            The storage_directory of the loaded model, as in
+            IncrementalDBSCAN.
+
+        Returns
+        -------
+        model : IncrementalDBSCAN
+            The model with the object set and clustering saved.
+
+        """
+        params, state = load_snapshot(path, storage_directory)
+        model = cls(**params, storage_directory=storage_directory)
+        model._objects.set_state(state)
+        if model._window is not None:
+            model._window.set_state(state)
+        return model
+
+    def _get_window_state(self):
+        # Models without a window save an empty one
+        window = SlidingWindow() if self._window is None else self._window
+        return window.get_state()
+
+    def _get_params(self):
+        return {
+            'eps': self.eps,
+            'min_pts': self.min_pts,
+            'metric': self.metric,
+            'p': self.p,
+            'neighbor_searcher': self.neighbor_searcher,
+            'checkpoint_interval': self.checkpoint_interval,
+            'collect_stats': self.collect_stats,
+            'track_label_changes': self.track_label_changes,
+            'compact_cluster_labels': self.compact_cluster_labels,
+            'window_size': self.window_size,
+            'window_duration': self.window_duration,
+            'expiry_batch_size': self.expiry_batch_size,
+        }
+
+    def checkpoint(self):
+        """Save a checkpoint to the log directory and start the log over.
+
+        Checkpoints are taken automatically every checkpoint_interval
+        objects. Taking one explicitly, e.g., before shutting down, makes the
+        next recovery faster.
+
+        Returns
+        -------
+        self
+
+        """
+        if self.log_directory is None:
+            raise ValueError('Checkpoints need a log_directory.')
+
+        if self._log is None:
+            self._start_log()
+        else:
+            self._log.checkpoint(self.save)
+
+        return self
+
+    @classmethod
+    def recover(cls, log_directory, storage_directory=None):
+        """Recover a model from its log directory.
+
+        The latest checkpoint is loaded, and the operations logged after it
+        are applied again, batch by batch, as they were applied originally.
+        The recovered model continues logging to the same directory.
+
+        Parameters
+        ----------
+        log_directory : str or path-like
+            The log_directory of the model to be recovered.
+
+        storage_directory : str or path-like, optional (default=None)
+            The storage_directory of the recovered model, as in
+            IncrementalDBSCAN.
+
+        Returns
+        -------
+        model : IncrementalDBSCAN
+            The model in the state after the last operation logged.
+
+        """
+        log_directory = Path(log_directory)
+        number = find_latest_checkpoint(log_directory)
+        if number is None:
+            raise ValueError(f'{log_directory} holds no checkpoint.')
+
+        model = cls.load(
+            log_directory / f'checkpoint-{number}', storage_directory)
+
+        log_size, n_rows = 0, 0
+        replay = {
+            OPERATION_FIT: model.fit,
+            OPERATION_INSERT: model.insert,
+            OPERATION_DELETE: lambda values, _: model.delete(values),
+            OPERATION_DELETE_BY_ID: lambda _, ids: model.delete_by_id(ids),
+            OPERATION_FIT_WITH_TIMESTAMPS: lambda values, ids: model.fit(
+                values[:, :-1], ids, values[:, -1]),
+            OPERATION_INSERT_WITH_TIMESTAMPS: lambda values, ids: model.insert(
+                values[:, :-1], ids, values[:, -1]),
+            OPERATION_EXPIRE: lambda values, _: model.expire(
+                values[0, 0] if len(values) else None),
+        }
+
+        # Objects that were not found by a delete were warned about when it
+        # was applied originally
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', IncrementalDBSCANWarning)
+            for operation, values, ids, log_size in read_operations(
+                    log_directory / f'log-{number}.bin'):
+                replay[operation](values, ids)
+                n_rows += len(values) if ids is None else len(ids)
+
+        model.log_directory = log_directory
+        model._log = OperationLog(log_directory, model.checkpoint_interval)
+        model._log.resume(number, log_size, n_rows)
+        model._checkpoint_if_needed()
+
+        return model
+
+    def _start_log(self):
+        self._log = OperationLog(self.log_directory, self.checkpoint_interval)
+        self._log.start(self.save)
+
+    def _log_operation(self, operation, values=None, ids=None,
+                       timestamps=None):
+        if self.log_directory is None:
+            return
+
+        if timestamps is not None:
+            operation = {
+                OPERATION_FIT: OPERATION_FIT_WITH_TIMESTAMPS,
+                OPERATION_INSERT: OPERATION_INSERT_WITH_TIMESTAMPS,
+            }[operation]
+            values = np.column_stack([values, timestamps])
+
+        if self._log is None:
+            self._start_log()
+        with self._stats.phase('log'):
+            self._log.append(operation, values, ids)
+
+    def _checkpoint_if_needed(self):
+        if self._log is not None and self._log.needs_checkpoint:
+            with self._stats.phase('checkpoint'):
+                self._log.checkpoint(self.save)
+
+    def get_stats(self):
+        """Get statistics of the operations since the model was created or
+        the statistics were reset.
+
+        Statistics are recorded only with collect_stats=True. Operations are
+        'fit', 'insert', 'delete' (including delete_by_id) and 'predict'.
+        For each type of operation, the latencies of operations and the time
+        spent in each of their phases are summarized by their mean, median
+        (p50), 99th percentile (p99) and maximum, in milliseconds.
+        Percentiles come from histograms with bins about 12% wide. Phases are
+        the following:
+
+        - object_lookup: validating and hashing input, looking up objects;
+        - neighbor_search: inserting into, deleting from, and querying the
+          neighbor searcher;
+        - graph_update: updating the graph of neighbors and neighbor counts;
+        - update_seeds: finding new core objects and objects that lost their
+          core property, and the update seeds around them;
+        - connected_components: finding connected components of update
+          seeds (or of core objects, in fit);
+        - bfs_traversal: traversing clusters to find the components to split
+          away after deletion;
+        - label_rewrites: setting the labels of objects;
+        - log and checkpoint: writing the operation log and checkpoints.
+
+        Counts are summed up over the operations of a type, and averaged per
+        operation: objects (objects inserted, deleted or predicted),
+        objects_expired (objects deleted from a window), neighbors_found,
+        new_cores, ex_cores, update_seeds, nodes_visited (by the traversals
+        looking for splits) and objects_relabeled (objects whose label was
+        set). The breakdown of the slowest operation of each type is
+        included as well.
+
+        Returns
+        -------
+        stats : dict
+            Statistics by type of operation, with keys 'n_operations',
+            'latency_ms', 'phases_ms', 'counts' and 'slowest'.
+
+        """
+        if not self.collect_stats:
+            raise ValueError(
+                'Statistics are collected only with collect_stats=True.')
+        return self._stats.get_summary()
+
+    def reset_stats(self):
+        """Discard the statistics recorded so far.
+
+        Returns
+        -------
+        self
+
+        """
+        if self.collect_stats:
+            self._stats = Stats()
+            self._objects.stats = self._stats
+
+        return self
+
+    def drain_label_changes(self):
+        """Take the changes of labels recorded since the model was created or
+        the changes were last taken.
+
+        Changes are recorded only with track_label_changes=True, as one
+        delta for each fit, insert and delete that changed any label. The
+        labels of objects are rewritten only where an operation touches the
+        object set. Changes of whole clusters are described by events
+        instead, as they would take time proportional to the size of the
+        clusters to list object by object:
+
+        - {'type': 'reset'}: fit discarded all objects;
+        - {'type': 'created', 'label': label}: a cluster was created;
+        - {'type': 'merged', 'labels': labels, 'into': label}: clusters
+          were merged into another one. Their objects not listed in the
+          delta take its label;
+        - {'type': 'split', 'label': label, 'into': labels}: parts of a
+          cluster were split away, taking new labels;
+        - {'type': 'dissolved', 'label': label}: the cluster lost all of its
+          core objects;
+        - {'type': 'renumbered', 'labels': labels, 'new_labels': labels}:
+          the labels of all clusters were renumbered, keeping their order.
+          Objects not listed in the delta take the new labels.
+
+        A delta is applied to labels kept elsewhere by applying its events
+        in order, and then setting the new labels of the objects listed. Old
+        labels of objects are the labels after renumbering.
+
+        Returns
+        -------
+        deltas : list of dict
+            The changes of each operation in order, with keys 'operation'
+            ('fit', 'insert' or 'delete'), 'events' (a list of dicts as
+            above), and arrays describing the objects whose label changed:
+            'ids' (the ids of objects inserted with ids, and -1 for other
+            objects), 'values' (the data objects, or None if the neighbor
+            searcher does not implement get_values), 'old_labels' and
+            'new_labels'. Labels are as in get_cluster_labels: numpy.nan
+            means the object was not in the object set.
+
+        """
+        if not self.track_label_changes:
+            raise ValueError(
+                'Changes of labels are recorded only with '
+                'track_label_changes=True.')
+        return self._label_changes.drain()
+
+    def _get_labels_of_objects(self, objects):
+        is_missing = objects < 0
+
+        labels = np.full(len(objects), np.nan)
+        labels[~is_missing] = self._objects.get_labels(objects[~is_missing])
+
+        if is_missing.any():
+            positions = np.flatnonzero(is_missing)
+            warnings.warn(
+                IncrementalDBSCANWarning(
+                    f'No label was retrieved for {len(positions)} objects, '
+                    f'the first at position {positions[0]}, because there '
+                    'are no such objects in the object set.'
+                )
+            )
 
         return labels
 
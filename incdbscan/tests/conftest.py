@@ -32,6 +32,19 @@ def blob_in_middle():
     return blob
 
 
+@pytest.fixture
+def blobs_with_noise():
+    # pylint: disable=unbalanced-tuple-unpacking
+    blobs, _ = make_blobs(
+        n_samples=1000,
+        centers=[[0, 0], [8, 0], [0, 8]],
+        cluster_std=1,
+        random_state=0
+    )
+    noise = np.random.default_rng(1).uniform(-4, 12, (200, 2))
+    return np.vstack([blobs, noise])
+
+
 @pytest.fixture
 def object_far_away():
     return np.array([[10., 10.]])
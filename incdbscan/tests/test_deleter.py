@@ -481,3 +481,34 @@ def test_point_whose_neighbor_changes_its_core_property(incdbscan3):
         expected_clusters,
         cluster_label_second_cluster
     )
+
+
+def test_batch_deletion_can_split_cluster_at_multiple_points(
+        incdbscan3,
+        three_points_on_the_left):
+
+    left = three_points_on_the_left
+    bridges = np.array([
+        [0, 0],
+        [EPS * 3, 0],
+    ])
+    middle = np.array([
+        [EPS, 0],
+        [EPS * 2, 0],
+    ])
+    right = np.array([
+        [EPS * 4, 0],
+        [EPS * 5, 0],
+        [EPS * 6, 0],
+    ])
+
+    all_points = np.vstack([left, bridges, middle, right])
+
+    insert_objects_then_assert_cluster_labels(
+        incdbscan3, all_points, CLUSTER_LABEL_FIRST_CLUSTER)
+
+    incdbscan3.delete(bridges)
+
+    assert_cluster_labels(incdbscan3, middle, CLUSTER_LABEL_NOISE)
+    assert_split_creates_new_labels_for_new_clusters(
+        incdbscan3, [left, right], CLUSTER_LABEL_FIRST_CLUSTER)
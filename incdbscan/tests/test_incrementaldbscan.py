@@ -1,17 +1,23 @@
 import numpy as np
+import pytest
+from conftest import EPS
 
 from incdbscan import (
     IncrementalDBSCAN,
-    IncrementalDBSCANWarning
+    IncrementalDBSCANWarning,
+    LSHNeighborSearcher
 )
 from testutils import (
+    CLUSTER_LABEL_FIRST_CLUSTER,
     CLUSTER_LABEL_NOISE,
+    assert_cluster_labels,
     delete_object_and_assert_error,
     delete_object_and_assert_no_warning,
     delete_object_and_assert_warning,
     get_label_and_assert_error,
     get_label_and_assert_no_warning,
     get_label_and_assert_warning,
+    get_labels_by_id_and_assert_no_warning,
     insert_object_and_assert_error,
     insert_objects_then_assert_cluster_labels
 )
@@ -91,6 +97,23 @@ def test_warning_when_unknown_object_is_deleted(
         incdbscan3, point_at_origin, IncrementalDBSCANWarning)
 
 
+def test_warning_when_object_is_deleted_more_times_than_inserted(
+        incdbscan3,
+        point_at_origin):
+
+    incdbscan3.insert(point_at_origin)
+    incdbscan3.insert(point_at_origin)
+
+    points_to_delete = np.vstack([point_at_origin] * 3)
+
+    delete_object_and_assert_warning(
+        incdbscan3, points_to_delete, IncrementalDBSCANWarning)
+
+    label = get_label_and_assert_warning(
+        incdbscan3, point_at_origin, IncrementalDBSCANWarning)
+    assert np.isnan(label)
+
+
 def test_no_warning_when_cluster_label_is_gotten_for_known_object(
         incdbscan3,
         point_at_origin):
@@ -142,3 +165,391 @@ def test_different_metrics_are_available():
     expected_label_manhattan = CLUSTER_LABEL_NOISE
     insert_objects_then_assert_cluster_labels(
         incdbscan_manhattan, diagonal, expected_label_manhattan)
+
+
+def test_fit_discards_previously_inserted_objects(
+        incdbscan3,
+        blob_in_middle,
+        object_far_away):
+
+    incdbscan3.insert(blob_in_middle)
+    incdbscan3.fit(object_far_away)
+
+    assert incdbscan3.get_cluster_labels(object_far_away) == \
+        CLUSTER_LABEL_NOISE
+    get_label_and_assert_warning(
+        incdbscan3, blob_in_middle[[0]], IncrementalDBSCANWarning)
+
+
+def test_fit_labels_objects_like_insertion(
+        incdbscan3,
+        blob_in_middle,
+        object_far_away):
+
+    objects = np.vstack([blob_in_middle, object_far_away])
+    incdbscan3.fit(objects)
+
+    assert_cluster_labels(
+        incdbscan3, blob_in_middle, CLUSTER_LABEL_FIRST_CLUSTER)
+    assert_cluster_labels(incdbscan3, object_far_away, CLUSTER_LABEL_NOISE)
+
+
+def test_one_warning_when_cluster_labels_are_gotten_for_unknown_objects(
+        incdbscan3,
+        blob_in_middle,
+        object_far_away):
+
+    incdbscan3.insert(blob_in_middle)
+    objects = np.vstack([object_far_away, blob_in_middle, object_far_away])
+
+    with pytest.warns(IncrementalDBSCANWarning) as record:
+        labels = incdbscan3.get_cluster_labels(objects)
+
+    assert len(record) == 1
+    assert np.isnan(labels[[0, -1]]).all()
+    assert not np.isnan(labels[1:-1]).any()
+
+
+def test_objects_inserted_with_ids_are_handled_by_id(
+        incdbscan3,
+        blob_in_middle):
+
+    ids = np.arange(len(blob_in_middle))
+    incdbscan3.insert(blob_in_middle, ids=ids)
+
+    labels = get_labels_by_id_and_assert_no_warning(incdbscan3, ids)
+    assert np.all(labels == CLUSTER_LABEL_FIRST_CLUSTER)
+
+    incdbscan3.delete_by_id(ids[:-1])
+    labels = get_labels_by_id_and_assert_no_warning(incdbscan3, ids[[-1]])
+    assert np.all(labels == CLUSTER_LABEL_NOISE)
+
+    label = get_label_and_assert_warning(
+        incdbscan3, blob_in_middle[[-1]], IncrementalDBSCANWarning)
+    assert np.isnan(label)
+
+
+def test_objects_with_same_value_and_different_ids_are_different_objects(
+        incdbscan3,
+        point_at_origin):
+
+    values = np.vstack([point_at_origin] * 3)
+    incdbscan3.insert(values, ids=[0, 1, 2])
+
+    assert np.all(
+        incdbscan3.get_labels_by_id([0, 1, 2]) == CLUSTER_LABEL_FIRST_CLUSTER)
+
+    incdbscan3.delete_by_id([0])
+    assert np.all(incdbscan3.get_labels_by_id([1, 2]) == CLUSTER_LABEL_NOISE)
+
+    with pytest.warns(IncrementalDBSCANWarning):
+        incdbscan3.delete_by_id([0])
+
+
+def test_error_when_ids_are_invalid(incdbscan3, point_at_origin):
+    invalid_ids = [[0.5], [-1], [0, 1], [[0]]]
+
+    for ids in invalid_ids:
+        with pytest.raises(ValueError):
+            incdbscan3.insert(point_at_origin, ids=ids)
+
+
+def test_error_when_neighbor_searcher_is_invalid():
+    with pytest.raises(ValueError):
+        IncrementalDBSCAN(neighbor_searcher='ball')
+
+    with pytest.raises(ValueError):
+        IncrementalDBSCAN(metric='cosine', neighbor_searcher='grid')
+
+    with pytest.raises(ValueError):
+        IncrementalDBSCAN(neighbor_searcher=object())
+
+
+def test_neighbor_searcher_object_is_not_modified(blob_in_middle):
+    neighbor_searcher = LSHNeighborSearcher(radius=EPS, random_state=0)
+    incdbscan_1 = IncrementalDBSCAN(
+        eps=EPS, min_pts=3, neighbor_searcher=neighbor_searcher)
+    incdbscan_2 = IncrementalDBSCAN(
+        eps=EPS, min_pts=3, neighbor_searcher=neighbor_searcher)
+
+    incdbscan_1.fit(blob_in_middle)
+    incdbscan_2.fit(blob_in_middle[:1])
+    incdbscan_1.fit(blob_in_middle)
+
+    assert len(neighbor_searcher.values) == 0
+    assert_cluster_labels(
+        incdbscan_1, blob_in_middle, CLUSTER_LABEL_FIRST_CLUSTER)
+    assert_cluster_labels(incdbscan_2, blob_in_middle[:1], CLUSTER_LABEL_NOISE)
+
+
+def test_empty_model_can_be_saved_and_loaded(tmp_path):
+    IncrementalDBSCAN(eps=EPS, min_pts=3).save(tmp_path)
+    incdbscan = IncrementalDBSCAN.load(tmp_path)
+
+    assert incdbscan.eps == EPS
+    assert incdbscan.min_pts == 3
+
+    object_ = np.array([[1, 2]])
+    incdbscan.insert(object_)
+    assert_cluster_labels(incdbscan, object_, CLUSTER_LABEL_NOISE)
+
+
+def test_empty_model_can_be_saved_and_loaded_in_place(tmp_path):
+    IncrementalDBSCAN(eps=EPS, min_pts=3, storage_directory=tmp_path) \
+        .save(tmp_path)
+    incdbscan = IncrementalDBSCAN.load(tmp_path, storage_directory=tmp_path)
+
+    object_ = np.array([[1, 2]])
+    incdbscan.insert(object_)
+    assert_cluster_labels(incdbscan, object_, CLUSTER_LABEL_NOISE)
+
+
+def test_snapshot_can_be_loaded_in_place(incdbscan3, tmp_path):
+    objects = np.array([[1, 2], [1, 3], [1, 4], [9, 9]])
+    incdbscan3.insert(objects)
+    incdbscan3.save(tmp_path)
+
+    incdbscan = IncrementalDBSCAN.load(tmp_path, storage_directory=tmp_path)
+    incdbscan.delete(objects[:1])
+    assert_cluster_labels(incdbscan, objects[1:], CLUSTER_LABEL_NOISE)
+
+    incdbscan.save(tmp_path)
+    del incdbscan
+    incdbscan = IncrementalDBSCAN.load(tmp_path)
+    assert_cluster_labels(incdbscan, objects[1:], CLUSTER_LABEL_NOISE)
+
+
+def test_error_when_log_directory_holds_log(tmp_path):
+    object_ = np.array([[1, 2]])
+    IncrementalDBSCAN(log_directory=tmp_path).insert(object_)
+
+    with pytest.raises(ValueError):
+        IncrementalDBSCAN(log_directory=tmp_path).insert(object_)
+
+    with pytest.raises(ValueError):
+        IncrementalDBSCAN.recover(tmp_path / 'missing')
+
+
+@pytest.mark.parametrize('neighbor_searcher', ['grid', 'tree'])
+def test_error_when_objects_have_other_number_of_features(
+        blob_in_middle, neighbor_searcher, tmp_path):
+
+    incdbscan = IncrementalDBSCAN(
+        eps=EPS, min_pts=3, neighbor_searcher=neighbor_searcher,
+        log_directory=tmp_path)
+    incdbscan.insert(blob_in_middle)
+    object_3d = np.array([[1, 2, 3]])
+
+    with pytest.raises(ValueError):
+        incdbscan.insert(object_3d)
+
+    with pytest.raises(ValueError):
+        incdbscan.predict(object_3d)
+
+    # The failed insertion was neither applied nor logged
+    recovered = IncrementalDBSCAN.recover(tmp_path)
+    assert np.array_equal(
+        incdbscan.get_cluster_labels(blob_in_middle),
+        recovered.get_cluster_labels(blob_in_middle)
+    )
+    recovered.insert(blob_in_middle[:1] + 0.1)
+
+
+def test_stats_of_operations(blob_in_middle):
+    incdbscan = IncrementalDBSCAN(eps=EPS, min_pts=3, collect_stats=True)
+    incdbscan.insert(blob_in_middle)
+    incdbscan.insert(blob_in_middle[:1] + 100)
+    incdbscan.delete(blob_in_middle[:2])
+
+    stats = incdbscan.get_stats()
+    assert stats['insert']['n_operations'] == 2
+    assert stats['delete']['n_operations'] == 1
+
+    insert_stats = stats['insert']
+    assert insert_stats['counts']['objects']['total'] == \
+        len(blob_in_middle) + 1
+    assert insert_stats['counts']['new_cores']['total'] == \
+        len(blob_in_middle)
+    assert 'neighbor_search' in insert_stats['phases_ms']
+
+    latency = insert_stats['latency_ms']
+    assert 0 < latency['p50'] <= latency['p99'] <= latency['max']
+    assert insert_stats['slowest']['latency_ms'] == latency['max']
+
+    assert not incdbscan.reset_stats().get_stats()
+
+
+def test_error_when_stats_are_not_collected(incdbscan3):
+    with pytest.raises(ValueError):
+        incdbscan3.get_stats()
+
+
+def test_label_changes_of_operations(blob_in_middle, object_far_away):
+    incdbscan = IncrementalDBSCAN(
+        eps=EPS, min_pts=3, track_label_changes=True)
+    incdbscan.insert(blob_in_middle)
+    incdbscan.insert(object_far_away, ids=[7])
+    incdbscan.delete(blob_in_middle)
+
+    insertion, insertion_by_id, deletion = incdbscan.drain_label_changes()
+
+    assert insertion['events'] == [
+        {'type': 'created', 'label': CLUSTER_LABEL_FIRST_CLUSTER}]
+    assert np.array_equal(insertion['values'], blob_in_middle)
+    assert np.isnan(insertion['old_labels']).all()
+    assert (insertion['new_labels'] == CLUSTER_LABEL_FIRST_CLUSTER).all()
+
+    assert not insertion_by_id['events']
+    assert insertion_by_id['ids'].tolist() == [7]
+    assert insertion_by_id['new_labels'].tolist() == [CLUSTER_LABEL_NOISE]
+
+    assert deletion['events'] == [
+        {'type': 'dissolved', 'label': CLUSTER_LABEL_FIRST_CLUSTER}]
+    assert (deletion['ids'] == -1).all()
+    assert np.isnan(deletion['new_labels']).all()
+
+    assert not incdbscan.drain_label_changes()
+
+
+def test_no_label_changes_when_no_label_changes(blob_in_middle):
+    incdbscan = IncrementalDBSCAN(
+        eps=EPS, min_pts=3, track_label_changes=True)
+    incdbscan.insert(blob_in_middle)
+    incdbscan.drain_label_changes()
+
+    # Counts of objects change, but their labels do not
+    incdbscan.insert(blob_in_middle[:1])
+    incdbscan.delete(blob_in_middle[:1])
+    delete_object_and_assert_warning(
+        incdbscan, blob_in_middle[:1] + 100, IncrementalDBSCANWarning)
+
+    assert not incdbscan.drain_label_changes()
+
+
+def test_error_when_label_changes_are_not_tracked(incdbscan3):
+    with pytest.raises(ValueError):
+        incdbscan3.drain_label_changes()
+
+
+def test_predict_does_not_insert_objects(
+        incdbscan3, blob_in_middle, object_far_away):
+
+    assert incdbscan3.predict(object_far_away).tolist() == \
+        [CLUSTER_LABEL_NOISE]
+
+    incdbscan3.insert(blob_in_middle)
+    labels = incdbscan3.predict(np.vstack([blob_in_middle, object_far_away]))
+
+    assert (labels[:-1] == CLUSTER_LABEL_FIRST_CLUSTER).all()
+    assert labels[-1] == CLUSTER_LABEL_NOISE
+    get_label_and_assert_warning(
+        incdbscan3, object_far_away, IncrementalDBSCANWarning)
+
+
+def test_predict_spreads_labels_only_from_core_objects(incdbscan4):
+    # The first four objects are core objects, and the fifth is a border
+    # object, from which labels do not spread
+    objects = np.array([[0], [0.1], [0.2], [0.3], [1.7]])
+    incdbscan4.insert(objects)
+
+    labels = incdbscan4.predict(np.array([[0], [1.7], [3]]))
+    assert labels.tolist() == [CLUSTER_LABEL_FIRST_CLUSTER] * 2 + \
+        [CLUSTER_LABEL_NOISE]
+
+
+def test_predict_gives_largest_label_between_clusters(incdbscan3):
+    cluster_1 = np.array([[0], [0.1], [0.2]])
+    cluster_2 = cluster_1 + 3
+    incdbscan3.insert(cluster_1).insert(cluster_2)
+    labels = incdbscan3.get_cluster_labels(
+        np.vstack([cluster_1[:1], cluster_2[:1]]))
+
+    assert incdbscan3.predict(np.array([[1.6]])).tolist() == [labels.max()]
+
+
+def test_error_when_timestamps_are_invalid(point_at_origin):
+    incdbscan = IncrementalDBSCAN(eps=EPS, min_pts=3, window_duration=10)
+
+    with pytest.raises(ValueError):
+        incdbscan.insert(point_at_origin)
+    with pytest.raises(ValueError):
+        incdbscan.insert(np.vstack([point_at_origin] * 2), timestamps=[2, 1])
+
+    incdbscan.insert(point_at_origin, timestamps=[5])
+    with pytest.raises(ValueError):
+        incdbscan.insert(point_at_origin, timestamps=[4])
+
+
+def test_error_when_timestamps_are_given_without_window_duration(
+        point_at_origin):
+
+    incdbscan = IncrementalDBSCAN(eps=EPS, min_pts=3, window_size=10)
+    with pytest.raises(ValueError):
+        incdbscan.insert(point_at_origin, timestamps=[1])
+    with pytest.raises(ValueError):
+        incdbscan.expire(now=1)
+
+
+def test_explicitly_deleted_objects_are_skipped_at_expiry(
+        blob_in_middle, object_far_away):
+
+    incdbscan = IncrementalDBSCAN(eps=EPS, min_pts=3, window_size=10)
+    incdbscan.insert(blob_in_middle)
+    delete_object_and_assert_no_warning(incdbscan, blob_in_middle[:1])
+
+    incdbscan.insert(object_far_away)
+    get_label_and_assert_no_warning(incdbscan, blob_in_middle[1:])
+    get_label_and_assert_no_warning(incdbscan, object_far_away)
+
+
+def test_object_inserted_again_after_deletion_expires_by_new_insertion(
+        blob_in_middle, tmp_path):
+
+    incdbscan = IncrementalDBSCAN(eps=EPS, min_pts=3, window_size=3)
+    object_ = blob_in_middle[:1]
+    incdbscan.insert(object_)
+    incdbscan.delete(object_)
+    incdbscan.insert(object_)
+    incdbscan.insert(blob_in_middle[1:3])
+    get_label_and_assert_no_warning(incdbscan, object_)
+
+    incdbscan.save(tmp_path)
+    loaded = IncrementalDBSCAN.load(tmp_path)
+    loaded.insert(blob_in_middle[3:4])
+    get_label_and_assert_warning(loaded, object_, IncrementalDBSCANWarning)
+    get_label_and_assert_no_warning(loaded, blob_in_middle[1:4])
+
+
+def test_object_inserted_twice_expires_with_its_second_insertion(
+        blob_in_middle):
+
+    incdbscan = IncrementalDBSCAN(eps=EPS, min_pts=3, window_size=2)
+    object_ = blob_in_middle[:1]
+    incdbscan.insert(object_).insert(object_)
+
+    incdbscan.insert(blob_in_middle[1:2])
+    get_label_and_assert_no_warning(incdbscan, object_)
+
+    incdbscan.insert(blob_in_middle[2:3])
+    get_label_and_assert_warning(incdbscan, object_, IncrementalDBSCANWarning)
+
+
+def test_object_expires_when_exactly_window_duration_old(blob_in_middle):
+    incdbscan = IncrementalDBSCAN(eps=EPS, min_pts=3, window_duration=10)
+    incdbscan.insert(blob_in_middle[:2], timestamps=[0, 5])
+
+    incdbscan.insert(blob_in_middle[2:3], timestamps=[10])
+    get_label_and_assert_warning(
+        incdbscan, blob_in_middle[:1], IncrementalDBSCANWarning)
+    get_label_and_assert_no_warning(incdbscan, blob_in_middle[1:3])
+
+    incdbscan.expire(now=14.9)
+    get_label_and_assert_no_warning(incdbscan, blob_in_middle[1:2])
+    incdbscan.expire(now=15)
+    get_label_and_assert_warning(
+        incdbscan, blob_in_middle[1:2], IncrementalDBSCANWarning)
+
+
+def test_error_when_expiring_without_window(incdbscan3):
+    with pytest.raises(ValueError):
+        incdbscan3.expire()
@@ -1,6 +1,8 @@
 import numpy as np
 from conftest import EPS
 
+from incdbscan import IncrementalDBSCAN
+from incdbscan._labels import LabelHandler
 from testutils import (
     CLUSTER_LABEL_FIRST_CLUSTER,
     CLUSTER_LABEL_NOISE,
@@ -337,3 +339,128 @@ def test_object_is_core_if_it_has_more_than_enough_neigbhors(
 
     assert_cluster_labels(incdbscan3, neighbors, expected_label)
     assert_cluster_labels(incdbscan3, point_at_origin, expected_label)
+
+
+def test_duplicates_within_a_batch_count_as_separate_objects(
+        incdbscan3,
+        point_at_origin):
+
+    duplicates = np.vstack([point_at_origin] * 3)
+
+    insert_objects_then_assert_cluster_labels(
+        incdbscan3, duplicates, CLUSTER_LABEL_FIRST_CLUSTER)
+
+
+def test_batch_insertion_can_create_and_merge_clusters_at_the_same_time(
+        incdbscan3,
+        point_at_origin,
+        three_points_on_the_left):
+
+    cluster_1 = three_points_on_the_left
+    cluster_1_expected_label = CLUSTER_LABEL_FIRST_CLUSTER
+
+    insert_objects_then_assert_cluster_labels(
+        incdbscan3, cluster_1, cluster_1_expected_label)
+
+    cluster_2 = reflect_horizontally(cluster_1)
+    cluster_far_away = cluster_2 + 10
+    batch = np.vstack([cluster_2, point_at_origin, cluster_far_away])
+
+    incdbscan3.insert(batch)
+
+    assert_cluster_labels(
+        incdbscan3,
+        np.vstack([cluster_1, point_at_origin, cluster_2]),
+        cluster_1_expected_label
+    )
+    assert_cluster_labels(
+        incdbscan3, cluster_far_away, cluster_1_expected_label + 1)
+
+
+def test_cluster_absorbing_clusters_repeatedly_keeps_consistent_labels(
+        incdbscan3,
+        point_at_origin):
+
+    cluster_1 = np.array([
+        [EPS, 0],
+        [EPS * 2, 0],
+        [EPS * 3, 0],
+        [EPS * 4, 0],
+    ])
+    cluster_2 = reflect_horizontally(cluster_1)
+    cluster_3 = cluster_1 + [EPS * 5, 0]
+    bridge_between_1_and_3 = np.array([[EPS * 5, 0]])
+
+    incdbscan3.insert(cluster_1)
+    incdbscan3.insert(cluster_2)
+    incdbscan3.insert(point_at_origin)
+    incdbscan3.insert(cluster_3)
+    incdbscan3.insert(bridge_between_1_and_3)
+
+    all_objects = np.vstack([
+        cluster_2, point_at_origin, cluster_1, bridge_between_1_and_3,
+        cluster_3])
+    assert_cluster_labels(
+        incdbscan3, all_objects, CLUSTER_LABEL_FIRST_CLUSTER + 2)
+
+    incdbscan3.delete(point_at_origin)
+
+    assert_cluster_labels(
+        incdbscan3,
+        np.vstack([cluster_1, bridge_between_1_and_3, cluster_3]),
+        CLUSTER_LABEL_FIRST_CLUSTER + 2
+    )
+    assert_cluster_labels(
+        incdbscan3, cluster_2, CLUSTER_LABEL_FIRST_CLUSTER + 3)
+
+
+def test_cluster_labels_are_compacted_after_many_clusters_died_out(
+        monkeypatch,
+        blob_in_middle,
+        three_points_on_the_left):
+
+    monkeypatch.setattr(LabelHandler, 'MIN_LABELS_TO_COMPACT', 0)
+    incdbscan3 = IncrementalDBSCAN(
+        eps=EPS, min_pts=3, compact_cluster_labels=True)
+
+    short_lived_cluster = three_points_on_the_left - 10
+    n_cycles = 300
+
+    incdbscan3.insert(blob_in_middle)
+
+    for _ in range(n_cycles):
+        incdbscan3.insert(short_lived_cluster)
+        incdbscan3.delete(short_lived_cluster)
+
+    incdbscan3.insert(short_lived_cluster)
+
+    assert_cluster_labels(
+        incdbscan3, blob_in_middle, CLUSTER_LABEL_FIRST_CLUSTER)
+
+    label_of_short_lived_cluster = \
+        incdbscan3.get_cluster_labels(short_lived_cluster)[0]
+    assert CLUSTER_LABEL_FIRST_CLUSTER < label_of_short_lived_cluster < \
+        n_cycles
+    assert_cluster_labels(
+        incdbscan3, short_lived_cluster, label_of_short_lived_cluster)
+
+
+def test_cluster_labels_are_not_compacted_by_default(
+        incdbscan3,
+        monkeypatch,
+        three_points_on_the_left):
+
+    monkeypatch.setattr(LabelHandler, 'MIN_LABELS_TO_COMPACT', 0)
+
+    short_lived_cluster = three_points_on_the_left - 10
+    n_cycles = 10
+
+    for _ in range(n_cycles):
+        incdbscan3.insert(short_lived_cluster)
+        incdbscan3.delete(short_lived_cluster)
+
+    insert_objects_then_assert_cluster_labels(
+        incdbscan3,
+        short_lived_cluster,
+        CLUSTER_LABEL_FIRST_CLUSTER + n_cycles
+    )
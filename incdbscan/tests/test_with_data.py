@@ -1,10 +1,27 @@
+from pathlib import Path
+
 import numpy as np
 import pytest
 from sklearn.cluster import DBSCAN
+from sklearn.datasets import make_blobs
+from sklearn.neighbors import NearestNeighbors
 
-from incdbscan import IncrementalDBSCAN
+from incdbscan import (
+    GridNeighborSearcher,
+    IncrementalDBSCAN,
+    LSHNeighborSearcher,
+    NeighborSearcher
+)
+from incdbscan._key_index import KeyIndex
+from incdbscan._labels import LabelHandler
 from testutils import (
+    CLUSTER_LABEL_FIRST_CLUSTER,
+    CLUSTER_LABEL_NOISE,
+    apply_label_changes,
     are_lists_isomorphic,
+    assert_same_clustering_as_dbscan,
+    get_label_agreement_with_exact_search,
+    get_random_updates,
     read_handl_data
 )
 
@@ -31,3 +48,547 @@ def test_same_results_as_sklearn_dbscan():
     labels_incdbscan_3 = \
         incdbscan.insert(noise).delete(noise).get_cluster_labels(data)
     assert are_lists_isomorphic(labels_dbscan, labels_incdbscan_3)
+
+
+MODEL_PARAMS = [
+    *[pytest.param(
+        lambda _, searcher=searcher, metric=metric, p=p: {
+            'neighbor_searcher': searcher, 'metric': metric, 'p': p},
+        id=f'{searcher}-{metric}-{p}'
+    )
+      for searcher in ['grid', 'tree']
+      for metric, p in [('minkowski', 2), ('manhattan', 2),
+                        ('chebyshev', 2), ('minkowski', 3)]],
+    pytest.param(
+        lambda _: {'neighbor_searcher': GridNeighborSearcher(
+            radius=0.5, dtype=np.float32)},
+        id='grid-float32'
+    ),
+    pytest.param(
+        lambda _: {'neighbor_searcher': NeighborSearcher(
+            radius=0.5, dtype=np.float32)},
+        id='tree-float32'
+    ),
+    pytest.param(
+        lambda tmp_path: {
+            'neighbor_searcher': 'grid', 'storage_directory': tmp_path},
+        id='grid-storage'
+    ),
+    pytest.param(
+        lambda tmp_path: {
+            'neighbor_searcher': 'tree', 'storage_directory': tmp_path},
+        id='tree-storage'
+    ),
+    pytest.param(
+        lambda tmp_path: {
+            'log_directory': tmp_path,
+            'checkpoint_interval': 500,
+            'collect_stats': True,
+            'track_label_changes': True,
+            'compact_cluster_labels': True,
+        },
+        id='all-options'
+    ),
+]
+
+
+@pytest.mark.parametrize('get_params', MODEL_PARAMS)
+@pytest.mark.parametrize('first_operation', ['fit', 'insert'])
+def test_same_results_as_sklearn_dbscan_after_updates(
+        blobs_with_noise, get_params, first_operation, tmp_path):
+
+    # The first 100 objects are inserted twice, so they are still there
+    # after the first 400 objects are deleted once, and they count twice
+
+    data = blobs_with_noise
+    incdbscan = IncrementalDBSCAN(eps=0.5, min_pts=5, **get_params(tmp_path))
+
+    getattr(incdbscan, first_operation)(np.vstack([data, data[:100]]))
+    assert_same_clustering_as_dbscan(
+        incdbscan, np.vstack([data, data[:100]]))
+
+    incdbscan.delete(data[:400])
+    assert_same_clustering_as_dbscan(
+        incdbscan, np.vstack([data[:100], data[400:]]))
+
+    incdbscan.insert(data[:200])
+    assert_same_clustering_as_dbscan(
+        incdbscan, np.vstack([data[:100], data[:200], data[400:]]))
+
+
+@pytest.mark.parametrize('garbage_ratio', [0, 0.1, 10])
+def test_same_results_as_sklearn_dbscan_in_sliding_window(
+        blobs_with_noise, garbage_ratio):
+
+    data = blobs_with_noise
+    incdbscan = IncrementalDBSCAN(
+        eps=0.5,
+        min_pts=5,
+        neighbor_searcher=NeighborSearcher(
+            radius=0.5, garbage_ratio=garbage_ratio)
+    )
+    incdbscan.insert(data[:600])
+
+    for start in range(0, 600, 150):
+        incdbscan.delete(data[start:start + 150])
+        incdbscan.insert(data[start + 600:start + 750])
+        assert_same_clustering_as_dbscan(
+            incdbscan, data[start + 150:start + 750])
+
+
+@pytest.mark.parametrize('expiry_batch_size', [1, 100])
+def test_same_results_as_sklearn_dbscan_in_window_of_latest_objects(
+        blobs_with_noise, expiry_batch_size):
+
+    data = blobs_with_noise
+    incdbscan = IncrementalDBSCAN(
+        eps=0.5, min_pts=5, window_size=500,
+        expiry_batch_size=expiry_batch_size
+    )
+    incdbscan.fit(data[:300])
+
+    for start in range(300, len(data), 150):
+        incdbscan.insert(data[start:start + 150]).expire()
+        assert_same_clustering_as_dbscan(
+            incdbscan, data[max(0, start - 350):start + 150])
+
+
+@pytest.mark.parametrize('expiry_batch_size', [1, 100])
+@pytest.mark.parametrize('window_size', [None, 300])
+def test_same_results_as_sklearn_dbscan_in_window_of_time(
+        blobs_with_noise, expiry_batch_size, window_size, tmp_path):
+
+    data = blobs_with_noise
+    timestamps = np.arange(len(data)) / 10
+    incdbscan = IncrementalDBSCAN(
+        eps=0.5, min_pts=5, window_size=window_size, window_duration=40,
+        expiry_batch_size=expiry_batch_size, log_directory=tmp_path,
+        checkpoint_interval=500
+    )
+
+    for start in range(0, len(data), 70):
+        incdbscan.insert(
+            data[start:start + 70], timestamps=timestamps[start:start + 70])
+        incdbscan.expire()
+        end = min(start + 70, len(data))
+        first = 0 if window_size is None else max(0, end - window_size)
+        assert_same_clustering_as_dbscan(
+            incdbscan,
+            data[first:end][timestamps[first:end] > timestamps[end - 1] - 40]
+        )
+
+    incdbscan.expire(now=timestamps[-1] + 20)
+    assert_same_clustering_as_dbscan(
+        incdbscan, data[timestamps > timestamps[-1] - 20])
+
+    recovered = IncrementalDBSCAN.recover(tmp_path)
+    assert_same_clustering_as_dbscan(
+        recovered, data[timestamps > timestamps[-1] - 20])
+
+
+@pytest.mark.parametrize(
+    'neighbor_searcher_class', [GridNeighborSearcher, NeighborSearcher])
+def test_neighbors_of_float32_values_depend_on_rounded_values(
+        neighbor_searcher_class):
+
+    # 0.1 and 0.6 are exactly 0.5 apart as float64, but a bit more as
+    # float32. Queries are rounded like the values stored, so the two are
+    # not neighbors, whichever of them is inserted first.
+
+    objects = np.array([[0.1, 0.], [0.6, 0.]])
+
+    for order in [[0, 1], [1, 0]]:
+        incdbscan = IncrementalDBSCAN(
+            eps=0.5,
+            min_pts=2,
+            neighbor_searcher=neighbor_searcher_class(
+                radius=0.5, dtype=np.float32)
+        )
+        for obj in objects[order]:
+            incdbscan.insert(obj[np.newaxis])
+
+        # pylint: disable=protected-access
+        stored_values = incdbscan._objects.neighbor_searcher.values
+        assert stored_values.array.dtype == np.float32
+        assert incdbscan.get_cluster_labels(objects).tolist() == \
+            [CLUSTER_LABEL_NOISE] * 2
+        assert incdbscan.predict(objects).tolist() == \
+            [CLUSTER_LABEL_NOISE] * 2
+
+    incdbscan = IncrementalDBSCAN(eps=0.5, min_pts=2).insert(objects)
+    assert incdbscan.get_cluster_labels(objects).tolist() == \
+        [CLUSTER_LABEL_FIRST_CLUSTER] * 2
+
+
+@pytest.mark.parametrize('neighbor_searcher', ['grid', 'tree'])
+@pytest.mark.parametrize('metric,p', [
+    ('minkowski', 2), ('manhattan', 2), ('chebyshev', 2), ('minkowski', 3)
+])
+def test_objects_exactly_eps_apart_on_cell_boundaries_are_neighbors(
+        neighbor_searcher, metric, p):
+
+    # Objects on a lattice with spacing eps are on the boundaries of the
+    # cells of the grid, on both sides of zero, including negative zero,
+    # and diagonal neighbors are exactly eps apart with the Chebyshev
+    # distance only
+
+    lattice = np.array(
+        [[x, y] for x in range(-4, 5) for y in range(-4, 5)], dtype=float)
+    lattice[lattice == 0] = -0.
+    incdbscan = IncrementalDBSCAN(
+        eps=1, min_pts=5, metric=metric, p=p,
+        neighbor_searcher=neighbor_searcher
+    )
+
+    incdbscan.insert(lattice)
+    assert_same_clustering_as_dbscan(incdbscan, lattice)
+
+    is_deleted = (lattice[:, 0] == 0) | (lattice[:, 1] == 0)
+    incdbscan.delete(lattice[is_deleted])
+    assert_same_clustering_as_dbscan(incdbscan, lattice[~is_deleted])
+
+
+@pytest.mark.parametrize('neighbor_searcher', ['grid', 'tree'])
+def test_objects_stored_in_directory_grow_their_files(
+        neighbor_searcher, tmp_path):
+
+    # The files are replaced by larger ones when the capacity is doubled,
+    # and the rows of deleted objects are reused
+
+    incdbscan = IncrementalDBSCAN(
+        eps=0.5, min_pts=5, neighbor_searcher=neighbor_searcher,
+        storage_directory=tmp_path
+    )
+    data = np.random.default_rng(0).uniform(0, 10, (200, 2))
+    for start in range(0, 200, 20):
+        incdbscan.insert(data[start:start + 20])
+    incdbscan.delete(data[:100])
+    incdbscan.insert(data[:50])
+
+    values_file_name = \
+        'values.npy' if neighbor_searcher == 'grid' else 'tree_values.npy'
+    stored_values = np.load(tmp_path / values_file_name, mmap_mode='r')
+    stored_counts = np.load(tmp_path / 'counts.npy', mmap_mode='r')
+    assert len(stored_values) >= 150
+    assert stored_values.shape[1] == data.shape[1]
+    assert len(stored_counts) == 256
+    assert stored_counts.sum() == 150
+    assert_same_clustering_as_dbscan(
+        incdbscan, np.vstack([data[:50], data[100:]]))
+
+
+@pytest.mark.parametrize('neighbor_searcher', ['grid', 'tree'])
+def test_same_results_as_sklearn_dbscan_after_save_and_load(
+        blobs_with_noise, neighbor_searcher, tmp_path):
+
+    data = blobs_with_noise
+    incdbscan = IncrementalDBSCAN(
+        eps=0.5, min_pts=5, neighbor_searcher=neighbor_searcher)
+
+    incdbscan.insert(data[:800])
+    incdbscan.delete(data[:200])
+    incdbscan.insert(data[:100])
+    incdbscan.save(tmp_path)
+
+    loaded = IncrementalDBSCAN.load(tmp_path)
+    remaining = np.vstack([data[:100], data[200:800]])
+    assert np.array_equal(
+        incdbscan.get_cluster_labels(remaining),
+        loaded.get_cluster_labels(remaining)
+    )
+
+    loaded.insert(data[800:])
+    loaded.delete(data[300:500])
+    assert_same_clustering_as_dbscan(
+        loaded, np.vstack([data[:100], data[200:300], data[500:]]))
+
+
+@pytest.mark.parametrize('neighbor_searcher', ['grid', 'tree'])
+def test_same_results_as_sklearn_dbscan_after_save_and_load_in_place(
+        blobs_with_noise, neighbor_searcher, tmp_path):
+
+    data = blobs_with_noise
+    incdbscan = IncrementalDBSCAN(
+        eps=0.5,
+        min_pts=5,
+        neighbor_searcher=neighbor_searcher,
+        storage_directory=tmp_path
+    )
+
+    incdbscan.insert(data[:800])
+    incdbscan.delete(data[:200])
+    incdbscan.insert(data[:100])
+    remaining = np.vstack([data[:100], data[200:800]])
+    labels = incdbscan.get_cluster_labels(remaining)
+    incdbscan.save(tmp_path)
+    del incdbscan
+
+    loaded = IncrementalDBSCAN.load(tmp_path, storage_directory=tmp_path)
+    assert np.array_equal(labels, loaded.get_cluster_labels(remaining))
+
+    # pylint: disable=protected-access
+    objects = loaded._objects
+    assert Path(objects.counts.filename) == tmp_path / 'counts.npy'
+    if neighbor_searcher == 'grid':
+        stored_values = objects.neighbor_searcher.values.array
+        assert Path(stored_values.filename) == tmp_path / 'values.npy'
+
+    loaded.insert(data[800:])
+    loaded.delete(data[300:500])
+    loaded.save(tmp_path)
+    del loaded, objects
+
+    reloaded = IncrementalDBSCAN.load(tmp_path, storage_directory=tmp_path)
+    assert_same_clustering_as_dbscan(
+        reloaded, np.vstack([data[:100], data[200:300], data[500:]]))
+
+
+@pytest.mark.parametrize('neighbor_searcher', ['grid', 'tree'])
+@pytest.mark.parametrize('seed', range(12))
+def test_same_labels_as_original_after_save_load_and_updates(
+        neighbor_searcher, seed, tmp_path):
+
+    # Save and load keep the node ids of objects, but not the order in
+    # which freed node ids are reused, so labels must not depend on node ids
+
+    updates, remaining = get_random_updates(seed)
+    incdbscan = IncrementalDBSCAN(
+        eps=0.6, min_pts=3, neighbor_searcher=neighbor_searcher)
+
+    for method, objects in updates[:60]:
+        getattr(incdbscan, method)(objects)
+    incdbscan.save(tmp_path)
+    loaded = IncrementalDBSCAN.load(tmp_path)
+
+    for method, objects in updates[60:]:
+        getattr(incdbscan, method)(objects)
+        getattr(loaded, method)(objects)
+
+    assert np.array_equal(
+        incdbscan.get_cluster_labels(remaining),
+        loaded.get_cluster_labels(remaining)
+    )
+
+
+def test_same_clustering_after_recovery_from_log(blobs_with_noise, tmp_path):
+    data = blobs_with_noise
+    incdbscan = IncrementalDBSCAN(
+        eps=0.5, min_pts=5, log_directory=tmp_path, checkpoint_interval=300)
+
+    incdbscan.fit(data[:200])
+    for start in range(200, len(data), 50):
+        incdbscan.insert(data[start:start + 50])
+    incdbscan.delete(data[:150])
+    incdbscan.insert(data[:10], ids=np.arange(10))
+    incdbscan.delete_by_id(np.arange(5))
+
+    recovered = IncrementalDBSCAN.recover(tmp_path)
+    assert np.array_equal(
+        incdbscan.get_cluster_labels(data[150:]),
+        recovered.get_cluster_labels(data[150:])
+    )
+    assert np.array_equal(
+        incdbscan.get_labels_by_id(np.arange(5, 10)),
+        recovered.get_labels_by_id(np.arange(5, 10))
+    )
+
+    recovered.delete(data[150:300])
+    recovered.delete_by_id(np.arange(5, 10))
+    recovered = IncrementalDBSCAN.recover(tmp_path)
+    assert_same_clustering_as_dbscan(recovered, data[300:])
+
+
+@pytest.mark.parametrize('seed', range(12))
+def test_same_labels_as_original_after_recovery_from_checkpoint_and_log(
+        seed, tmp_path):
+
+    updates, remaining = get_random_updates(seed)
+    incdbscan = IncrementalDBSCAN(eps=0.6, min_pts=3, log_directory=tmp_path)
+
+    for method, objects in updates[:60]:
+        getattr(incdbscan, method)(objects)
+    incdbscan.checkpoint()
+    for method, objects in updates[60:]:
+        getattr(incdbscan, method)(objects)
+
+    recovered = IncrementalDBSCAN.recover(tmp_path)
+    assert np.array_equal(
+        incdbscan.get_cluster_labels(remaining),
+        recovered.get_cluster_labels(remaining)
+    )
+
+
+def test_recovery_ignores_incomplete_record_at_end_of_log(
+        blobs_with_noise, tmp_path):
+
+    data = blobs_with_noise
+    incdbscan = IncrementalDBSCAN(eps=0.5, min_pts=5, log_directory=tmp_path)
+    incdbscan.insert(data[:500])
+    incdbscan.insert(data[500:])
+
+    log_path, = tmp_path.glob('log-*.bin')
+    with open(log_path, 'ab') as file:
+        file.truncate(log_path.stat().st_size - 1)
+
+    recovered = IncrementalDBSCAN.recover(tmp_path)
+    assert_same_clustering_as_dbscan(recovered, data[:500])
+
+    recovered.insert(data[500:])
+    recovered = IncrementalDBSCAN.recover(tmp_path)
+    assert_same_clustering_as_dbscan(recovered, data)
+
+
+@pytest.mark.parametrize('neighbor_searcher', ['grid', 'tree'])
+def test_label_changes_keep_labels_up_to_date(
+        blobs_with_noise, neighbor_searcher, monkeypatch):
+
+    # Cluster labels are compacted before every update, so renumbering is
+    # applied too
+    # pylint: disable=protected-access
+    monkeypatch.setattr(
+        LabelHandler,
+        'compact_cluster_labels_if_needed',
+        lambda self, n_objects: self._compact_cluster_labels()
+    )
+
+    data = blobs_with_noise
+    incdbscan = IncrementalDBSCAN(
+        eps=0.5, min_pts=5, neighbor_searcher=neighbor_searcher,
+        track_label_changes=True, compact_cluster_labels=True
+    )
+    labels = {}
+
+    def assert_labels_up_to_date(objects):
+        apply_label_changes(labels, incdbscan.drain_label_changes())
+        assert labels == dict(zip(
+            map(tuple, objects.tolist()),
+            incdbscan.get_cluster_labels(objects).tolist()
+        ))
+
+    incdbscan.fit(data[:300])
+    assert_labels_up_to_date(data[:300])
+
+    for start in range(0, 900, 100):
+        incdbscan.insert(data[start + 300:start + 400])
+        incdbscan.delete(data[start:start + 100])
+        assert_labels_up_to_date(data[start + 100:start + 400])
+
+
+@pytest.mark.parametrize('neighbor_searcher', ['grid', 'tree'])
+def test_predict_gives_largest_label_of_core_neighbors(
+        blobs_with_noise, neighbor_searcher):
+
+    data = blobs_with_noise
+    incdbscan = IncrementalDBSCAN(
+        eps=0.5, min_pts=5, neighbor_searcher=neighbor_searcher)
+    incdbscan.fit(data[:800]).insert(data[800:])
+    incdbscan.delete(data[:100])
+
+    data = data[100:]
+    cores = data[DBSCAN(eps=0.5, min_samples=5).fit(data).core_sample_indices_]
+    labels_of_cores = incdbscan.get_cluster_labels(cores)
+
+    queries = np.random.default_rng(2).uniform(-4, 12, (500, 2))
+    core_neighbors = NearestNeighbors(radius=0.5).fit(cores).radius_neighbors(
+        queries, return_distance=False)
+    expected_labels = [
+        labels_of_cores[neighbors].max() if len(neighbors) else -1
+        for neighbors in core_neighbors
+    ]
+
+    assert incdbscan.predict(queries).tolist() == expected_labels
+
+
+def test_lsh_neighbor_searcher_agrees_with_exact_search_after_updates():
+    # pylint: disable=unbalanced-tuple-unpacking
+    data, _ = make_blobs(
+        n_samples=1000,
+        n_features=64,
+        centers=20,
+        cluster_std=1,
+        center_box=(-3, 3),
+        random_state=0
+    )
+    EPS = 11
+
+    agreements = []
+    for n_tables in [2, 16]:
+        incdbscan = IncrementalDBSCAN(
+            eps=EPS,
+            min_pts=5,
+            neighbor_searcher=LSHNeighborSearcher(
+                radius=EPS, n_tables=n_tables, random_state=0)
+        )
+        incdbscan.insert(data)
+        incdbscan.delete(data[:300])
+        incdbscan.insert(data[:100])
+
+        agreements.append(get_label_agreement_with_exact_search(
+            incdbscan, np.vstack([data[:100], data[300:]])))
+
+    agreement_with_few_tables, agreement_with_many_tables = agreements
+    assert agreement_with_few_tables < agreement_with_many_tables
+    assert agreement_with_many_tables > 0.95
+
+
+@pytest.mark.parametrize('get_searcher, get_bucket_positions', [
+    # pylint: disable=protected-access
+    pytest.param(lambda: GridNeighborSearcher(radius=1),
+                 lambda searcher: searcher._cell_positions[:, np.newaxis],
+                 id='grid'),
+    pytest.param(lambda: LSHNeighborSearcher(radius=1, n_tables=2),
+                 lambda searcher: searcher._bucket_positions,
+                 id='lsh'),
+    # pylint: enable=protected-access
+])
+def test_deletion_moves_at_most_one_id_in_bucket(
+        get_searcher, get_bucket_positions):
+    # All values are in the same bucket. Deleting an id moves the last id of
+    # its bucket to its position, instead of searching for the id and
+    # shifting the ids after it, so deletion costs constant time whatever the
+    # size of the bucket. Positions are checked in each table.
+
+    searcher = get_searcher()
+    ids = np.arange(1000)
+    searcher.insert(np.zeros((len(ids), 2)), ids)
+
+    for n_deleted, id_ in enumerate(ids.tolist()):
+        remaining_ids = ids[n_deleted + 1:]
+        positions_before = \
+            get_bucket_positions(searcher)[remaining_ids].copy()
+        searcher.delete([id_])
+        positions_after = get_bucket_positions(searcher)[remaining_ids]
+
+        assert np.all(np.count_nonzero(
+            positions_after != positions_before, axis=0) <= 1)
+        assert np.all(np.sort(positions_after, axis=0) ==
+                      np.arange(len(remaining_ids))[:, np.newaxis])
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_key_index_returns_same_ids_as_dict(seed):
+    rng = np.random.default_rng(seed)
+    key_index = KeyIndex()
+    keys_by_id = {}
+
+    for _ in range(200):
+        free_ids = np.setdiff1d(np.arange(3000), list(keys_by_id))
+        ids = rng.choice(free_ids, rng.integers(0, 100), replace=False)
+        keys = rng.integers(-20, 20, len(ids))
+        key_index.insert(keys, ids)
+        keys_by_id.update(zip(ids.tolist(), keys.tolist()))
+
+        ids = rng.choice(
+            list(keys_by_id), len(keys_by_id) // 5, replace=False)
+        key_index.delete(ids)
+        for id_ in ids.tolist():
+            keys_by_id.pop(id_, None)
+
+        keys = np.arange(-25, 25)
+        ids, counts = key_index.get(keys)
+        ids_by_key = np.split(ids, np.cumsum(counts)[:-1])
+
+        assert len(key_index) == len(keys_by_id)
+        for key, key_ids in zip(keys.tolist(), ids_by_key):
+            assert sorted(key_ids.tolist()) == sorted(
+                id_ for id_, id_key in keys_by_id.items() if id_key == key)
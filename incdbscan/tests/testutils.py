@@ -6,6 +6,11 @@ import numpy as np
 import pandas as pd
 import pytest
 import requests
+from sklearn.cluster import DBSCAN
+from sklearn.metrics import adjusted_rand_score
+from sklearn.neighbors import NearestNeighbors
+
+from incdbscan import IncrementalDBSCAN
 
 
 CLUSTER_LABEL_NOISE = -1
@@ -97,6 +102,14 @@ def get_label_and_assert_no_warning(incdbscan_fit, obj):
     return incdbscan_fit.get_cluster_labels(obj)
 
 
+def get_labels_by_id_and_assert_no_warning(incdbscan_fit, ids):
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        incdbscan_fit.get_labels_by_id(ids)
+
+    return incdbscan_fit.get_labels_by_id(ids)
+
+
 def get_label_and_assert_warning(incdbscan_fit, obj, warning):
     with pytest.warns(warning):
         return incdbscan_fit.get_cluster_labels(obj)
@@ -123,6 +136,114 @@ def are_lists_isomorphic(list_1, list_2):
     return len(distinct_elements_1) == len(distinct_mappings)
 
 
+def assert_same_clustering_as_dbscan(incdbscan_fit, objects):
+    # Border objects reachable from more than one cluster can legitimately
+    # get different labels from DBSCAN and IncrementalDBSCAN. So only core
+    # objects are required to be clustered identically, while border objects
+    # only need to be labeled as one of their core neighbors.
+
+    dbscan = DBSCAN(
+        eps=incdbscan_fit.eps,
+        min_samples=incdbscan_fit.min_pts,
+        metric=incdbscan_fit.metric,
+        p=incdbscan_fit.p
+    ).fit(objects)
+    labels_dbscan = dbscan.labels_
+    labels_incdbscan = incdbscan_fit.get_cluster_labels(objects)
+
+    is_core = np.zeros(len(objects), dtype=bool)
+    is_core[dbscan.core_sample_indices_] = True
+
+    assert are_lists_isomorphic(
+        labels_dbscan[is_core], labels_incdbscan[is_core])
+    assert np.array_equal(
+        labels_dbscan == CLUSTER_LABEL_NOISE,
+        labels_incdbscan == CLUSTER_LABEL_NOISE
+    )
+
+    neighbors = NearestNeighbors(
+        radius=incdbscan_fit.eps,
+        metric=incdbscan_fit.metric,
+        p=incdbscan_fit.p
+    ).fit(objects).radius_neighbors(objects, return_distance=False)
+
+    is_border = ~is_core & (labels_incdbscan != CLUSTER_LABEL_NOISE)
+    for ix in np.flatnonzero(is_border):
+        labels_of_core_neighbors = labels_incdbscan[
+            neighbors[ix][is_core[neighbors[ix]]]]
+        assert labels_incdbscan[ix] in labels_of_core_neighbors
+
+
+def get_label_agreement_with_exact_search(incdbscan_fit, objects):
+    # Measures how much the labels given with an approximate neighbor
+    # searcher agree with the labels given with exact search, as the
+    # adjusted Rand index of the two labelings (1 means identical)
+
+    exact_incdbscan = IncrementalDBSCAN(
+        eps=incdbscan_fit.eps,
+        min_pts=incdbscan_fit.min_pts,
+        metric=incdbscan_fit.metric,
+        p=incdbscan_fit.p
+    ).fit(objects)
+
+    return adjusted_rand_score(
+        exact_incdbscan.get_cluster_labels(objects),
+        incdbscan_fit.get_cluster_labels(objects)
+    )
+
+
+def apply_label_changes(labels, deltas):
+    # Applies deltas of drain_label_changes to a dict of labels by the
+    # values of objects
+
+    for delta in deltas:
+        for event in delta['events']:
+            if event['type'] == 'reset':
+                labels.clear()
+            elif event['type'] == 'merged':
+                for key, label in labels.items():
+                    if label in event['labels']:
+                        labels[key] = event['into']
+            elif event['type'] == 'renumbered':
+                new_labels = dict(zip(event['labels'].tolist(),
+                                      event['new_labels'].tolist()))
+                for key, label in labels.items():
+                    labels[key] = new_labels.get(label, label)
+
+        for values, label in zip(delta['values'].tolist(),
+                                 delta['new_labels'].tolist()):
+            if np.isnan(label):
+                del labels[tuple(values)]
+            else:
+                labels[tuple(values)] = label
+
+
+def get_random_updates(seed, n_updates=120):
+    # Returns random updates as pairs of a method name ('insert' or
+    # 'delete') and the objects to pass to it, and the objects remaining
+    # after the updates. Objects are rounded to a coarse grid, so that some
+    # of them are inserted more than once. Only objects inserted are
+    # deleted.
+
+    rng = np.random.default_rng(seed)
+    objects = []
+    updates = []
+
+    for _ in range(n_updates):
+        if len(objects) < 10 or rng.random() < 0.55:
+            batch = rng.uniform(0, 8, (rng.integers(1, 15), 2)).round(1)
+            objects.extend(batch)
+            updates.append(('insert', batch))
+        else:
+            positions = np.unique(rng.integers(0, len(objects), 5))
+            batch = np.array([objects[ix] for ix in positions])
+            for ix in positions[::-1]:
+                del objects[ix]
+            updates.append(('delete', batch))
+
+    return updates, np.unique(objects, axis=0)
+
+
 def read_text_data_file_from_url(url):
     content = requests.get(url)
     data = np.loadtxt(StringIO(content.text))